@@ -1,12 +1,20 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, send_file
 from flask_cors import CORS
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room, emit
 import os
 from dotenv import load_dotenv
 import logging
-from services.ai_service import AIService
-from services.speech_service import SpeechService
+from services.ai_service import setup_ai_models
+from services.speech_service import setup_speech_services, decode_audio
+from services.job_queue import JobQueue
+from services.http_client import get_http_client
+from services.blob_store import BlobStore
+from config import SpeechConfig
+from utils import format_sse
 import json
+import base64
+import threading
+import itertools
 
 # Load environment variables
 load_dotenv()
@@ -24,8 +32,19 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger('mentaura')
 
 # Initialize services
-ai_service = AIService()
-speech_service = SpeechService()
+ai_service = setup_ai_models()
+speech_service = setup_speech_services()
+
+# Push finished background jobs to clients subscribed to them
+ai_service.job_queue.add_listener(
+    lambda job: socketio.emit('job_update', JobQueue.public_view(job), to=job['id'])
+)
+# Only the server runs jobs; CLI tools sharing the job store just build the queue
+ai_service.start_jobs()
+
+# Streaming speech recognition sessions, one per connected client
+stt_sessions = {}
+stt_sessions_lock = threading.Lock()
 
 # Homepage Route - this is a simple health check endpoint
 @app.route("/")
@@ -115,6 +134,139 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     print('Client disconnected')
+    with stt_sessions_lock:
+        session = stt_sessions.pop(request.sid, None)
+    if session is not None:
+        session.cancel()
+
+@socketio.on('job_subscribe')
+def handle_job_subscribe(data):
+    """Subscribe to updates for a background job, e.g. a notes diagram"""
+    job_id = (data or {}).get('jobId')
+    if not job_id or ai_service.get_job(job_id) is None:
+        emit('job_update', {'id': job_id, 'status': 'unknown'})
+        return
+    
+    # Join before re-reading the job so a job finishing in between is not missed
+    join_room(job_id)
+    job = ai_service.get_job(job_id)
+    if job['status'] in ('done', 'failed'):
+        emit('job_update', JobQueue.public_view(job))
+
+def stream_voice_answer(sid, text, session_id, settings, speak=True, audio_format="base64"):
+    """Stream the AI answer to a transcribed question to one client, spoken sentence by sentence"""
+    try:
+        chunks = []
+        text_stream = ai_service.stream_gemini(
+            text,
+            user_settings=settings,
+            context=ai_service.conversation_context(session_id)
+        )
+        if speak:
+            events = speech_service.speak_stream(text_stream, voice_settings=settings, audio_format=audio_format)
+        else:
+            events = itertools.chain(({'type': 'chunk', 'text': chunk} for chunk in text_stream), [{'type': 'text_end'}])
+        
+        # Audio segments keep coming after ai_done, until tts_done
+        for event in events:
+            if event['type'] == 'chunk':
+                chunks.append(event['text'])
+                socketio.emit('ai_chunk', {'text': event['text']}, to=sid)
+            elif event['type'] == 'text_end':
+                response_text = "".join(chunks)
+                ai_service.remember_turn(session_id, text, response_text)
+                socketio.emit('ai_done', {
+                    'text': response_text,
+                    'transcribed': text,
+                    'emotion': ai_service.detect_emotion(text, response_text)
+                }, to=sid)
+            elif event['type'] == 'audio':
+                socketio.emit('tts_audio', event, to=sid)
+            elif event['type'] == 'audio_done':
+                socketio.emit('tts_done', event, to=sid)
+    except Exception as e:
+        logger.error(f"Error streaming voice answer: {str(e)}")
+        socketio.emit('ai_error', {'error': str(e)}, to=sid)
+
+@socketio.on('stt_start')
+def handle_stt_start(data):
+    """Start streaming speech recognition; audio follows as stt_chunk events"""
+    data = data or {}
+    sid = request.sid
+    user_id = data.get('uid')
+    session_id = data.get('sessionId') or user_id
+    settings = data.get('settings')
+    respond = data.get('respond', True)
+    speak = data.get('speak', True)
+    audio_format = data.get('audioFormat', 'base64')
+    
+    if not speech_service.stt_client:
+        speech_service.init_google_speech()
+    
+    def on_transcript(text, final):
+        socketio.emit('stt_transcript', {'text': text, 'final': final}, to=sid)
+    
+    def on_end(transcript, error):
+        with stt_sessions_lock:
+            if stt_sessions.get(sid) is session:
+                del stt_sessions[sid]
+        
+        if not transcript:
+            socketio.emit('stt_error', {'error': error or 'No speech recognized'}, to=sid)
+            return
+        
+        latency = session.final_latency
+        socketio.emit('stt_final', {
+            'text': transcript,
+            'latencyMs': round(latency * 1000) if latency is not None else None
+        }, to=sid)
+        
+        # Start answering as soon as the transcript is final
+        if respond:
+            stream_voice_answer(sid, transcript, session_id, settings, speak, audio_format)
+    
+    session = speech_service.start_streaming_recognition(
+        on_transcript,
+        on_end,
+        sample_rate=data.get('sampleRate'),
+        language_code=data.get('languageCode', 'en-US'),
+        single_utterance=data.get('singleUtterance')
+    )
+    if session is None:
+        emit('stt_error', {'error': 'Speech-to-Text service not initialized'})
+        return
+    
+    with stt_sessions_lock:
+        previous = stt_sessions.get(sid)
+        stt_sessions[sid] = session
+    if previous is not None:
+        previous.cancel()
+    
+    socketio.start_background_task(session.run)
+    emit('stt_started', {'sampleRate': session.sample_rate, 'singleUtterance': session.single_utterance})
+
+@socketio.on('stt_chunk')
+def handle_stt_chunk(data):
+    """Feed a chunk of LINEAR16 audio, sent as binary or base64, to the client's recognition session"""
+    with stt_sessions_lock:
+        session = stt_sessions.get(request.sid)
+    if session is None:
+        emit('stt_error', {'error': 'No active recognition; emit stt_start first'})
+        return
+    
+    audio = data.get('audio') if isinstance(data, dict) else data
+    try:
+        session.write(decode_audio(audio))
+    except Exception as e:
+        emit('stt_error', {'error': f"Invalid audio chunk: {e}"})
+
+@socketio.on('stt_stop')
+def handle_stt_stop(data=None):
+    """The student stopped talking; the final transcript follows as stt_final"""
+    with stt_sessions_lock:
+        session = stt_sessions.get(request.sid)
+    if session is not None:
+        session.stop()
 
 @socketio.on('message')
 def handle_message(data):
@@ -138,8 +290,13 @@ def process_text():
         
         logger.info(f"Processing text request for user {user_id}: {text[:30]}...")
         
-        # Process the text with AI service
-        response_text = ai_service.query_gemini(text)
+        # Process the text with AI service, continuing the session's conversation
+        session_id = data.get('sessionId') or (user_id if user_id != 'anonymous' else None)
+        response_text = ai_service.query_gemini(
+            text,
+            context=ai_service.conversation_context(session_id, fallback=data.get('context'))
+        )
+        ai_service.remember_turn(session_id, text, response_text)
         
         # Prepare response
         response = {
@@ -149,25 +306,11 @@ def process_text():
         
         # Add emotion if requested
         if generate_emotion:
-            # Determine appropriate emotion
-            if "error" in response_text.lower() or "sorry" in response_text.lower():
-                response["emotion"] = "concerned"
-            elif any(word in text.lower() for word in ["how", "why", "what", "explain"]):
-                response["emotion"] = "thoughtful"
-            elif any(word in text.lower() for word in ["thanks", "thank", "appreciate"]):
-                response["emotion"] = "happy"
-            elif any(word in text.lower() for word in ["amazing", "wow", "cool", "awesome"]):
-                response["emotion"] = "excited"
-            else:
-                response["emotion"] = "neutral"
+            response["emotion"] = ai_service.detect_emotion(text, response_text)
         
         # Generate structured notes if requested
         if generate_notes:
-            structured_notes = {
-                "title": ai_service._extract_title(response_text),
-                "keyPoints": ai_service._extract_key_points(response_text, 3),
-                "details": ai_service._extract_details(response_text)
-            }
+            structured_notes = ai_service.build_structured_notes(response_text)
             response["structuredNotes"] = structured_notes
             
             # Add images if requested
@@ -188,13 +331,20 @@ def get_services():
     services = {
         "ai": {
             "gemini": ai_service.gemini_model is not None,
-            "openai": bool(os.environ.get("OPENAI_API_KEY"))
+            "openai": bool(os.environ.get("OPENAI_API_KEY")),
+            "cache": ai_service.get_cache_stats(),
+            "routing": ai_service.get_provider_status(),
+            "jobs": ai_service.job_queue.get_stats()
         },
         "speech": {
             "googleTTS": speech_service.tts_client is not None,
             "edgeTTS": True,  # Edge TTS is always available as fallback
-            "elevenlabs": bool(speech_service.elevenlabs_api_key)
-        }
+            "elevenlabs": bool(speech_service.elevenlabs_api_key),
+            "streamingRecognition": speech_service.get_streaming_stats(),
+            "pipeline": speech_service.pipeline.get_stats(),
+            "audioCache": speech_service.audio_cache.get_stats() if speech_service.audio_cache is not None else None
+        },
+        "http": get_http_client().get_stats()
     }
     return jsonify(services)
 
@@ -227,6 +377,7 @@ async def text_to_speech():
         data = request.json
         text = data.get('text')
         voice_settings = data.get('voiceSettings')
+        audio_format = data.get('audioFormat', 'base64')
         
         if not text:
             return jsonify({"error": "No text provided"}), 400
@@ -235,20 +386,78 @@ async def text_to_speech():
         if not speech_service.tts_client:
             speech_service.init_google_tts()
         
-        # Process text to speech
-        audio_base64 = await speech_service.text_to_speech(text, voice_settings)
+        # Process text to speech, from the audio cache when this text and voice were spoken before
+        found = await speech_service.speech_audio(text, voice_settings)
         
-        if not audio_base64:
+        if not found:
             return jsonify({"error": "Failed to generate speech"}), 500
         
-        return jsonify({"audio": audio_base64})
+        audio_content, content_type, key = found
+        # The raw bytes, or a link to them, spare the client the base64 overhead
+        if audio_format == 'binary':
+            return Response(audio_content, mimetype=content_type)
+        if audio_format == 'url' and speech_service.audio_cache is not None:
+            return jsonify({"audioUrl": speech_service.audio_url(key)})
+        return jsonify({"audio": base64.b64encode(audio_content).decode("utf-8")})
     except Exception as e:
         logger.error(f"Error in text_to_speech: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/text-to-speech/stream', methods=['POST'])
+def text_to_speech_stream():
+    """Speak a long text as Server-Sent Events, one audio segment per sentence group, in order"""
+    data = request.json or {}
+    text = data.get('text')
+    voice_settings = data.get('voiceSettings')
+    audio_format = data.get('audioFormat', 'base64')
+    
+    if not text:
+        return jsonify({"error": "No text provided"}), 400
+    
+    # Initialize TTS service if needed
+    if not speech_service.tts_client:
+        speech_service.init_google_tts()
+    
+    def generate():
+        try:
+            for event in speech_service.speak_stream(text, voice_settings=voice_settings, audio_format=audio_format):
+                if event['type'] in ('audio', 'audio_done'):
+                    yield format_sse(event)
+        except Exception as e:
+            logger.error(f"Error in text_to_speech_stream: {str(e)}")
+            yield format_sse({'type': 'error', 'error': str(e)})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/text-to-speech/audio/<key>', methods=['GET'])
+def get_speech_audio(key):
+    """Serve cached speech audio straight from disk"""
+    try:
+        found = None
+        if speech_service.audio_cache is not None and BlobStore.is_valid_key(key):
+            found = speech_service.audio_cache.get(key)
+        
+        if found is None:
+            return jsonify({"error": "Audio not found"}), 404
+        
+        # The key hashes the text and voice, not the audio, and evicted audio can be
+        # synthesized again differently, so clients revalidate against a hash of the bytes
+        file_path, content_type = found
+        response = send_file(file_path, mimetype=content_type, conditional=True,
+                             etag=speech_service.audio_cache.digest(key) or True)
+        response.headers['Cache-Control'] = f"public, max-age={SpeechConfig.AUDIO_CACHE_MAX_AGE}"
+        return response
+    except Exception as e:
+        logger.error(f"Error in get_speech_audio: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 # Start the Flask app
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     # Load services at startup
     load_services()
-    socketio.run(app, host="0.0.0.0", port=port, debug=True, allow_unsafe_werkzeug=True) 
\ No newline at end of file
+    socketio.run(app, host="0.0.0.0", port=port, debug=True, allow_unsafe_werkzeug=True) 
@@ -0,0 +1,165 @@
+"""
+Mentaura AI Teacher - Speech I/O Microbenchmark
+
+Compares the temp-file round trips SpeechService used to make with the
+in-memory buffers it uses now, per call, for the three audio paths:
+decoding uploaded audio for speech-to-text, collecting streamed Edge TTS
+audio, and converting audio with ffmpeg (skipped when pydub or ffmpeg is
+missing). Audio is synthesized locally, so no provider is called.
+
+Usage:
+    python benchmarks/speech_io.py [--iterations N] [--seconds S] [--tmpdir DIR]
+"""
+
+import io
+import os
+import sys
+import time
+import base64
+import shutil
+import argparse
+import logging
+import tempfile
+import subprocess
+
+# Add the parent directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+logger = logging.getLogger('mentaura.benchmarks.speech_io')
+
+EDGE_CHUNK_BYTES = 4096
+
+def stt_input_temp_file(audio_base64, tmpdir):
+    """Previous speech_to_text: write the decoded upload to a temp file and read it back"""
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False, dir=tmpdir) as temp_file:
+        temp_filename = temp_file.name
+        temp_file.write(base64.b64decode(audio_base64))
+    with open(temp_filename, "rb") as audio_file:
+        content = audio_file.read()
+    os.unlink(temp_filename)
+    return content
+
+def stt_input_memory(audio_base64, tmpdir):
+    """Current speech_to_text: decode in memory"""
+    return base64.b64decode(audio_base64)
+
+def edge_temp_file(chunks, tmpdir):
+    """Previous text_to_speech_edge: Communicate.save() to a temp file, then read and base64 it"""
+    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False, dir=tmpdir) as temp_file:
+        temp_filename = temp_file.name
+    with open(temp_filename, "wb") as audio_file:
+        for chunk in chunks:
+            audio_file.write(chunk)
+    with open(temp_filename, "rb") as audio_file:
+        audio_content = audio_file.read()
+    os.unlink(temp_filename)
+    return base64.b64encode(audio_content).decode("utf-8")
+
+def edge_memory(chunks, tmpdir):
+    """Current text_to_speech_edge: Communicate.stream() into a BytesIO"""
+    buffer = io.BytesIO()
+    for chunk in chunks:
+        buffer.write(chunk)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+def convert_temp_files(audio_bytes, tmpdir):
+    """Previous process_audio: pydub reading and exporting through temp files"""
+    from pydub import AudioSegment
+
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False, dir=tmpdir) as input_file:
+        input_filename = input_file.name
+        input_file.write(audio_bytes)
+    output_filename = input_filename.replace(".wav", ".mp3")
+    AudioSegment.from_file(input_filename).export(output_filename, format="mp3")
+    with open(output_filename, "rb") as output_file:
+        processed_audio = output_file.read()
+    os.unlink(input_filename)
+    os.unlink(output_filename)
+    return processed_audio
+
+def convert_pipes(audio_bytes, tmpdir):
+    """Current process_audio: ffmpeg reading stdin and writing stdout"""
+    from pydub import AudioSegment
+
+    return subprocess.run(
+        [AudioSegment.converter, "-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-f", "mp3", "pipe:1"],
+        input=audio_bytes,
+        capture_output=True,
+        check=True
+    ).stdout
+
+def measure(fn, payload, iterations, tmpdir):
+    """Return per-call times in microseconds, after one warm-up call"""
+    fn(payload, tmpdir)
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn(payload, tmpdir)
+        timings.append((time.perf_counter() - started) * 1e6)
+    return sorted(timings)
+
+def summarize(timings):
+    return {
+        "mean": sum(timings) / len(timings),
+        "p50": timings[len(timings) // 2],
+        "p95": timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    }
+
+def compare(name, before, after, payload, iterations, tmpdir):
+    old = summarize(measure(before, payload, iterations, tmpdir))
+    new = summarize(measure(after, payload, iterations, tmpdir))
+    saved = old["mean"] - new["mean"]
+    logger.info(
+        f"{name:<22} temp files {old['mean']:>9.1f} us (p95 {old['p95']:>9.1f})   "
+        f"memory {new['mean']:>9.1f} us (p95 {new['p95']:>9.1f})   "
+        f"saved {saved:>9.1f} us/call ({saved / old['mean'] * 100 if old['mean'] else 0:.0f}%)"
+    )
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Compare temp-file and in-memory speech audio handling")
+    parser.add_argument("--iterations", type=int, default=500, help="Calls per path and variant")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Length of the synthesized audio clip")
+    parser.add_argument("--tmpdir", default=None, help="Directory for the temp-file variants (default: system temp)")
+    return parser.parse_args()
+
+def main():
+    """Main entry point"""
+    args = parse_args()
+
+    from services.provider_simulator import ProviderSimulator
+
+    # About 2.5 words per second of speech
+    words = " ".join(["word"] * max(1, int(args.seconds * 2.5)))
+    audio_bytes = ProviderSimulator(time_scale=0).synthesize_audio(words)
+    audio_base64 = base64.b64encode(audio_bytes).decode("utf-8")
+    chunks = [audio_bytes[start:start + EDGE_CHUNK_BYTES] for start in range(0, len(audio_bytes), EDGE_CHUNK_BYTES)]
+
+    logger.info(f"{len(audio_bytes) / 1024:.0f} KB of audio, {args.iterations} calls per variant, "
+                f"temp dir {args.tmpdir or tempfile.gettempdir()}")
+    compare("speech_to_text input", stt_input_temp_file, stt_input_memory, audio_base64, args.iterations, args.tmpdir)
+    compare("edge tts collection", edge_temp_file, edge_memory, chunks, args.iterations, args.tmpdir)
+
+    try:
+        import pydub
+        has_ffmpeg = shutil.which(pydub.AudioSegment.converter) is not None
+    except ImportError:
+        has_ffmpeg = False
+    if has_ffmpeg:
+        # ffmpeg dominates this path, so fewer calls are enough
+        compare("process_audio to mp3", convert_temp_files, convert_pipes, audio_bytes,
+                max(1, args.iterations // 20), args.tmpdir)
+    else:
+        logger.info("process_audio to mp3    skipped: pydub or ffmpeg is not installed")
+
+if __name__ == "__main__":
+    main()
@@ -50,6 +50,177 @@ class SpeechConfig:
         "speaking_rate": 1.0,
         "pitch": 0.0
     }
+    STREAM_SAMPLE_RATE = int(os.environ.get('STT_STREAM_SAMPLE_RATE', 16000))  # LINEAR16 audio sent with stt_chunk
+    STREAM_SINGLE_UTTERANCE = os.environ.get('STT_STREAM_SINGLE_UTTERANCE', 'True').lower() in ('true', '1', 't')  # End when the student stops speaking
+    STREAM_MAX_SECONDS = int(os.environ.get('STT_STREAM_MAX_SECONDS', 290))  # Google caps a stream at about 5 minutes
+    STREAM_IDLE_TIMEOUT = float(os.environ.get('STT_STREAM_IDLE_TIMEOUT', 10))  # Seconds without audio before a stream is ended
+    PIPELINE_CONCURRENCY = int(os.environ.get('TTS_PIPELINE_CONCURRENCY', 3))  # Segments synthesized at once by pipelined speech
+    PIPELINE_FIRST_CHARS = int(os.environ.get('TTS_PIPELINE_FIRST_CHARS', 80))  # The first segment is cut early so audio starts quickly
+    PIPELINE_MIN_CHARS = int(os.environ.get('TTS_PIPELINE_MIN_CHARS', 40))  # Shorter sentences are merged with the next one
+    PIPELINE_MAX_CHARS = int(os.environ.get('TTS_PIPELINE_MAX_CHARS', 300))
+    AUDIO_CACHE_ENABLED = os.environ.get('TTS_AUDIO_CACHE_ENABLED', 'True').lower() in ('true', '1', 't')
+    AUDIO_CACHE_PATH = os.environ.get('TTS_AUDIO_CACHE_PATH', 'resources/audio')
+    AUDIO_CACHE_MAX_DISK_MB = int(os.environ.get('TTS_AUDIO_CACHE_MAX_DISK_MB', 200))  # Least recently used audio is evicted
+    AUDIO_PUBLIC_URL_PREFIX = os.environ.get('TTS_AUDIO_PUBLIC_URL_PREFIX', '/api/text-to-speech/audio')  # Set to an absolute URL behind a proxy or CDN
+    AUDIO_CACHE_MAX_AGE = int(os.environ.get('TTS_AUDIO_CACHE_MAX_AGE', 86400))  # Evicted audio can be synthesized again under the same URL
+
+class CacheConfig:
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'True').lower() in ('true', '1', 't')
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 86400))  # 24 hours
+    RESPONSE_CACHE_DIR = os.environ.get('RESPONSE_CACHE_DIR', '')  # Empty disables the disk tier
+    RESPONSE_CACHE_MAX_DISK_MB = int(os.environ.get('RESPONSE_CACHE_MAX_DISK_MB', 100))
+
+class ConcurrencyConfig:
+    MAX_WORKERS = int(os.environ.get('AI_MAX_WORKERS', 16))
+    CALL_TIMEOUT = float(os.environ.get('AI_CALL_TIMEOUT', 60))  # Seconds per parallel AI call
+
+class RoutingConfig:
+    PROVIDER_TIMEOUT = float(os.environ.get('AI_PROVIDER_TIMEOUT', 30))  # Seconds per provider request
+    HEDGE_ENABLED = os.environ.get('AI_HEDGE_ENABLED', 'True').lower() in ('true', '1', 't')
+    HEDGE_PERCENTILE = float(os.environ.get('AI_HEDGE_PERCENTILE', 95))
+    HEDGE_MIN_DELAY = float(os.environ.get('AI_HEDGE_MIN_DELAY', 1.0))
+    HEDGE_DEFAULT_DELAY = float(os.environ.get('AI_HEDGE_DEFAULT_DELAY', 5.0))  # Used until enough samples exist
+    HEDGE_MAX_RATIO = float(os.environ.get('AI_HEDGE_MAX_RATIO', 0.1))  # Max share of requests that may hedge
+    EWMA_ALPHA = float(os.environ.get('AI_ROUTING_EWMA_ALPHA', 0.2))
+    ERROR_RATE_THRESHOLD = float(os.environ.get('AI_ROUTING_ERROR_THRESHOLD', 0.5))
+    COALESCE_TIMEOUT = float(os.environ.get('AI_COALESCE_TIMEOUT', 90))  # Max wait on an identical in-flight request
+
+class CircuitBreakerConfig:
+    FAILURE_THRESHOLD = float(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 0.5))  # Failure ratio that opens the circuit
+    MINIMUM_CALLS = int(os.environ.get('CIRCUIT_MINIMUM_CALLS', 5))
+    WINDOW = float(os.environ.get('CIRCUIT_WINDOW', 60))  # Rolling window in seconds
+    RECOVERY_TIMEOUT = float(os.environ.get('CIRCUIT_RECOVERY_TIMEOUT', 30))
+    HALF_OPEN_MAX_CALLS = int(os.environ.get('CIRCUIT_HALF_OPEN_MAX_CALLS', 1))
+
+class EmbeddingConfig:
+    MODEL = os.environ.get('EMBEDDING_MODEL', 'text-embedding-ada-002')
+    DIMENSIONS = int(os.environ.get('EMBEDDING_DIMENSIONS', 1536))
+    BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', 256))  # Texts per provider request
+    MICRO_BATCH_SIZE = int(os.environ.get('EMBEDDING_MICRO_BATCH_SIZE', 64))
+    MICRO_BATCH_WAIT_MS = float(os.environ.get('EMBEDDING_MICRO_BATCH_WAIT_MS', 5))
+    STORE_ENABLED = os.environ.get('EMBEDDING_STORE_ENABLED', 'True').lower() in ('true', '1', 't')
+    STORE_PATH = os.environ.get('EMBEDDING_STORE_PATH', os.path.join(ResourceConfig.MODELS_PATH, 'embeddings'))
+
+class RagConfig:
+    INDEX_PATH = os.environ.get('RAG_INDEX_PATH', os.path.join(ResourceConfig.MODELS_PATH, 'rag_index'))
+    TOP_K = int(os.environ.get('RAG_TOP_K', 4))
+    IVF_THRESHOLD = int(os.environ.get('RAG_IVF_THRESHOLD', 50000))  # Switch from brute force to IVF above this size
+    NLIST = int(os.environ.get('RAG_NLIST', 0))  # IVF clusters (0 = about 4 * sqrt(n))
+    NPROBE = int(os.environ.get('RAG_NPROBE', 16))  # Clusters scanned per query
+
+class IngestionConfig:
+    MANIFEST_PATH = os.environ.get('INGEST_MANIFEST_PATH', os.path.join(ResourceConfig.MODELS_PATH, 'ingest_manifest.json'))
+    CHUNK_WORDS = int(os.environ.get('INGEST_CHUNK_WORDS', 200))
+    CHUNK_OVERLAP = int(os.environ.get('INGEST_CHUNK_OVERLAP', 40))
+    WORKERS = int(os.environ.get('INGEST_WORKERS', 0))  # Parser processes (0 = one per CPU)
+    EMBED_BATCH_SIZE = int(os.environ.get('INGEST_EMBED_BATCH_SIZE', 512))
+
+class LessonConfig:
+    STORE_ENABLED = os.environ.get('LESSON_STORE_ENABLED', 'True').lower() in ('true', '1', 't')
+    STORE_PATH = os.environ.get('LESSON_STORE_PATH', os.path.join(ResourceConfig.MODELS_PATH, 'lessons'))
+    VERSION = os.environ.get('LESSON_STORE_VERSION', '1')  # Bump after prompt changes to regenerate
+    MEMORY_ENTRIES = int(os.environ.get('LESSON_STORE_MEMORY_ENTRIES', 2000))
+    PREGENERATE_CONCURRENCY = int(os.environ.get('PREGENERATE_CONCURRENCY', 4))
+    PREGENERATE_RPM = float(os.environ.get('PREGENERATE_RPM', 60))  # Lessons started per minute
+
+class ConversationConfig:
+    RECENT_TURNS = int(os.environ.get('CONVERSATION_RECENT_TURNS', 6))  # Exchanges kept verbatim per session
+    FOLD_TURNS = int(os.environ.get('CONVERSATION_FOLD_TURNS', 2))  # Older exchanges folded into the summary at once
+    SUMMARY_TOKENS = int(os.environ.get('CONVERSATION_SUMMARY_TOKENS', 300))
+    MAX_SESSIONS = int(os.environ.get('CONVERSATION_MAX_SESSIONS', 1000))
+    SESSION_TTL = int(os.environ.get('CONVERSATION_SESSION_TTL', 21600))  # Seconds of inactivity before a session is forgotten
+
+class PrefetchConfig:
+    ENABLED = os.environ.get('PREFETCH_ENABLED', 'True').lower() in ('true', '1', 't')  # Needs the response cache
+    NEXT_LESSONS = int(os.environ.get('PREFETCH_NEXT_LESSONS', 1))  # Following lessons in the course
+    RELATED_TOPICS = int(os.environ.get('PREFETCH_RELATED_TOPICS', 2))  # Suggested related topics
+    BUDGET_PER_HOUR = int(os.environ.get('PREFETCH_BUDGET_PER_HOUR', 60))  # Lessons prefetched per hour at most
+    MAX_PENDING = int(os.environ.get('PREFETCH_MAX_PENDING', 8))
+    WORKERS = int(os.environ.get('PREFETCH_WORKERS', 1))
+
+class TokenBudgetConfig:
+    DEFAULT_OUTPUT_TOKENS = int(os.environ.get('AI_MAX_OUTPUT_TOKENS', 800))
+    CONTEXT_TOKENS = int(os.environ.get('AI_CONTEXT_TOKENS', 2000))  # Prompt budget for conversation context
+    # Output caps per task, scaled by the teaching style below
+    TASK_OUTPUT_TOKENS = {
+        'chat': 800,
+        'lesson': 1200,
+        'notes': 1200,
+        'practice': 900,
+        'related': 400,
+        'evaluation': 400,
+        'summary': 300
+    }
+    STYLE_MULTIPLIERS = {
+        'detailed': 1.0,
+        'interactive': 0.8,
+        'socratic': 0.7,
+        'concise': 0.5
+    }
+
+class JobConfig:
+    STORE_PATH = os.environ.get('JOB_STORE_PATH', 'resources/jobs')
+    MAX_WORKERS = int(os.environ.get('JOB_MAX_WORKERS', 2))
+    MAX_RETRIES = int(os.environ.get('JOB_MAX_RETRIES', 2))
+    RETRY_BACKOFF = float(os.environ.get('JOB_RETRY_BACKOFF', 2.0))  # Seconds, doubled per attempt
+    RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 86400))  # Seconds finished jobs are kept
+
+class ImageConfig:
+    MODEL = os.environ.get('IMAGE_MODEL', 'dall-e-2')
+    SIZE = os.environ.get('IMAGE_SIZE', '1024x1024')
+    STORE_PATH = os.environ.get('IMAGE_STORE_PATH', 'resources/images')
+    STORE_MAX_DISK_MB = int(os.environ.get('IMAGE_STORE_MAX_DISK_MB', 500))
+    PUBLIC_URL_PREFIX = os.environ.get('IMAGE_PUBLIC_URL_PREFIX', '/api/ai/images')  # Set to an absolute URL behind a proxy or CDN
+    CACHE_MAX_AGE = int(os.environ.get('IMAGE_CACHE_MAX_AGE', 86400))  # An evicted image can be regenerated under the same URL
+
+class ImageInputConfig:
+    MAX_DIMENSION = int(os.environ.get('IMAGE_INPUT_MAX_DIMENSION', 1536))  # Longer side of images sent to Gemini
+    JPEG_QUALITY = int(os.environ.get('IMAGE_INPUT_JPEG_QUALITY', 85))
+    MAX_UPLOAD_MB = int(os.environ.get('IMAGE_INPUT_MAX_UPLOAD_MB', 20))
+    CACHE_ENTRIES = int(os.environ.get('IMAGE_INPUT_CACHE_ENTRIES', 128))  # Processed uploads kept for repeat images
+
+class HttpConfig:
+    POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 32))  # Keep-alive connections per provider host
+    CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+    READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 30))
+    CONNECT_RETRIES = int(os.environ.get('HTTP_CONNECT_RETRIES', 2))  # Only failed connects are retried
+    # (connect, read) seconds for hosts that need their own timeouts
+    HOST_TIMEOUTS = {
+        'api.openai.com': (CONNECT_TIMEOUT, RoutingConfig.PROVIDER_TIMEOUT),
+        'api.elevenlabs.io': (CONNECT_TIMEOUT, float(os.environ.get('ELEVENLABS_TIMEOUT', 20)))
+    }
+
+class RateLimitConfig:
+    ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'True').lower() in ('true', '1', 't')
+    MAX_WAIT = float(os.environ.get('RATE_LIMIT_MAX_WAIT', 30))  # Seconds a call may queue before failing
+    # Requests and tokens per minute per provider and model (0 = unlimited); set them to your account's quota
+    LIMITS = {
+        'gemini:gemini-1.5-pro': {
+            'rpm': int(os.environ.get('GEMINI_RPM', 360)),
+            'tpm': int(os.environ.get('GEMINI_TPM', 4000000))
+        },
+        'openai:gpt-3.5-turbo': {
+            'rpm': int(os.environ.get('OPENAI_CHAT_RPM', 3500)),
+            'tpm': int(os.environ.get('OPENAI_CHAT_TPM', 160000))
+        },
+        f'openai:{EmbeddingConfig.MODEL}': {
+            'rpm': int(os.environ.get('OPENAI_EMBEDDING_RPM', 3000)),
+            'tpm': int(os.environ.get('OPENAI_EMBEDDING_TPM', 1000000))
+        },
+        f'openai:{ImageConfig.MODEL}': {
+            'rpm': int(os.environ.get('OPENAI_IMAGE_RPM', 50)),
+            'tpm': 0
+        }
+    }
+
+class SimulatorConfig:
+    MODE = os.environ.get('PROVIDER_MODE', 'live').lower()  # live, record or simulate
+    CASSETTE_PATH = os.environ.get('PROVIDER_CASSETTE_PATH', 'resources/cassettes')
+    PROFILES_PATH = os.environ.get('SIM_PROFILES_PATH', '')  # JSON file overriding the per-provider latency profiles
+    SEED = int(os.environ.get('SIM_SEED', 0))
+    TIME_SCALE = float(os.environ.get('SIM_TIME_SCALE', 1.0))  # 0 skips simulated waits
+    ERROR_RATE = float(os.environ['SIM_ERROR_RATE']) if os.environ.get('SIM_ERROR_RATE') else None  # Overrides every profile
 
 class GameConfig:
     MAX_QUESTIONS = int(os.environ.get('MAX_GAME_QUESTIONS', 20))
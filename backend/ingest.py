@@ -0,0 +1,95 @@
+"""
+Mentaura AI Teacher - Document Ingestion
+
+Walks the documents directory, chunks and embeds new or changed files,
+and updates the retrieval index used by the AI service.
+
+Usage:
+    python ingest.py [--path DIR] [--workers N] [--rebuild]
+"""
+
+import os
+import sys
+import argparse
+import logging
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+logger = logging.getLogger('mentaura.ingest')
+
+# Load environment variables
+load_dotenv()
+
+def parse_args():
+    """Parse command line arguments"""
+    from config import ResourceConfig, IngestionConfig
+
+    parser = argparse.ArgumentParser(description="Ingest documents into the Mentaura retrieval index")
+    parser.add_argument("--path", default=ResourceConfig.DOCUMENTS_PATH, help="Documents directory")
+    parser.add_argument("--manifest", default=IngestionConfig.MANIFEST_PATH, help="Ingestion manifest file")
+    parser.add_argument("--workers", type=int, default=IngestionConfig.WORKERS, help="Parser processes (0 = one per CPU)")
+    parser.add_argument("--chunk-words", type=int, default=IngestionConfig.CHUNK_WORDS, help="Words per chunk")
+    parser.add_argument("--overlap", type=int, default=IngestionConfig.CHUNK_OVERLAP, help="Words shared by neighbouring chunks")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore the manifest and re-index every document")
+    return parser.parse_args()
+
+def main():
+    """Main entry point"""
+    args = parse_args()
+
+    if not os.path.isdir(args.path):
+        logger.error(f"Documents directory not found: {args.path}")
+        sys.exit(1)
+
+    if not os.environ.get("OPENAI_API_KEY"):
+        logger.warning("OpenAI API key is not set. Chunks that are not already in the embedding store cannot be embedded.")
+
+    from config import IngestionConfig
+    from services.ai_service import AIService
+    from services.document_ingestion import DocumentIngestor, PdfReader
+
+    if PdfReader is None:
+        logger.warning("pypdf is not installed, PDF files will be skipped")
+
+    ingestor = DocumentIngestor(
+        AIService(),
+        args.path,
+        args.manifest,
+        chunk_words=args.chunk_words,
+        overlap_words=args.overlap,
+        workers=args.workers or None,
+        embed_batch_size=IngestionConfig.EMBED_BATCH_SIZE
+    )
+
+    def progress(done, total, relative_path):
+        logger.info(f"[{done}/{total}] {relative_path}")
+
+    try:
+        stats = ingestor.run(rebuild=args.rebuild, progress=progress)
+    except Exception as e:
+        logger.error(f"Ingestion failed: {e}")
+        sys.exit(1)
+
+    logger.info(
+        f"{stats['documents']} documents ({stats['parsed']} parsed, {stats['unchanged']} unchanged, "
+        f"{stats['removed']} removed, {stats['errors']} errors)"
+    )
+    logger.info(
+        f"{stats['chunks']} chunks, {stats['embedded_chunks']} embedded, "
+        f"{stats['removed_chunks']} removed from the index"
+    )
+    logger.info(
+        f"{stats['elapsed_seconds']}s - {stats['docs_per_second']} docs/s, "
+        f"{stats['chunks_per_second']} chunks/s"
+    )
+
+if __name__ == "__main__":
+    main()
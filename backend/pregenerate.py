@@ -0,0 +1,156 @@
+"""
+Mentaura AI Teacher - Lesson Pre-generation
+
+Generates every catalog lesson for each difficulty and teaching style and
+stores it in the lesson store, so /api/learning/learn serves catalog
+lessons without calling a model. Lessons already in the store are skipped,
+so an interrupted run resumes where it stopped.
+
+Usage:
+    python pregenerate.py [--courses cs101 math101] [--concurrency N] [--rpm N] [--force]
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+logger = logging.getLogger('mentaura.pregenerate')
+
+# Load environment variables
+load_dotenv()
+
+class Pacer:
+    """Spaces call start times so at most `rate_per_minute` calls begin each minute"""
+
+    def __init__(self, rate_per_minute):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self.next_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+def parse_args():
+    """Parse command line arguments"""
+    from config import LessonConfig
+    from services import course_catalog
+
+    parser = argparse.ArgumentParser(description="Pre-generate catalog lessons into the lesson store")
+    parser.add_argument("--courses", nargs="*", help="Course IDs to generate (default: all)")
+    parser.add_argument("--difficulties", nargs="*", default=course_catalog.DIFFICULTIES)
+    parser.add_argument("--styles", nargs="*", default=course_catalog.TEACHING_STYLES, help="Teaching styles")
+    parser.add_argument("--personalities", nargs="*", default=None, help="Personalities (default: the default personality only)")
+    parser.add_argument("--concurrency", type=int, default=LessonConfig.PREGENERATE_CONCURRENCY, help="Lessons generated at once")
+    parser.add_argument("--rpm", type=float, default=LessonConfig.PREGENERATE_RPM, help="Lessons started per minute (0 = unlimited)")
+    parser.add_argument("--force", action="store_true", help="Regenerate lessons that are already stored")
+    return parser.parse_args()
+
+def main():
+    """Main entry point"""
+    args = parse_args()
+
+    from services import course_catalog
+    from services.ai_service import setup_ai_models
+    from services.rate_limiter import BACKGROUND, lane
+
+    ai_service = setup_ai_models()
+    store = ai_service.lesson_store
+    if store is None:
+        logger.error("The lesson store is disabled. Set LESSON_STORE_ENABLED=True to pre-generate lessons.")
+        sys.exit(1)
+
+    personalities = args.personalities or [ai_service.default_settings["personality"]]
+
+    # Enumerate the catalog x difficulty x style x personality matrix
+    jobs = []
+    skipped = 0
+    for course_id, topic, subtopic in course_catalog.iter_lessons(args.courses):
+        for difficulty in args.difficulties:
+            for style in args.styles:
+                for personality in personalities:
+                    if not args.force and store.has(topic, subtopic, difficulty, style, personality):
+                        skipped += 1
+                        continue
+                    jobs.append((topic, subtopic, difficulty, style, personality))
+
+    logger.info(f"{len(jobs) + skipped} lessons in the matrix, {skipped} already stored, {len(jobs)} to generate")
+    logger.info(f"Lesson store version {store.version} at {store.directory}")
+    if not jobs:
+        return
+
+    pacer = Pacer(args.rpm)
+
+    def generate(job):
+        topic, subtopic, difficulty, style, personality = job
+        pacer.wait()
+        # Yield provider capacity to interactive traffic in the same process
+        with lane(BACKGROUND):
+            lesson, failed = ai_service.generate_lesson(
+                topic,
+                subtopic,
+                difficulty,
+                {"teaching_style": style, "personality": personality}
+            )
+        # Partial lessons are not stored, so the next run retries them
+        if failed:
+            return failed
+        store.put(topic, subtopic, difficulty, style, personality, lesson)
+        return None
+
+    started = time.monotonic()
+    done = 0
+    failures = 0
+
+    executor = ThreadPoolExecutor(max_workers=max(1, args.concurrency), thread_name_prefix="mentaura-pregenerate")
+    try:
+        futures = {executor.submit(generate, job): job for job in jobs}
+        for future in as_completed(futures):
+            topic, subtopic, difficulty, style, personality = futures[future]
+            done += 1
+            label = f"{subtopic + ' in ' if subtopic else ''}{topic} ({difficulty}, {style}, {personality})"
+            try:
+                failed = future.result()
+            except Exception as e:
+                failed = [str(e)]
+
+            if failed:
+                failures += 1
+                logger.warning(f"[{done}/{len(jobs)}] Failed: {label} - {', '.join(failed)}")
+            else:
+                elapsed = time.monotonic() - started
+                rate = done / elapsed if elapsed else 0.0
+                eta = (len(jobs) - done) / rate if rate else 0.0
+                logger.info(f"[{done}/{len(jobs)}] {label} - {rate * 60:.1f} lessons/min, ETA {eta:.0f}s")
+    except KeyboardInterrupt:
+        logger.info("Interrupted; stored lessons are kept and the next run resumes from here")
+        executor.shutdown(wait=False, cancel_futures=True)
+        sys.exit(1)
+    executor.shutdown()
+
+    elapsed = time.monotonic() - started
+    logger.info(f"Generated {done - failures} lessons in {elapsed:.1f}s, {failures} failed")
+    if failures:
+        logger.info("Run again to retry the failed lessons")
+
+if __name__ == "__main__":
+    main()
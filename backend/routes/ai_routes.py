@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, send_file
 import os
 import sys
 import json
@@ -13,6 +13,10 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from services.ai_service import setup_ai_models
 from services.speech_service import setup_speech_services
 from services.auth_service import get_user_profile, store_user_learning_data
+from services.job_queue import JobQueue
+from services.blob_store import BlobStore
+from config import ImageConfig
+from utils import format_sse
 
 # Initialize AI models
 ai_service = setup_ai_models()
@@ -34,17 +38,26 @@ def process_text():
         
         text_input = data['text']
         user_id = data.get('uid')
-        context = data.get('context', '')
+        session_id = data.get('sessionId') or user_id
         settings = data.get('settings')
         
+        # Server-side memory of the session takes over from the client's context once it has turns
+        context = ai_service.conversation_context(session_id, fallback=data.get('context', ''))
+        
         # Get user settings if available
         if user_id and not settings:
             user_profile = get_user_profile(user_id)
             if user_profile and 'preferences' in user_profile:
                 settings = user_profile['preferences']
         
-        # Generate AI response
-        response_text = ai_service.query_gemini(text_input, user_settings=settings)
+        # Generate AI response, grounded in indexed documents if requested
+        response_text = ai_service.query_gemini(
+            text_input,
+            user_settings=settings,
+            use_rag=data.get('useRag', False),
+            context=context
+        )
+        ai_service.remember_turn(session_id, text_input, response_text)
         
         # Generate speech if requested
         audio_response = None
@@ -80,6 +93,87 @@ def process_text():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@ai_bp.route('/process-text/stream', methods=['POST'])
+def process_text_stream():
+    """Stream the AI response to a text message as Server-Sent Events"""
+    data = request.json
+    
+    if not data or 'text' not in data:
+        return jsonify({'error': 'Text input is required'}), 400
+    
+    text_input = data['text']
+    user_id = data.get('uid')
+    session_id = data.get('sessionId') or user_id
+    context = ai_service.conversation_context(session_id, fallback=data.get('context', ''))
+    settings = data.get('settings')
+    generate_notes = data.get('generateStructuredNotes', False)
+    generate_emotion = data.get('generateEmotionalSpeech', True)
+    use_rag = data.get('useRag', False)
+    speak = data.get('speak', False)
+    audio_format = data.get('audioFormat', 'base64')
+    
+    # Get user settings if available
+    if user_id and not settings:
+        user_profile = get_user_profile(user_id)
+        if user_profile and 'preferences' in user_profile:
+            settings = user_profile['preferences']
+    
+    def finish(response_text):
+        """Post-process once the full response is available"""
+        ai_service.remember_turn(session_id, text_input, response_text)
+        
+        result = {'type': 'done', 'text': response_text}
+        if generate_emotion:
+            result['emotion'] = ai_service.detect_emotion(text_input, response_text)
+        if generate_notes:
+            result['structuredNotes'] = ai_service.build_structured_notes(response_text)
+        
+        # Store interaction in user history if user_id is provided
+        if user_id:
+            interaction_data = {
+                'timestamp': datetime.now().isoformat(),
+                'userInput': text_input,
+                'aiResponse': response_text,
+                'topic': extract_topic(text_input, response_text),
+                'type': 'text'
+            }
+            
+            store_user_learning_data(user_id, interaction_data)
+        
+        return result
+    
+    def generate():
+        chunks = []
+        try:
+            text_stream = ai_service.stream_gemini(text_input, user_settings=settings, use_rag=use_rag, context=context)
+            
+            if speak:
+                # Audio events for each finished sentence are interleaved with the text and
+                # continue after "done" until "audio_done"
+                for event in speech_service.speak_stream(text_stream, voice_settings=settings, audio_format=audio_format):
+                    if event['type'] == 'text_end':
+                        yield format_sse(finish(''.join(chunks)))
+                        continue
+                    if event['type'] == 'chunk':
+                        chunks.append(event['text'])
+                    yield format_sse(event)
+                return
+            
+            # Flush each chunk to the client as soon as it arrives
+            for chunk in text_stream:
+                chunks.append(chunk)
+                yield format_sse({'type': 'chunk', 'text': chunk})
+            
+            yield format_sse(finish(''.join(chunks)))
+        except Exception as e:
+            yield format_sse({'type': 'error', 'error': str(e)})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @ai_bp.route('/process-voice', methods=['POST'])
 async def process_voice():
     """Process user's voice input and generate AI response with voice"""
@@ -91,6 +185,7 @@ async def process_voice():
         
         audio_input = data['audio']
         user_id = data.get('uid')
+        session_id = data.get('sessionId') or user_id
         settings = data.get('settings')
         
         # Get user settings if available
@@ -106,7 +201,12 @@ async def process_voice():
             return jsonify({'error': 'Failed to transcribe audio'}), 400
         
         # Generate AI response
-        response_text = ai_service.query_gemini(text_input, user_settings=settings)
+        response_text = ai_service.query_gemini(
+            text_input,
+            user_settings=settings,
+            context=ai_service.conversation_context(session_id)
+        )
+        ai_service.remember_turn(session_id, text_input, response_text)
         
         # Generate speech response
         audio_response = await speech_service.text_to_speech(response_text, voice_settings=settings)
@@ -218,7 +318,8 @@ def generate_notes():
                 'topic': topic,
                 'notes': notes_data['notes'],
                 'type': 'notes',
-                'hasDiagram': 'diagram_url' in notes_data and notes_data['diagram_url'] is not None
+                'hasDiagram': 'diagram_url' in notes_data and notes_data['diagram_url'] is not None,
+                'diagramJobId': notes_data.get('diagram_job', {}).get('id')
             }
             
             store_user_learning_data(user_id, notes_data_history)
@@ -342,6 +443,22 @@ def generate_image():
         prompt = data['prompt']
         user_id = data.get('uid')
         
+        # Queue the image and return at once; the client polls /jobs/<id> or listens for job_update
+        if data.get('async'):
+            job = ai_service.submit_image_job(prompt)
+            
+            if user_id:
+                image_data_history = {
+                    'timestamp': datetime.now().isoformat(),
+                    'prompt': prompt,
+                    'type': 'image-generation',
+                    'jobId': job['id']
+                }
+                
+                store_user_learning_data(user_id, image_data_history)
+            
+            return jsonify({'job': JobQueue.public_view(job)}), 202
+        
         # Generate image
         image_data = ai_service.generate_image(prompt)
         
@@ -365,6 +482,40 @@ def generate_image():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@ai_bp.route('/images/<key>', methods=['GET'])
+def get_image(key):
+    """Serve a stored generated image"""
+    try:
+        found = ai_service.image_store.get(key) if BlobStore.is_valid_key(key) else None
+        
+        if found is None:
+            return jsonify({'error': 'Image not found'}), 404
+        
+        # The key hashes the prompt, not the image, and an evicted image can be regenerated
+        # differently, so clients revalidate against a hash of the bytes
+        file_path, content_type = found
+        response = send_file(file_path, mimetype=content_type, conditional=True,
+                             etag=ai_service.image_store.digest(key) or True)
+        response.headers['Cache-Control'] = f"public, max-age={ImageConfig.CACHE_MAX_AGE}"
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ai_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status and result of a background job"""
+    try:
+        job = ai_service.get_job(job_id)
+        
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify({'job': JobQueue.public_view(job)})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Helper functions
 def extract_topic(user_input, ai_response):
     """Extract topic from conversation"""
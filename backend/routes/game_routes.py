@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 import os
 import sys
 import json
@@ -11,6 +11,8 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 # Import service modules
 from services.ai_service import setup_ai_models
 from services.auth_service import get_user_profile, store_user_learning_data
+from services.structured_output import validate_item
+from utils import format_sse
 
 # Initialize AI models
 ai_service = setup_ai_models()
@@ -99,6 +101,64 @@ def math_challenge():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@game_bp.route('/math-challenge/stream', methods=['POST'])
+def math_challenge_stream():
+    """Stream math challenge questions as Server-Sent Events, one event per question"""
+    data = request.json or {}
+    difficulty = data.get('difficulty', 'intermediate')
+    count = data.get('count', 5)
+    topic = data.get('topic', 'general math')
+    user_id = data.get('uid')
+    
+    def generate():
+        try:
+            sent = 0
+            if difficulty == 'advanced':
+                # Send each AI-generated question as soon as the model finishes writing it
+                for item in ai_service.stream_json_items(
+                    build_advanced_math_prompt(count, topic),
+                    name="advanced_math_questions"
+                ):
+                    question = normalize_math_question(item, sent)
+                    if question is None:
+                        continue
+                    sent += 1
+                    yield format_sse({'type': 'question', 'question': question})
+                    if sent >= count:
+                        break
+            
+            if sent == 0:
+                if difficulty == 'beginner':
+                    questions = generate_beginner_math_questions(count, topic)
+                else:
+                    # Intermediate, or the fallback when no advanced question could be parsed
+                    questions = generate_intermediate_math_questions(count, topic)
+                for question in questions:
+                    sent += 1
+                    yield format_sse({'type': 'question', 'question': question})
+            
+            # Store game session in user history if user_id is provided
+            if user_id:
+                game_data = {
+                    'timestamp': datetime.now().isoformat(),
+                    'game': 'math-challenge',
+                    'difficulty': difficulty,
+                    'topic': topic,
+                    'type': 'game-session'
+                }
+                
+                store_user_learning_data(user_id, game_data)
+            
+            yield format_sse({'type': 'done', 'count': sent})
+        except Exception as e:
+            yield format_sse({'type': 'error', 'error': str(e)})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @game_bp.route('/word-wizard', methods=['POST'])
 def word_wizard():
     """Generate word wizard game content"""
@@ -341,12 +401,9 @@ def generate_intermediate_math_questions(count, topic):
     
     return questions
 
-def generate_advanced_math_questions(count, topic):
-    """Generate advanced-level math questions using AI"""
-    questions = []
-    
-    # Use AI to generate advanced math questions based on topic
-    prompt = f"""Generate {count} advanced-level math questions about {topic}.
+def build_advanced_math_prompt(count, topic):
+    """Build the prompt asking the AI for advanced math questions as a JSON array"""
+    return f"""Generate {count} advanced-level math questions about {topic}.
     For each question, provide:
     1. A clear and concise question
     2. The correct answer (must be a numerical value)
@@ -360,21 +417,23 @@ def generate_advanced_math_questions(count, topic):
         "answer": "22"
       }}
     ]"""
+
+def generate_advanced_math_questions(count, topic):
+    """Generate advanced-level math questions using AI"""
+    questions = []
+    
+    # Use AI to generate advanced math questions based on topic
+    prompt = build_advanced_math_prompt(count, topic)
     
     try:
-        response = ai_service.query_gemini(prompt)
+        # Extract the question list even when it is wrapped in prose or a code fence
+        parsed_questions = ai_service.query_json(prompt, list, name="advanced_math_questions")
+        parsed_questions = [
+            normalize_math_question(question, i) for i, question in enumerate(parsed_questions or [])
+        ]
+        questions = [question for question in parsed_questions if question is not None]
         
-        # Try to parse the response as JSON
-        try:
-            parsed_questions = json.loads(response)
-            
-            if isinstance(parsed_questions, list) and len(parsed_questions) > 0:
-                questions = parsed_questions
-            else:
-                # Fallback to manually generated questions
-                questions = generate_intermediate_math_questions(count, topic)
-                
-        except json.JSONDecodeError:
+        if not questions:
             # Fallback to manually generated questions
             questions = generate_intermediate_math_questions(count, topic)
             
@@ -384,6 +443,17 @@ def generate_advanced_math_questions(count, topic):
     
     return questions
 
+def normalize_math_question(question, index):
+    """Validate an AI-generated math question, filling in id and type"""
+    question = validate_item(
+        question,
+        required=('question', 'answer'),
+        defaults={'id': f"math-{index+1}", 'type': 'number'}
+    )
+    if question is not None:
+        question['answer'] = str(question['answer'])
+    return question
+
 def verify_math_answer(question, user_answer, correct_answer=None):
     """Verify user's answer to a math question"""
     try:
@@ -454,12 +524,15 @@ def verify_math_answer(question, user_answer, correct_answer=None):
         
         Format as JSON: {{"isCorrect": true/false, "correctAnswer": "answer", "explanation": "explanation"}}"""
         
-        response = ai_service.query_gemini(prompt)
+        result = validate_item(
+            ai_service.query_json(prompt, dict, name="math_answer_verification"),
+            required=('isCorrect',),
+            defaults={'correctAnswer': 'Unknown', 'explanation': ''}
+        )
         
-        try:
-            result = json.loads(response)
+        if result is not None:
             return result
-        except json.JSONDecodeError:
+        else:
             # Fallback response
             return {
                 'isCorrect': False,
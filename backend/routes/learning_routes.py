@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 import os
 import sys
 import json
@@ -9,10 +9,15 @@ import asyncio
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Import service modules
-from services.ai_service import setup_ai_models
+from services.ai_service import setup_ai_models, LESSON_DEFAULTS, FALLBACK_PREFIXES
+from services import course_catalog
+from services.structured_output import validate_items
+from services.rate_limiter import BACKGROUND, lane
+from services.concurrency import submit_call, collect_results
 from services.auth_service import (
     get_user_profile, store_user_learning_data, get_user_learning_history
 )
+from utils import format_sse
 
 # Initialize AI models
 ai_service = setup_ai_models()
@@ -24,67 +29,8 @@ learning_bp = Blueprint('learning', __name__)
 def get_courses():
     """Get available courses"""
     try:
-        # For now, we'll return a hardcoded list of courses
-        # In a real application, this would be fetched from a database
-        courses = [
-            {
-                'id': 'cs101',
-                'title': 'Computer Science Fundamentals',
-                'description': 'An introduction to basic computer science concepts',
-                'image': 'https://source.unsplash.com/random/300x200/?computer',
-                'topics': [
-                    'Introduction to Programming',
-                    'Data Structures',
-                    'Algorithms',
-                    'Computer Architecture'
-                ],
-                'difficulty': 'beginner',
-                'duration': '8 weeks'
-            },
-            {
-                'id': 'math101',
-                'title': 'Mathematics Fundamentals',
-                'description': 'Learn essential mathematical concepts',
-                'image': 'https://source.unsplash.com/random/300x200/?math',
-                'topics': [
-                    'Algebra',
-                    'Geometry',
-                    'Calculus',
-                    'Statistics'
-                ],
-                'difficulty': 'intermediate',
-                'duration': '10 weeks'
-            },
-            {
-                'id': 'phys101',
-                'title': 'Physics Fundamentals',
-                'description': 'Explore the laws of nature and physics principles',
-                'image': 'https://source.unsplash.com/random/300x200/?physics',
-                'topics': [
-                    'Mechanics',
-                    'Thermodynamics',
-                    'Electromagnetism',
-                    'Modern Physics'
-                ],
-                'difficulty': 'intermediate',
-                'duration': '12 weeks'
-            },
-            {
-                'id': 'webdev',
-                'title': 'Full Stack Web Development',
-                'description': 'Build modern web applications from scratch',
-                'image': 'https://source.unsplash.com/random/300x200/?website',
-                'topics': [
-                    'HTML & CSS',
-                    'JavaScript',
-                    'React',
-                    'Node.js',
-                    'Databases'
-                ],
-                'difficulty': 'intermediate',
-                'duration': '16 weeks'
-            }
-        ]
+        # Courses come from the shared catalog (also used by pregenerate.py)
+        courses = course_catalog.get_courses()
         
         return jsonify({'courses': courses})
         
@@ -95,116 +41,12 @@ def get_courses():
 def get_course(course_id):
     """Get course details by ID"""
     try:
-        # For now, we'll return hardcoded course details
-        # In a real application, this would be fetched from a database based on course_id
-        
-        courses = {
-            'cs101': {
-                'id': 'cs101',
-                'title': 'Computer Science Fundamentals',
-                'description': 'An introduction to basic computer science concepts',
-                'image': 'https://source.unsplash.com/random/300x200/?computer',
-                'topics': [
-                    {
-                        'id': 'cs101-intro',
-                        'title': 'Introduction to Programming',
-                        'subtopics': [
-                            'What is Programming?',
-                            'Programming Languages',
-                            'Basic Syntax and Variables',
-                            'Control Structures'
-                        ]
-                    },
-                    {
-                        'id': 'cs101-data',
-                        'title': 'Data Structures',
-                        'subtopics': [
-                            'Arrays and Lists',
-                            'Stacks and Queues',
-                            'Trees and Graphs',
-                            'Hash Tables'
-                        ]
-                    },
-                    {
-                        'id': 'cs101-algo',
-                        'title': 'Algorithms',
-                        'subtopics': [
-                            'Sorting Algorithms',
-                            'Searching Algorithms',
-                            'Recursion',
-                            'Complexity Analysis'
-                        ]
-                    },
-                    {
-                        'id': 'cs101-arch',
-                        'title': 'Computer Architecture',
-                        'subtopics': [
-                            'CPU and Memory',
-                            'Input/Output Systems',
-                            'Operating Systems',
-                            'Networking Basics'
-                        ]
-                    }
-                ],
-                'difficulty': 'beginner',
-                'duration': '8 weeks'
-            },
-            'math101': {
-                'id': 'math101',
-                'title': 'Mathematics Fundamentals',
-                'description': 'Learn essential mathematical concepts',
-                'image': 'https://source.unsplash.com/random/300x200/?math',
-                'topics': [
-                    {
-                        'id': 'math101-algebra',
-                        'title': 'Algebra',
-                        'subtopics': [
-                            'Equations and Inequalities',
-                            'Functions and Graphs',
-                            'Polynomials',
-                            'Systems of Equations'
-                        ]
-                    },
-                    {
-                        'id': 'math101-geo',
-                        'title': 'Geometry',
-                        'subtopics': [
-                            'Euclidean Geometry',
-                            'Triangles and Circles',
-                            'Coordinate Geometry',
-                            'Transformations'
-                        ]
-                    },
-                    {
-                        'id': 'math101-calc',
-                        'title': 'Calculus',
-                        'subtopics': [
-                            'Limits and Continuity',
-                            'Derivatives',
-                            'Integrals',
-                            'Applications of Calculus'
-                        ]
-                    },
-                    {
-                        'id': 'math101-stats',
-                        'title': 'Statistics',
-                        'subtopics': [
-                            'Descriptive Statistics',
-                            'Probability',
-                            'Distributions',
-                            'Hypothesis Testing'
-                        ]
-                    }
-                ],
-                'difficulty': 'intermediate',
-                'duration': '10 weeks'
-            }
-        }
+        course = course_catalog.get_course(course_id)
         
-        if course_id not in courses:
+        if course is None:
             return jsonify({'error': 'Course not found'}), 404
         
-        return jsonify({'course': courses[course_id]})
+        return jsonify({'course': course})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -298,12 +140,6 @@ def learn_topic(topic):
         subtopic = data.get('subtopic', '')
         difficulty = data.get('difficulty', 'intermediate')
         
-        # Format the query based on topic and subtopic
-        if subtopic:
-            query = f"Teach me about {subtopic} in {topic} at {difficulty} level"
-        else:
-            query = f"Teach me about {topic} at {difficulty} level"
-        
         # Get user settings if available
         settings = data.get('settings')
         if user_id and not settings:
@@ -311,25 +147,31 @@ def learn_topic(topic):
             if user_profile and 'preferences' in user_profile:
                 settings = user_profile['preferences']
         
-        # Generate learning content
-        content = ai_service.query_gemini(query, user_settings=settings)
-        
-        # Generate practice questions
-        practice_questions = ai_service.generate_practice_questions(
-            topic if not subtopic else f"{subtopic} in {topic}", 
-            difficulty
+        # Catalog lessons are served from the pre-generated lesson store
+        lesson_topic = course_catalog.resolve_topic(topic)
+        lesson = ai_service.get_stored_lesson(lesson_topic, subtopic, difficulty, settings)
+        failed = []
+        if lesson is None:
+            ai_service.record_lesson_request(lesson_topic, subtopic, difficulty, settings)
+            lesson, failed = ai_service.generate_lesson(lesson_topic, subtopic, difficulty, settings)
+        
+        content = lesson['content']
+        practice_questions = lesson['practice_questions']
+        related_topics = lesson['related_topics']
+        
+        # Get the likely next lessons ready while the student reads this one
+        # (placeholder related topics name nothing to prefetch)
+        ai_service.prefetch_after_lesson(
+            lesson_topic, subtopic, difficulty, settings,
+            None if 'related_topics' in failed else related_topics
         )
         
-        # Suggest related topics
-        related_topics = ai_service.suggest_related_topics(
-            topic if not subtopic else f"{subtopic} in {topic}"
-        )
-        
-        # Store learning session in user history if user_id is provided
-        if user_id:
+        # Store learning session in user history if user_id is provided,
+        # unless the lesson itself is only placeholder text
+        if user_id and 'content' not in failed:
             learning_data = {
                 'timestamp': datetime.now().isoformat(),
-                'topic': topic,
+                'topic': lesson_topic,
                 'subtopic': subtopic if subtopic else None,
                 'difficulty': difficulty,
                 'content': content,
@@ -347,6 +189,104 @@ def learn_topic(topic):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@learning_bp.route('/learn/<topic>/stream', methods=['POST'])
+def learn_topic_stream(topic):
+    """Stream a lesson about a topic as Server-Sent Events"""
+    data = request.json or {}
+    user_id = data.get('uid')
+    subtopic = data.get('subtopic', '')
+    difficulty = data.get('difficulty', 'intermediate')
+    topic = course_catalog.resolve_topic(topic)
+    
+    # Format the query based on topic and subtopic
+    if subtopic:
+        query = f"Teach me about {subtopic} in {topic} at {difficulty} level"
+    else:
+        query = f"Teach me about {topic} at {difficulty} level"
+    
+    # Get user settings if available
+    settings = data.get('settings')
+    if user_id and not settings:
+        user_profile = get_user_profile(user_id)
+        if user_profile and 'preferences' in user_profile:
+            settings = user_profile['preferences']
+    
+    full_topic = topic if not subtopic else f"{subtopic} in {topic}"
+    stored_lesson = ai_service.get_stored_lesson(topic, subtopic, difficulty, settings)
+    if stored_lesson is None:
+        ai_service.record_lesson_request(topic, subtopic, difficulty, settings)
+    user_settings = settings
+    settings = ai_service.lesson_settings(difficulty, settings)
+    
+    def generate():
+        chunks = []
+        failed = []
+        try:
+            if stored_lesson is not None:
+                # Pre-generated catalog lessons are sent whole
+                content = stored_lesson['content']
+                practice_questions = stored_lesson['practice_questions']
+                related_topics = stored_lesson['related_topics']
+                yield format_sse({'type': 'chunk', 'text': content})
+            else:
+                # Start practice questions and related topics while the lesson streams
+                futures = {
+                    'practice_questions': submit_call(ai_service.generate_practice_questions, full_topic, difficulty),
+                    'related_topics': submit_call(ai_service.suggest_related_topics, full_topic)
+                }
+                
+                for chunk in ai_service.stream_gemini(query, user_settings=settings, task="lesson"):
+                    chunks.append(chunk)
+                    yield format_sse({'type': 'chunk', 'text': chunk})
+                
+                content = ''.join(chunks)
+                
+                results, errors = collect_results(futures, defaults=LESSON_DEFAULTS)
+                practice_questions = results['practice_questions']
+                related_topics = results['related_topics']
+                
+                # Parts that are only placeholder text, as generate_lesson reports them
+                lesson = {'content': content, 'practice_questions': practice_questions, 'related_topics': related_topics}
+                failed = [
+                    part for part, text in lesson.items()
+                    if part in errors or not text or str(text).startswith(FALLBACK_PREFIXES)
+                ]
+            
+            # (placeholder related topics name nothing to prefetch)
+            ai_service.prefetch_after_lesson(
+                topic, subtopic, difficulty, user_settings,
+                None if 'related_topics' in failed else related_topics
+            )
+            
+            # Store learning session in user history if user_id is provided,
+            # unless the lesson itself is only placeholder text
+            if user_id and 'content' not in failed:
+                learning_data = {
+                    'timestamp': datetime.now().isoformat(),
+                    'topic': topic,
+                    'subtopic': subtopic if subtopic else None,
+                    'difficulty': difficulty,
+                    'content': content,
+                    'type': 'learning-session'
+                }
+                
+                store_user_learning_data(user_id, learning_data)
+            
+            yield format_sse({
+                'type': 'done',
+                'content': content,
+                'practice_questions': practice_questions,
+                'related_topics': related_topics
+            })
+        except Exception as e:
+            yield format_sse({'type': 'error', 'error': str(e)})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @learning_bp.route('/progress', methods=['GET'])
 def get_learning_progress():
     """Get user's learning progress"""
@@ -477,18 +417,23 @@ def get_learning_resources():
             id, title, description, type"""
             
             try:
-                response = ai_service.query_gemini(prompt)
+                # Extract the resource list even when it is wrapped in prose or a code fence
+                with lane(BACKGROUND):
+                    resources_json = ai_service.query_json(prompt, list, name="learning_resources")
+                parsed_resources = validate_items(
+                    resources_json,
+                    required=('title',),
+                    defaults={'description': '', 'type': 'website'}
+                )
                 
-                # Try to parse the response as JSON
-                try:
-                    parsed_resources = json.loads(response)
-                    
-                    # Add image URLs
-                    for resource in parsed_resources:
+                if parsed_resources:
+                    # Add IDs and image URLs
+                    for i, resource in enumerate(parsed_resources):
+                        resource.setdefault('id', f"res-{topic.replace(' ', '-')}-{i+1}")
                         resource['image'] = f"https://source.unsplash.com/random/300x200/?{topic.replace(' ', '')}"
                     
                     resources = parsed_resources
-                except json.JSONDecodeError:
+                else:
                     # If parsing fails, use default resources
                     resources = [
                         {
@@ -1,8 +1,30 @@
 import os
 import openai
 import base64
+import threading
 import requests
+import numpy as np
 from dotenv import load_dotenv
+from config import ImageInputConfig, PrefetchConfig, ConversationConfig, CacheConfig, RoutingConfig, CircuitBreakerConfig, EmbeddingConfig, RagConfig, LessonConfig, TokenBudgetConfig, JobConfig, ImageConfig, RateLimitConfig
+from services.response_cache import ResponseCache
+from services.provider_router import ProviderRouter
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.single_flight import SingleFlight
+from services.embedding_batcher import EmbeddingBatcher
+from services.embedding_store import EmbeddingStore
+from services.vector_index import VectorIndex
+from services.lesson_store import LessonStore
+from services.token_budget import TokenBudget, estimate_tokens
+from services.job_queue import JobQueue
+from services.image_preprocessing import ImagePreprocessor
+from services.prefetcher import LessonPrefetcher
+from services.conversation_memory import ConversationMemory
+from services.blob_store import BlobStore
+from services.structured_output import parse_json, parse_stats, IncrementalArrayParser
+from services.concurrency import run_parallel
+from services.http_client import get_http_client
+from services.rate_limiter import RateLimiter, RateLimitTimeout, BACKGROUND, lane
+from services.provider_simulator import get_simulator, SimulatedGeminiModel, SimulatedOpenAI
 
 # Load environment variables
 load_dotenv()
@@ -14,12 +36,147 @@ except ImportError:
     print("Google Generative AI library not installed, Gemini features will be disabled")
     genai = None
 
+# Fallback values for lesson parts that fail or time out
+LESSON_DEFAULTS = {
+    'content': "I couldn't generate this lesson right now. Please try again.",
+    'practice_questions': "I couldn't generate practice questions right now.",
+    'related_topics': "I couldn't suggest related topics right now."
+}
+
+# Prefixes of the fallback text returned instead of raising
+FALLBACK_PREFIXES = ("I'm having trouble", "I couldn't", "Unable to")
+
+GEMINI_MODEL = "gemini-1.5-pro"
+OPENAI_CHAT_MODEL = "gpt-3.5-turbo"
+
 class AIService:
     def __init__(self):
         # AI model instances
         self.gemini_model = None
         self.rag_engine = None
         
+        # Response cache for repeated prompts
+        self.response_cache = None
+        if CacheConfig.RESPONSE_CACHE_ENABLED:
+            self.response_cache = ResponseCache(
+                max_entries=CacheConfig.RESPONSE_CACHE_MAX_ENTRIES,
+                ttl=CacheConfig.RESPONSE_CACHE_TTL,
+                disk_path=CacheConfig.RESPONSE_CACHE_DIR or None,
+                max_disk_bytes=CacheConfig.RESPONSE_CACHE_MAX_DISK_MB * 1024 * 1024
+            )
+        
+        # Latency-aware routing between Gemini and OpenAI
+        self.provider_router = ProviderRouter(
+            hedge_enabled=RoutingConfig.HEDGE_ENABLED,
+            hedge_percentile=RoutingConfig.HEDGE_PERCENTILE,
+            hedge_min_delay=RoutingConfig.HEDGE_MIN_DELAY,
+            hedge_default_delay=RoutingConfig.HEDGE_DEFAULT_DELAY,
+            hedge_max_ratio=RoutingConfig.HEDGE_MAX_RATIO,
+            alpha=RoutingConfig.EWMA_ALPHA,
+            error_rate_threshold=RoutingConfig.ERROR_RATE_THRESHOLD,
+            # A breaker refusing the call or our own rate limiter timing out is not provider latency
+            ignored_exceptions=(CircuitOpenError, RateLimitTimeout)
+        )
+        
+        # Identical in-flight prompts share one provider call
+        self.single_flight = SingleFlight(timeout=RoutingConfig.COALESCE_TIMEOUT)
+        
+        # Circuit breakers so a failing provider is skipped immediately
+        self.circuit_breakers = {
+            provider: CircuitBreaker(
+                provider,
+                failure_threshold=CircuitBreakerConfig.FAILURE_THRESHOLD,
+                minimum_calls=CircuitBreakerConfig.MINIMUM_CALLS,
+                window=CircuitBreakerConfig.WINDOW,
+                recovery_timeout=CircuitBreakerConfig.RECOVERY_TIMEOUT,
+                half_open_max_calls=CircuitBreakerConfig.HALF_OPEN_MAX_CALLS,
+                # Waiting on our own rate limiter says nothing about the provider
+                ignored_exceptions=(RateLimitTimeout,)
+            )
+            for provider in ("gemini", "openai")
+        }
+        
+        # Client-side request and token limits, serving interactive calls first
+        self.rate_limiter = None
+        if RateLimitConfig.ENABLED:
+            self.rate_limiter = RateLimiter(RateLimitConfig.LIMITS, max_wait=RateLimitConfig.MAX_WAIT)
+        
+        # Persistent embedding stores, one per model
+        self.embedding_stores = {}
+        self._embedding_store_lock = threading.Lock()
+        
+        # Merge concurrent single-text embedding requests into batches
+        self.embedding_batcher = EmbeddingBatcher(
+            self.generate_embeddings,
+            max_batch_size=EmbeddingConfig.MICRO_BATCH_SIZE,
+            max_wait_ms=EmbeddingConfig.MICRO_BATCH_WAIT_MS
+        )
+        
+        # Output caps, context trimming and token accounting
+        self.token_budget = TokenBudget(
+            TokenBudgetConfig.TASK_OUTPUT_TOKENS,
+            style_multipliers=TokenBudgetConfig.STYLE_MULTIPLIERS,
+            default_cap=TokenBudgetConfig.DEFAULT_OUTPUT_TOKENS,
+            context_tokens=TokenBudgetConfig.CONTEXT_TOKENS
+        )
+        
+        # Pre-generated catalog lessons
+        self.lesson_store = None
+        if LessonConfig.STORE_ENABLED:
+            self.lesson_store = LessonStore(
+                LessonConfig.STORE_PATH,
+                version=LessonConfig.VERSION,
+                max_memory_entries=LessonConfig.MEMORY_ENTRIES
+            )
+        
+        # Recent turns and a rolling summary per chat session
+        self.conversation_memory = ConversationMemory(
+            self._summarize_context,
+            estimate_tokens,
+            lambda text, max_tokens: self.token_budget.trim_to_tokens(text, max_tokens, keep="start"),
+            recent_turns=ConversationConfig.RECENT_TURNS,
+            fold_turns=ConversationConfig.FOLD_TURNS,
+            summary_tokens=ConversationConfig.SUMMARY_TOKENS,
+            max_tokens=TokenBudgetConfig.CONTEXT_TOKENS,
+            max_sessions=ConversationConfig.MAX_SESSIONS,
+            ttl=ConversationConfig.SESSION_TTL
+        )
+        
+        # Likely next lessons are generated into the response cache ahead of the click
+        self.prefetcher = None
+        if PrefetchConfig.ENABLED and self.response_cache is not None:
+            self.prefetcher = LessonPrefetcher(
+                self,
+                next_lessons=PrefetchConfig.NEXT_LESSONS,
+                related_topics=PrefetchConfig.RELATED_TOPICS,
+                budget_per_hour=PrefetchConfig.BUDGET_PER_HOUR,
+                max_pending=PrefetchConfig.MAX_PENDING,
+                workers=PrefetchConfig.WORKERS
+            )
+        
+        # Generated images, stored once and served from our own endpoint
+        self.image_store = BlobStore(
+            ImageConfig.STORE_PATH,
+            max_bytes=ImageConfig.STORE_MAX_DISK_MB * 1024 * 1024
+        )
+        
+        # Uploaded images are downscaled, stripped and deduplicated before multimodal calls
+        self.image_preprocessor = ImagePreprocessor(
+            max_dimension=ImageInputConfig.MAX_DIMENSION,
+            quality=ImageInputConfig.JPEG_QUALITY,
+            max_bytes=ImageInputConfig.MAX_UPLOAD_MB * 1024 * 1024,
+            cache_entries=ImageInputConfig.CACHE_ENTRIES
+        )
+        
+        # Background queue for image and diagram generation
+        self.job_queue = JobQueue(
+            JobConfig.STORE_PATH,
+            max_workers=JobConfig.MAX_WORKERS,
+            max_retries=JobConfig.MAX_RETRIES,
+            retry_backoff=JobConfig.RETRY_BACKOFF,
+            result_ttl=JobConfig.RESULT_TTL
+        )
+        
         # User customization settings
         self.default_settings = {
             "voice": "female",
@@ -32,9 +189,28 @@ class AIService:
         
         # Initialize OpenAI client
         openai.api_key = os.environ.get("OPENAI_API_KEY")
+        # Share one keep-alive connection pool across threads instead of a session per thread
+        openai.requestssession = get_http_client().session_for(openai.api_base)
+        
+        # Offline stand-ins for the providers when PROVIDER_MODE is record or simulate
+        self.simulator = get_simulator()
+        self.openai = openai
+        if self.simulator is not None:
+            self.openai = SimulatedOpenAI(self.simulator, openai)
+        
+        # Registered last: handlers use the clients above
+        self.job_queue.register("image", self._image_job)
+    
+    def start_jobs(self):
+        """Run queued image jobs in this process; only the server calls this"""
+        self.job_queue.start()
     
     def setup_gemini(self):
         """Set up Google Gemini Pro model"""
+        if self.simulator is not None and not self.simulator.recording:
+            self.gemini_model = SimulatedGeminiModel(self.simulator)
+            return self.gemini_model
+        
         if genai is None:
             print("Gemini features are disabled: library not installed")
             return None
@@ -46,142 +222,704 @@ class AIService:
                 return None
                 
             genai.configure(api_key=api_key)
-            self.gemini_model = genai.GenerativeModel("gemini-1.5-pro")
+            self.gemini_model = genai.GenerativeModel(GEMINI_MODEL)
+            if self.simulator is not None:
+                self.gemini_model = SimulatedGeminiModel(self.simulator, self.gemini_model)
             return self.gemini_model
         except Exception as e:
             print(f"Error setting up Gemini: {e}")
             return None
     
-    def query_gemini(self, prompt, image=None, user_settings=None):
+    def setup_rag(self, fresh=False):
+        """Load the retrieval index from disk, or start an empty one"""
+        try:
+            if not fresh and os.path.exists(os.path.join(RagConfig.INDEX_PATH, "meta.json")):
+                self.rag_engine = VectorIndex.load(
+                    RagConfig.INDEX_PATH,
+                    ivf_threshold=RagConfig.IVF_THRESHOLD,
+                    nlist=RagConfig.NLIST,
+                    nprobe=RagConfig.NPROBE
+                )
+            else:
+                self.rag_engine = VectorIndex(
+                    ivf_threshold=RagConfig.IVF_THRESHOLD,
+                    nlist=RagConfig.NLIST,
+                    nprobe=RagConfig.NPROBE
+                )
+            return self.rag_engine
+        except Exception as e:
+            print(f"Error setting up RAG index: {e}")
+            return None
+    
+    def save_rag_index(self):
+        """Persist the retrieval index"""
+        if self.rag_engine is not None:
+            self.rag_engine.save(RagConfig.INDEX_PATH)
+    
+    def retrieve(self, query, k=None):
+        """Return the top-k indexed chunks for a query as (id, score, payload) tuples"""
+        if self.rag_engine is None or not len(self.rag_engine):
+            return []
+        
+        vector = self.generate_embedding(query)
+        if vector is None:
+            return []
+        
+        return self.rag_engine.search(vector, k or RagConfig.TOP_K)
+    
+    def _augment_with_context(self, prompt):
+        """Prepend retrieved reference chunks to a prompt"""
+        try:
+            results = self.retrieve(prompt)
+        except Exception as e:
+            print(f"Error retrieving context: {e}")
+            return prompt
+        
+        if not results:
+            return prompt
+        
+        references = []
+        for number, (_, score, payload) in enumerate(results, 1):
+            source = payload.get("source")
+            label = f"[{number}] ({source})" if source else f"[{number}]"
+            references.append(f"{label} {payload.get('text', '')}")
+        
+        return (
+            "Use the following reference material where it is relevant:\n"
+            + "\n\n".join(references)
+            + f"\n\nQuestion: {prompt}"
+        )
+    
+    def _build_prompt_prefix(self, settings):
+        """Build the Gemini prompt prefix for the user's teaching settings"""
+        # Adjust prompt based on teaching style and personality
+        prompt_prefix = ""
+        if settings["teaching_style"] == "detailed":
+            prompt_prefix += "Provide a detailed explanation with examples. "
+        elif settings["teaching_style"] == "concise":
+            prompt_prefix += "Provide a concise explanation focusing on key points. "
+        elif settings["teaching_style"] == "interactive":
+            prompt_prefix += "Explain this interactively with questions and answers. "
+        elif settings["teaching_style"] == "socratic":
+            prompt_prefix += "Use the Socratic method to guide through this concept. "
+        
+        if settings["personality"] == "friendly":
+            prompt_prefix += "Be friendly and encouraging. "
+        elif settings["personality"] == "formal":
+            prompt_prefix += "Maintain a formal and professional tone. "
+        elif settings["personality"] == "humorous":
+            prompt_prefix += "Be playful and use appropriate humor. "
+        elif settings["personality"] == "motivational":
+            prompt_prefix += "Be motivational and inspiring. "
+        
+        # Add difficulty level
+        difficulty_guide = f"Explain at {settings['difficulty']} level. "
+        
+        return f"{prompt_prefix}{difficulty_guide}"
+    
+    def _build_system_prompt(self, settings):
+        """Build the OpenAI system prompt for the user's teaching settings"""
+        system_prompt = ""
+        if settings["teaching_style"] == "detailed":
+            system_prompt += "You provide detailed explanations with examples. "
+        elif settings["teaching_style"] == "concise":
+            system_prompt += "You provide concise explanations focusing on key points. "
+        elif settings["teaching_style"] == "interactive":
+            system_prompt += "You explain concepts interactively with questions and answers. "
+        elif settings["teaching_style"] == "socratic":
+            system_prompt += "You use the Socratic method to guide through concepts. "
+        
+        if settings["personality"] == "friendly":
+            system_prompt += "Your tone is friendly and encouraging. "
+        elif settings["personality"] == "formal":
+            system_prompt += "Your tone is formal and professional. "
+        elif settings["personality"] == "humorous":
+            system_prompt += "Your tone is playful and you use appropriate humor. "
+        elif settings["personality"] == "motivational":
+            system_prompt += "Your tone is motivational and inspiring. "
+        
+        system_prompt += f"You explain concepts at {settings['difficulty']} level."
+        return system_prompt
+    
+    def _with_context(self, prompt, context):
+        """Prepend conversation context, trimmed or summarized to fit the prompt budget"""
+        if not context:
+            return prompt
+        context = self.token_budget.fit_context(context, summarize_fn=self._summarize_context)
+        if not context:
+            return prompt
+        return f"Conversation so far:\n{context}\n\n{prompt}"
+    
+    def _summarize_context(self, text):
+        """Summarize conversation text, returning '' instead of a fallback message"""
+        summary = self.summarize_text(text)
+        return "" if summary.startswith(FALLBACK_PREFIXES) else summary
+    
+    def conversation_context(self, session_id, fallback=None):
+        """Return the server-side context of a chat session, or fallback if it has none"""
+        return self.conversation_memory.get_context(session_id) or fallback
+    
+    def remember_turn(self, session_id, user_text, response_text):
+        """Add an exchange to a chat session's memory, skipping failed responses"""
+        if session_id and response_text and not str(response_text).startswith(FALLBACK_PREFIXES):
+            self.conversation_memory.add_turn(session_id, user_text, response_text)
+    
+    def _cache_get(self, prompt, settings, provider, task="chat"):
+        """Look up a cached response, returning (key, value)"""
+        key = ResponseCache.make_key(prompt, settings, provider, task=task)
+        if self.response_cache is None:
+            return key, None
+        return key, self.response_cache.get(key)
+    
+    def _cache_set(self, key, value):
+        """Store a successful response in the cache"""
+        if self.response_cache is not None and key and value:
+            self.response_cache.set(key, value)
+    
+    def _coalesced(self, key, fn):
+        """Run fn once for all identical in-flight requests and cache the result"""
+        def call():
+            result = fn()
+            self._cache_set(key, result)
+            return result
+        
+        return self.single_flight.do(key, call)
+    
+    def get_cache_stats(self):
+        """Return response cache statistics"""
+        if self.response_cache is None:
+            stats = {"enabled": False}
+        else:
+            stats = self.response_cache.get_stats()
+            stats["enabled"] = True
+        stats["lessons"] = self.lesson_store.get_stats() if self.lesson_store is not None else None
+        stats["images"] = self.image_store.get_stats()
+        stats["prefetch"] = self.prefetcher.get_stats() if self.prefetcher is not None else None
+        return stats
+    
+    def get_provider_status(self):
+        """Return routing statistics and circuit state for the LLM providers"""
+        status = self.provider_router.snapshot()
+        status["circuits"] = {
+            provider: breaker.snapshot() for provider, breaker in self.circuit_breakers.items()
+        }
+        status["coalescing"] = self.single_flight.get_stats()
+        status["conversations"] = self.conversation_memory.get_stats()
+        status["tokens"] = self.token_budget.get_stats()
+        status["structuredOutput"] = self.get_structured_output_stats()
+        status["embeddingBatching"] = self.embedding_batcher.get_stats()
+        status["rag"] = self.rag_engine.get_stats() if self.rag_engine is not None else None
+        status["embeddingStores"] = {
+            model: store.get_stats() for model, store in self.embedding_stores.items() if store is not None
+        }
+        status["imageInput"] = self.image_preprocessor.get_stats()
+        status["rateLimits"] = self.rate_limiter.get_stats() if self.rate_limiter is not None else None
+        status["simulator"] = self.simulator.get_stats() if self.simulator is not None else None
+        return status
+    
+    def _route(self, calls):
+        """Send provider calls through their circuit breakers and the router"""
+        guarded = {}
+        for provider, fn in calls.items():
+            breaker = self.circuit_breakers[provider]
+            # Also skips a half-open provider whose probe slots are taken
+            if not breaker.admits_request():
+                continue
+            guarded[provider] = lambda breaker=breaker, fn=fn: breaker.call(fn)
+        
+        if not guarded:
+            raise CircuitOpenError("All AI providers are temporarily unavailable")
+        
+        return self.provider_router.call(guarded)
+    
+    def _generate_gemini(self, contents, stream=False, max_tokens=None, task="chat"):
+        """Call Gemini directly, raising on failure
+        
+        With stream=True, returns (response, reserved): the caller releases
+        the unused part of the reservation once the stream has ended.
+        """
+        prompt_tokens = estimate_tokens(contents[0] if isinstance(contents, list) else contents)
+        reserved = self._reserve("gemini", GEMINI_MODEL, prompt_tokens + (max_tokens or 0))
+        generation_config = {"max_output_tokens": max_tokens} if max_tokens else None
+        try:
+            response = self.gemini_model.generate_content(
+                contents,
+                stream=stream,
+                generation_config=generation_config,
+                request_options={"timeout": RoutingConfig.PROVIDER_TIMEOUT}
+            )
+            if stream:
+                return response, reserved
+            text = response.text
+        except Exception:
+            # A failed call gives its whole reservation back
+            self._release("gemini", GEMINI_MODEL, reserved, 0)
+            raise
+        
+        # Prefer the provider's token counts, estimating when they are missing
+        usage = getattr(response, "usage_metadata", None)
+        input_tokens = getattr(usage, "prompt_token_count", None)
+        output_tokens = getattr(usage, "candidates_token_count", None)
+        if input_tokens is None:
+            input_tokens = prompt_tokens
+        if output_tokens is None:
+            output_tokens = estimate_tokens(text)
+        self.token_budget.record(task, "gemini", input_tokens, output_tokens)
+        self._release("gemini", GEMINI_MODEL, reserved, input_tokens + output_tokens)
+        return text
+    
+    def _generate_openai(self, system_prompt, prompt, max_tokens=800, stream=False, task="chat"):
+        """Call OpenAI directly, raising on failure (with stream=True, returns (response, reserved))"""
+        prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(prompt)
+        reserved = self._reserve("openai", OPENAI_CHAT_MODEL, prompt_tokens + (max_tokens or 0))
+        try:
+            response = self.openai.ChatCompletion.create(
+                model=OPENAI_CHAT_MODEL,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=max_tokens,
+                stream=stream,
+                request_timeout=RoutingConfig.PROVIDER_TIMEOUT
+            )
+            if stream:
+                return response, reserved
+            content = response.choices[0].message.content
+        except Exception:
+            self._release("openai", OPENAI_CHAT_MODEL, reserved, 0)
+            raise
+        
+        usage = response.get("usage") or {}
+        input_tokens = usage.get("prompt_tokens", prompt_tokens)
+        output_tokens = usage.get("completion_tokens", estimate_tokens(content))
+        self.token_budget.record(task, "openai", input_tokens, output_tokens)
+        self._release("openai", OPENAI_CHAT_MODEL, reserved, input_tokens + output_tokens)
+        return content
+    
+    def _reserve(self, provider, model, tokens=0):
+        """Wait for rate limit capacity for one call, returning the tokens reserved"""
+        if self.rate_limiter is None:
+            return 0
+        return self.rate_limiter.acquire(provider, model, tokens)
+    
+    def _release(self, provider, model, reserved, used):
+        """Refund the part of a reservation the call did not use"""
+        if self.rate_limiter is not None and reserved > used:
+            self.rate_limiter.refund(provider, model, reserved - used)
+    
+    def query_gemini(self, prompt, image=None, user_settings=None, use_rag=False, task="chat", context=None):
         """Query Gemini model with text and optional image"""
+        if use_rag:
+            prompt = self._augment_with_context(prompt)
+        prompt = self._with_context(prompt, context)
+        
         if self.gemini_model is None:
-            return self.query_openai(prompt, user_settings)
+            return self.query_openai(prompt, user_settings, task=task)
             
         try:
             # Apply user settings to prompt
             settings = user_settings or self.default_settings
-            
-            # Adjust prompt based on teaching style and personality
-            prompt_prefix = ""
-            if settings["teaching_style"] == "detailed":
-                prompt_prefix += "Provide a detailed explanation with examples. "
-            elif settings["teaching_style"] == "concise":
-                prompt_prefix += "Provide a concise explanation focusing on key points. "
-            elif settings["teaching_style"] == "interactive":
-                prompt_prefix += "Explain this interactively with questions and answers. "
-            elif settings["teaching_style"] == "socratic":
-                prompt_prefix += "Use the Socratic method to guide through this concept. "
-            
-            if settings["personality"] == "friendly":
-                prompt_prefix += "Be friendly and encouraging. "
-            elif settings["personality"] == "formal":
-                prompt_prefix += "Maintain a formal and professional tone. "
-            elif settings["personality"] == "humorous":
-                prompt_prefix += "Be playful and use appropriate humor. "
-            elif settings["personality"] == "motivational":
-                prompt_prefix += "Be motivational and inspiring. "
-            
-            # Add difficulty level
-            difficulty_guide = f"Explain at {settings['difficulty']} level. "
+            max_tokens = self.token_budget.max_output_tokens(task, settings)
             
             # Combine all elements
-            enhanced_prompt = f"{prompt_prefix}{difficulty_guide}{prompt}"
+            enhanced_prompt = f"{self._build_prompt_prefix(settings)}{prompt}"
             
             # Process response based on input type
             if image:
-                # Decode base64 image and create multimodal prompt
-                image_bytes = base64.b64decode(image)
-                response = self.gemini_model.generate_content([enhanced_prompt, image_bytes])
-            else:
-                response = self.gemini_model.generate_content(enhanced_prompt)
+                # Send a compact copy of the image; the same image and question are answered once
+                image_part, digest = self.image_preprocessor.prepare(image)
+                cache_key, cached = self._cache_get(f"{enhanced_prompt}\n[image {digest}]", settings, "gemini", task)
+                if cached is not None:
+                    return cached
+                return self._coalesced(cache_key, lambda: self.circuit_breakers["gemini"].call(
+                    self._generate_gemini, [enhanced_prompt, image_part], max_tokens=max_tokens, task=task
+                ))
+            
+            # Serve repeated text prompts from the response cache
+            cache_key, cached = self._cache_get(enhanced_prompt, settings, "gemini", task)
+            if cached is not None:
+                return cached
+            
+            # Route between providers, hedging to OpenAI when Gemini is slow
+            calls = {"gemini": lambda: self._generate_gemini(enhanced_prompt, max_tokens=max_tokens, task=task)}
+            if self.openai.api_key:
+                system_prompt = self._build_system_prompt(settings)
+                calls["openai"] = lambda: self._generate_openai(system_prompt, prompt, max_tokens=max_tokens, task=task)
             
-            return response.text
+            # Identical prompts already in flight wait for the same answer
+            response_text = self._coalesced(cache_key, lambda: self._route(calls)[1])
+            return response_text
         except Exception as e:
             print(f"Error querying Gemini: {e}")
-            # Fallback to OpenAI
-            return self.query_openai(prompt, user_settings)
+            if image:
+                # Fallback to OpenAI
+                return self.query_openai(prompt, user_settings, task=task)
+            return f"I'm having trouble processing that request. {str(e)}"
     
-    def query_openai(self, prompt, user_settings=None):
+    def query_openai(self, prompt, user_settings=None, task="chat", context=None):
         """Query OpenAI as a fallback"""
         try:
+            prompt = self._with_context(prompt, context)
+            
             # Apply user settings to prompt
             settings = user_settings or self.default_settings
+            max_tokens = self.token_budget.max_output_tokens(task, settings)
             
             # Create system prompt based on settings
-            system_prompt = ""
-            if settings["teaching_style"] == "detailed":
-                system_prompt += "You provide detailed explanations with examples. "
-            elif settings["teaching_style"] == "concise":
-                system_prompt += "You provide concise explanations focusing on key points. "
-            elif settings["teaching_style"] == "interactive":
-                system_prompt += "You explain concepts interactively with questions and answers. "
-            elif settings["teaching_style"] == "socratic":
-                system_prompt += "You use the Socratic method to guide through concepts. "
-            
-            if settings["personality"] == "friendly":
-                system_prompt += "Your tone is friendly and encouraging. "
-            elif settings["personality"] == "formal":
-                system_prompt += "Your tone is formal and professional. "
-            elif settings["personality"] == "humorous":
-                system_prompt += "Your tone is playful and you use appropriate humor. "
-            elif settings["personality"] == "motivational":
-                system_prompt += "Your tone is motivational and inspiring. "
-            
-            system_prompt += f"You explain concepts at {settings['difficulty']} level."
+            system_prompt = self._build_system_prompt(settings)
+            
+            cache_key, cached = self._cache_get(f"{system_prompt}\n{prompt}", settings, "openai", task)
+            if cached is not None:
+                return cached
             
             # Call OpenAI API
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=800
-            )
+            content = self._coalesced(cache_key, lambda: self._route({
+                "openai": lambda: self._generate_openai(system_prompt, prompt, max_tokens=max_tokens, task=task)
+            })[1])
             
-            return response.choices[0].message.content
+            return content
         except Exception as e:
             print(f"Error querying OpenAI: {e}")
             return f"I'm having trouble processing that request. {str(e)}"
     
+    def stream_gemini(self, prompt, image=None, user_settings=None, use_rag=False, task="chat", context=None):
+        """Stream a Gemini response as text chunks, falling back to OpenAI"""
+        if use_rag:
+            prompt = self._augment_with_context(prompt)
+        prompt = self._with_context(prompt, context)
+        
+        # Stream from OpenAI when Gemini is missing, its circuit is open or the router demoted it
+        if self.gemini_model is None or (
+            self.openai.api_key and (
+                self.circuit_breakers["gemini"].state == CircuitBreaker.OPEN
+                or self.provider_router.order(["gemini", "openai"])[0] == "openai"
+            )
+        ):
+            yield from self.stream_openai(prompt, user_settings, task=task)
+            return
+        
+        chunks = []
+        cache_key = None
+        reserved = 0
+        error = None
+        try:
+            settings = user_settings or self.default_settings
+            max_tokens = self.token_budget.max_output_tokens(task, settings)
+            enhanced_prompt = f"{self._build_prompt_prefix(settings)}{prompt}"
+            
+            contents = enhanced_prompt
+            cache_prompt = enhanced_prompt
+            if image:
+                image_part, digest = self.image_preprocessor.prepare(image)
+                contents = [enhanced_prompt, image_part]
+                cache_prompt = f"{enhanced_prompt}\n[image {digest}]"
+            
+            cache_key, cached = self._cache_get(cache_prompt, settings, "gemini", task)
+            if cached is not None:
+                yield cached
+                return
+            
+            with self.circuit_breakers["gemini"].guard():
+                response, reserved = self._generate_gemini(contents, stream=True, max_tokens=max_tokens, task=task)
+                for chunk in response:
+                    text = getattr(chunk, "text", "")
+                    if text:
+                        chunks.append(text)
+                        yield text
+        except Exception as e:
+            print(f"Error streaming from Gemini: {e}")
+            error = e
+        finally:
+            # Give back the part of the output cap the stream did not use, also when it failed or the client left
+            if reserved:
+                self._release("gemini", GEMINI_MODEL, reserved, estimate_tokens(enhanced_prompt) + estimate_tokens("".join(chunks)))
+        
+        if error is not None:
+            # Only fall back if nothing has been sent to the client yet
+            if not chunks:
+                yield from self.stream_openai(prompt, user_settings, task=task)
+            return
+        
+        response_text = "".join(chunks)
+        self.token_budget.record(task, "gemini", estimate_tokens(enhanced_prompt), estimate_tokens(response_text))
+        self._cache_set(cache_key, response_text)
+    
+    def stream_openai(self, prompt, user_settings=None, task="chat", context=None):
+        """Stream an OpenAI response as text chunks"""
+        chunks = []
+        reserved = 0
+        error = None
+        try:
+            prompt = self._with_context(prompt, context)
+            settings = user_settings or self.default_settings
+            max_tokens = self.token_budget.max_output_tokens(task, settings)
+            system_prompt = self._build_system_prompt(settings)
+            
+            cache_key, cached = self._cache_get(f"{system_prompt}\n{prompt}", settings, "openai", task)
+            if cached is not None:
+                yield cached
+                return
+            
+            with self.circuit_breakers["openai"].guard():
+                response, reserved = self._generate_openai(system_prompt, prompt, max_tokens=max_tokens, stream=True, task=task)
+                
+                for chunk in response:
+                    text = chunk["choices"][0]["delta"].get("content")
+                    if text:
+                        chunks.append(text)
+                        yield text
+        except Exception as e:
+            print(f"Error streaming from OpenAI: {e}")
+            error = e
+        finally:
+            if reserved:
+                used = estimate_tokens(system_prompt) + estimate_tokens(prompt) + estimate_tokens("".join(chunks))
+                self._release("openai", OPENAI_CHAT_MODEL, reserved, used)
+        
+        if error is not None:
+            if not chunks:
+                yield f"I'm having trouble processing that request. {str(error)}"
+            return
+        
+        response_text = "".join(chunks)
+        self.token_budget.record(
+            task,
+            "openai",
+            estimate_tokens(system_prompt) + estimate_tokens(prompt),
+            estimate_tokens(response_text)
+        )
+        self._cache_set(cache_key, response_text)
+    
+    def detect_emotion(self, user_text, response_text):
+        """Pick an emotion for the spoken response"""
+        if "error" in response_text.lower() or "sorry" in response_text.lower():
+            return "concerned"
+        elif any(word in user_text.lower() for word in ["how", "why", "what", "explain"]):
+            return "thoughtful"
+        elif any(word in user_text.lower() for word in ["thanks", "thank", "appreciate"]):
+            return "happy"
+        elif any(word in user_text.lower() for word in ["amazing", "wow", "cool", "awesome"]):
+            return "excited"
+        return "neutral"
+    
+    def build_structured_notes(self, response_text):
+        """Build structured notes from a response"""
+        return {
+            "title": self._extract_title(response_text),
+            "keyPoints": self._extract_key_points(response_text, 3),
+            "details": self._extract_details(response_text)
+        }
+    
+    def query_json(self, prompt, expect=list, name="default", user_settings=None, task="chat"):
+        """Query the model for JSON and extract it from the response, returning None if none is found"""
+        response = self.query_gemini(prompt, user_settings=user_settings, task=task)
+        # Every JSON array the app asks for holds objects
+        return parse_json(response, expect, name, objects_only=expect is list)
+    
+    def stream_json_items(self, prompt, name="default", user_settings=None, task="chat"):
+        """Stream the objects of a JSON array as soon as each one is complete"""
+        parser = IncrementalArrayParser(objects_only=True)
+        chunks = []
+        emitted = 0
+        for chunk in self.stream_gemini(prompt, user_settings=user_settings, task=task):
+            chunks.append(chunk)
+            for item in parser.feed(chunk):
+                emitted += 1
+                yield item
+        
+        if emitted:
+            parse_stats.record(name, "extracted")
+            return
+        
+        # Nothing parsed incrementally (e.g. malformed items); try the whole text
+        items = parse_json("".join(chunks), list, name, objects_only=True) or []
+        for item in items:
+            yield item
+    
+    def get_structured_output_stats(self):
+        """Return JSON parse success rates per call site"""
+        return parse_stats.get_stats()
+    
+    def _get_embedding_store(self, model):
+        """Return the persistent embedding store for model, opening it on first use"""
+        if not EmbeddingConfig.STORE_ENABLED:
+            return None
+        
+        with self._embedding_store_lock:
+            if model not in self.embedding_stores:
+                try:
+                    store_path = os.path.join(EmbeddingConfig.STORE_PATH, model.replace("/", "_"))
+                    self.embedding_stores[model] = EmbeddingStore(store_path, model)
+                except Exception as e:
+                    print(f"Error opening embedding store: {e}")
+                    self.embedding_stores[model] = None
+            return self.embedding_stores[model]
+    
+    def _fetch_embeddings(self, texts, model):
+        """Request embeddings from the provider in batches"""
+        matrix = None
+        for start in range(0, len(texts), EmbeddingConfig.BATCH_SIZE):
+            batch = texts[start:start + EmbeddingConfig.BATCH_SIZE]
+            reserved = self._reserve("openai", model, sum(estimate_tokens(text) for text in batch))
+            try:
+                response = self.circuit_breakers["openai"].call(
+                    self.openai.Embedding.create,
+                    input=batch,
+                    model=model,
+                    request_timeout=RoutingConfig.PROVIDER_TIMEOUT
+                )
+            except Exception:
+                self._release("openai", model, reserved, 0)
+                raise
+            usage = response.get("usage") or {}
+            self._release("openai", model, reserved, usage.get("prompt_tokens", reserved))
+            
+            for item in response['data']:
+                vector = item['embedding']
+                if matrix is None:
+                    # Allocate the contiguous result once the dimension is known
+                    matrix = np.empty((len(texts), len(vector)), dtype=np.float32)
+                matrix[start + item['index']] = vector
+        
+        return matrix
+    
+    def generate_embeddings(self, texts, model=None):
+        """Generate embeddings for a list of texts as a float32 matrix (one row per text)"""
+        model = model or EmbeddingConfig.MODEL
+        try:
+            texts = list(texts)
+            if not texts:
+                return np.zeros((0, EmbeddingConfig.DIMENSIONS), dtype=np.float32)
+            
+            # Only texts missing from the persistent store go to the provider
+            store = self._get_embedding_store(model)
+            if store is not None:
+                stored, missing = store.get_many(texts)
+            else:
+                stored, missing = [None] * len(texts), list(range(len(texts)))
+            
+            fetched = None
+            if missing:
+                fetched = self._fetch_embeddings([texts[index] for index in missing], model)
+                if store is not None:
+                    store.put_many([texts[index] for index in missing], fetched)
+            
+            if fetched is not None and len(missing) == len(texts):
+                return fetched
+            
+            dim = fetched.shape[1] if fetched is not None else store.dim
+            matrix = np.empty((len(texts), dim), dtype=np.float32)
+            for index, vector in enumerate(stored):
+                if vector is not None:
+                    matrix[index] = vector
+            if fetched is not None:
+                matrix[missing] = fetched
+            
+            return matrix
+        except Exception as e:
+            print(f"Error generating embeddings: {e}")
+            return None
+    
     def generate_embedding(self, text):
         """Generate embeddings for RAG functionality"""
         try:
-            response = openai.Embedding.create(
-                input=text,
-                model="text-embedding-ada-002"
-            )
-            return response['data'][0]['embedding']
+            # Serve previously embedded text straight from the memory-mapped store
+            store = self._get_embedding_store(EmbeddingConfig.MODEL)
+            if store is not None:
+                vector = store.get(text)
+                if vector is not None:
+                    return vector
+            
+            # Concurrent single-text requests are merged into one batch call
+            return self.embedding_batcher.embed(text, timeout=RoutingConfig.PROVIDER_TIMEOUT)
         except Exception as e:
             print(f"Error generating embedding: {e}")
             return None
     
-    def generate_image(self, prompt):
-        """Generate image based on prompt"""
+    def image_key(self, prompt, size=None):
+        """Content address of a generated image: normalized prompt, size and model"""
+        return BlobStore.make_key(
+            prompt=ResponseCache.normalize_prompt(prompt),
+            size=size or ImageConfig.SIZE,
+            model=ImageConfig.MODEL
+        )
+    
+    def image_url(self, key):
+        return f"{ImageConfig.PUBLIC_URL_PREFIX.rstrip('/')}/{key}"
+    
+    def generate_image(self, prompt, size=None):
+        """Generate image based on prompt, returning a URL served by this backend"""
+        size = size or ImageConfig.SIZE
+        key = self.image_key(prompt, size)
+        
+        # Repeat prompts are served from the image store without a provider call
+        if self.image_store.get(key) is not None:
+            return self.image_url(key)
+        
+        def create():
+            reserved = self._reserve("openai", ImageConfig.MODEL)
+            try:
+                # Use OpenAI DALL-E, asking for the bytes so nothing has to be downloaded from an expiring URL
+                response = self.openai.Image.create(
+                    prompt=prompt,
+                    model=ImageConfig.MODEL,
+                    n=1,
+                    size=size,
+                    response_format="b64_json",
+                    request_timeout=RoutingConfig.PROVIDER_TIMEOUT
+                )
+            except Exception:
+                self._release("openai", ImageConfig.MODEL, reserved, 0)
+                raise
+            self.image_store.put(key, base64.b64decode(response['data'][0]['b64_json']), "image/png")
+            return self.image_url(key)
+        
         try:
-            # Use OpenAI DALL-E
-            response = openai.Image.create(
-                prompt=prompt,
-                n=1,
-                size="1024x1024"
-            )
-            return response['data'][0]['url']
+            # Concurrent requests for the same image share one generation
+            return self.single_flight.do(f"image:{key}", lambda: self.circuit_breakers["openai"].call(create))
         except Exception as e:
             print(f"Error generating image: {e}")
             return None
     
+    def _image_job(self, prompt):
+        """Job handler: generate an image, raising so the queue can retry"""
+        with lane(BACKGROUND):
+            image_url = self.generate_image(prompt)
+        if not image_url:
+            raise RuntimeError("Image generation failed")
+        return {"image_url": image_url}
+    
+    def _image_evicted(self, job):
+        """Whether a finished image job points at an image the store has since evicted"""
+        if job is None or job["kind"] != "image" or job["status"] != "done":
+            return False
+        return self.image_key(job["params"]["prompt"]) not in self.image_store
+    
+    def submit_image_job(self, prompt):
+        """Queue image generation and return the job (identical prompts share a job)"""
+        # A finished job whose image was evicted is not reused; the image is generated again
+        reuse_done = self.image_key(prompt) in self.image_store
+        return self.job_queue.submit("image", {"prompt": prompt}, reuse_done=reuse_done)
+    
+    def get_job(self, job_id):
+        """Return a background job by ID, or None"""
+        job = self.job_queue.get(job_id)
+        if self._image_evicted(job):
+            # Do not hand out a URL that 404s; submitting the prompt again regenerates it
+            job.update({"status": "failed", "result": None, "error": "The image has expired; submit it again"})
+        return job
+    
     def summarize_text(self, text):
         """Summarize long text"""
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Summarize the following text concisely:"},
-                    {"role": "user", "content": text}
-                ],
-                max_tokens=300
+            return self.circuit_breakers["openai"].call(
+                self._generate_openai,
+                "Summarize the following text concisely:",
+                text,
+                max_tokens=self.token_budget.max_output_tokens("summary"),
+                task="summary"
             )
-            return response.choices[0].message.content
         except Exception as e:
             print(f"Error summarizing text: {e}")
             return "Unable to generate summary at this time."
@@ -197,9 +935,9 @@ class AIService:
             4. A brief explanation of why it's correct"""
             
             if self.gemini_model:
-                response = self.query_gemini(prompt)
+                response = self.query_gemini(prompt, task="practice")
             else:
-                response = self.query_openai(prompt)
+                response = self.query_openai(prompt, task="practice")
                 
             return response
         except Exception as e:
@@ -226,9 +964,9 @@ class AIService:
                 Provide the correct answer and encouraging feedback."""
             
             if self.gemini_model:
-                response = self.query_gemini(eval_prompt)
+                response = self.query_gemini(eval_prompt, task="evaluation")
             else:
-                response = self.query_openai(eval_prompt)
+                response = self.query_openai(eval_prompt, task="evaluation")
                 
             return response
         except Exception as e:
@@ -245,15 +983,74 @@ class AIService:
             3. How it builds upon the current knowledge of {current_topic}"""
             
             if self.gemini_model:
-                response = self.query_gemini(prompt)
+                response = self.query_gemini(prompt, task="related")
             else:
-                response = self.query_openai(prompt)
+                response = self.query_openai(prompt, task="related")
                 
             return response
         except Exception as e:
             print(f"Error suggesting related topics: {e}")
             return f"I couldn't suggest related topics. {str(e)}"
     
+    def lesson_settings(self, difficulty, user_settings=None):
+        """Merge user settings over the defaults, using the lesson's difficulty"""
+        settings = dict(self.default_settings)
+        settings.update(user_settings or {})
+        settings["difficulty"] = difficulty
+        return settings
+    
+    def get_stored_lesson(self, topic, subtopic, difficulty, user_settings=None):
+        """Return a pre-generated lesson for these settings, or None"""
+        if self.lesson_store is None:
+            return None
+        settings = self.lesson_settings(difficulty, user_settings)
+        return self.lesson_store.get(topic, subtopic, difficulty, settings["teaching_style"], settings["personality"])
+    
+    def generate_lesson(self, topic, subtopic='', difficulty='intermediate', user_settings=None):
+        """Generate a lesson with practice questions and related topics
+        
+        Returns (lesson, failed) where failed lists the parts that fell back to placeholder text.
+        """
+        settings = self.lesson_settings(difficulty, user_settings)
+        
+        # Format the query based on topic and subtopic
+        if subtopic:
+            query = f"Teach me about {subtopic} in {topic} at {difficulty} level"
+        else:
+            query = f"Teach me about {topic} at {difficulty} level"
+        full_topic = topic if not subtopic else f"{subtopic} in {topic}"
+        
+        # Generate the lesson, practice questions and related topics concurrently
+        lesson, errors = run_parallel(
+            {
+                'content': lambda: self.query_gemini(query, user_settings=settings, task="lesson"),
+                'practice_questions': lambda: self.generate_practice_questions(full_topic, difficulty),
+                'related_topics': lambda: self.suggest_related_topics(full_topic)
+            },
+            defaults=LESSON_DEFAULTS
+        )
+        
+        failed = [
+            part for part, text in lesson.items()
+            if part in errors or not text or str(text).startswith(FALLBACK_PREFIXES)
+        ]
+        return lesson, failed
+    
+    def record_lesson_request(self, topic, subtopic, difficulty, user_settings=None):
+        """Count a lesson request against the prefetched lessons"""
+        if self.prefetcher is not None:
+            self.prefetcher.record_request(topic, subtopic, difficulty, user_settings)
+    
+    def prefetch_after_lesson(self, topic, subtopic, difficulty, user_settings=None, related_topics=None):
+        """Start generating the lessons likely to be opened after this one"""
+        if self.prefetcher is None:
+            return 0
+        try:
+            return self.prefetcher.after_lesson(topic, subtopic, difficulty, user_settings, related_topics)
+        except Exception as e:
+            print(f"Error scheduling lesson prefetch: {e}")
+            return 0
+    
     def generate_notes(self, topic, include_diagrams=True):
         """Generate structured notes for a topic"""
         try:
@@ -266,21 +1063,35 @@ class AIService:
             
             Format this as properly structured markdown with headings, subheadings, and bullet points."""
             
-            if self.gemini_model:
-                notes_text = self.query_gemini(prompt)
-            else:
-                notes_text = self.query_openai(prompt)
-            
-            # Generate diagram if requested
-            diagram_url = None
+            # Queue the diagram first so it renders while the notes are written
+            diagram_job = None
             if include_diagrams:
                 diagram_prompt = f"Educational diagram illustrating the key concepts of {topic}, labeled clearly and simple to understand"
-                diagram_url = self.generate_image(diagram_prompt)
+                try:
+                    diagram_job = self.submit_image_job(diagram_prompt)
+                except Exception as e:
+                    print(f"Error queuing diagram: {e}")
+            
+            # Notes queue behind interactive chat when the providers are busy
+            with lane(BACKGROUND):
+                if self.gemini_model:
+                    notes_text = self.query_gemini(prompt, task="notes")
+                else:
+                    notes_text = self.query_openai(prompt, task="notes")
             
-            return {
+            notes = {
                 "notes": notes_text,
-                "diagram_url": diagram_url
+                "diagram_url": None
             }
+            
+            # The client polls /api/ai/jobs/<id> or listens for job_update events
+            if diagram_job is not None:
+                diagram_job = self.get_job(diagram_job["id"]) or diagram_job
+                if diagram_job["status"] == "done":
+                    notes["diagram_url"] = diagram_job["result"]["image_url"]
+                notes["diagram_job"] = {"id": diagram_job["id"], "status": diagram_job["status"]}
+            
+            return notes
         except Exception as e:
             print(f"Error generating notes: {e}")
             return {"notes": f"I couldn't generate notes. {str(e)}", "diagram_url": None}
@@ -359,6 +1170,9 @@ def setup_ai_models():
         # Setup Gemini (primary model)
         _ai_service.setup_gemini()
         
+        # Load the retrieval index
+        _ai_service.setup_rag()
+        
         print("AI models initialized")
     
     return _ai_service
@@ -0,0 +1,189 @@
+import os
+import json
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+
+# Explicit mapping so file names do not depend on the platform's mime.types
+CONTENT_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".webp": "image/webp",
+    ".gif": "image/gif",
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".ogg": "audio/ogg"
+}
+EXTENSIONS = {content_type: extension for extension, content_type in CONTENT_TYPES.items()}
+
+def content_type_for(name):
+    extension = os.path.splitext(name)[1].lower()
+    return CONTENT_TYPES.get(extension) or mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+def extension_for(content_type):
+    return EXTENSIONS.get(content_type) or mimetypes.guess_extension(content_type or "") or ".bin"
+
+class BlobStore:
+    """Content-addressed disk store for binary files with an LRU size quota
+
+    Each blob is one file named by its key, with the extension taken from
+    its content type, so files can be served straight from disk. The LRU
+    order is rebuilt from file mtimes at startup and kept in memory after
+    that; reads touch the file so the order survives restarts. A key names
+    what was asked for, not the bytes, so the blob behind a key can change
+    after an eviction; digest() gives the SHA-256 of the current bytes.
+    """
+
+    def __init__(self, path, max_bytes=500 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+
+        # key -> (file name, size), least recently used first
+        self._index = OrderedDict()
+        # key -> SHA-256 of the stored bytes, filled at put or on first use
+        self._digests = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        entries = []
+        for name in os.listdir(self.path):
+            if name.endswith(".tmp"):
+                continue
+            file_path = os.path.join(self.path, name)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, os.path.splitext(name)[0], name, stat.st_size))
+
+        for _, key, name, size in sorted(entries):
+            self._index[key] = (name, size)
+            self._bytes += size
+
+    @staticmethod
+    def make_key(**parts):
+        """Hash the identifying parts of a blob into a hex key"""
+        raw = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def is_valid_key(key):
+        return len(key) == 64 and all(char in "0123456789abcdef" for char in key)
+
+    def __contains__(self, key):
+        """Whether key is stored, without counting a lookup or touching the LRU order"""
+        with self._lock:
+            return key in self._index
+
+    def get(self, key):
+        """Return (file_path, content_type) for a stored blob, or None"""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._index.move_to_end(key)
+            self.stats["hits"] += 1
+
+        file_path = os.path.join(self.path, entry[0])
+        try:
+            os.utime(file_path, None)
+        except OSError:
+            # Removed behind our back
+            with self._lock:
+                if self._index.pop(key, None) is not None:
+                    self._bytes -= entry[1]
+                    self._digests.pop(key, None)
+            return None
+
+        return file_path, content_type_for(entry[0])
+
+    def read(self, key):
+        """Return (bytes, content_type) for a stored blob, or None"""
+        found = self.get(key)
+        if found is None:
+            return None
+        file_path, content_type = found
+        try:
+            with open(file_path, "rb") as blob_file:
+                return blob_file.read(), content_type
+        except OSError:
+            return None
+
+    def digest(self, key):
+        """SHA-256 of the bytes currently stored under key, or None"""
+        with self._lock:
+            entry = self._index.get(key)
+            digest = self._digests.get(key)
+        if entry is None or digest is not None:
+            return digest
+
+        # Blobs found at startup are hashed on first use
+        sha256 = hashlib.sha256()
+        try:
+            with open(os.path.join(self.path, entry[0]), "rb") as blob_file:
+                for block in iter(lambda: blob_file.read(1024 * 1024), b""):
+                    sha256.update(block)
+        except OSError:
+            return None
+        digest = sha256.hexdigest()
+        with self._lock:
+            if self._index.get(key) == entry:
+                self._digests[key] = digest
+        return digest
+
+    def put(self, key, data, content_type):
+        """Store bytes under key and return the file path"""
+        name = f"{key}{extension_for(content_type)}"
+        file_path = os.path.join(self.path, name)
+        temp_path = f"{file_path}.{threading.get_ident()}.tmp"
+
+        with open(temp_path, "wb") as blob_file:
+            blob_file.write(data)
+        os.replace(temp_path, file_path)
+
+        with self._lock:
+            previous = self._index.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+                if previous[0] != name:
+                    self._remove_file(previous[0])
+            self._index[key] = (name, len(data))
+            self._digests[key] = hashlib.sha256(data).hexdigest()
+            self._bytes += len(data)
+            self.stats["stores"] += 1
+            self._evict()
+
+        return file_path
+
+    def _remove_file(self, name):
+        try:
+            os.unlink(os.path.join(self.path, name))
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Remove least recently used blobs until under quota (lock held)"""
+        while self._bytes > self.max_bytes and len(self._index) > 1:
+            key, (name, size) = self._index.popitem(last=False)
+            self._digests.pop(key, None)
+            self._remove_file(name)
+            self._bytes -= size
+            self.stats["evictions"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._index)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["max_bytes"] = self.max_bytes
+        return stats
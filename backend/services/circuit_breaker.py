@@ -0,0 +1,168 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the provider's circuit is open"""
+    pass
+
+class CircuitBreaker:
+    """Per-provider circuit breaker with closed, open and half-open states
+
+    Failures are counted over a rolling time window. Once the window holds
+    enough calls and the failure ratio crosses the threshold, the circuit
+    opens and calls are rejected immediately. After the recovery timeout a
+    limited number of probe calls are let through (half-open); a successful
+    probe closes the circuit again, a failed one re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=0.5, minimum_calls=5, window=60,
+                 recovery_timeout=30, half_open_max_calls=1, ignored_exceptions=()):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.minimum_calls = minimum_calls
+        self.window = window
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        # Errors raised before the provider was reached, which say nothing about its health
+        self.ignored_exceptions = tuple(ignored_exceptions)
+
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        # (timestamp, success) for calls inside the rolling window
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+        self.counters = {"rejected": 0, "opened": 0, "probes": 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            self._update_state(time.monotonic())
+            return self._state
+
+    def _update_state(self, now):
+        """Move from open to half-open once the recovery timeout has passed (lock held)"""
+        if self._state == self.OPEN and now - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+
+    def _trim(self, now):
+        while self._calls and now - self._calls[0][0] > self.window:
+            self._calls.popleft()
+
+    def _open(self, now):
+        self._state = self.OPEN
+        self._opened_at = now
+        self.counters["opened"] += 1
+        print(f"Circuit for {self.name} opened")
+
+    def admits_request(self):
+        """Return True if a call would be let through now, without taking a probe slot"""
+        with self._lock:
+            self._update_state(time.monotonic())
+            if self._state == self.HALF_OPEN:
+                return self._half_open_calls < self.half_open_max_calls
+            return self._state == self.CLOSED
+
+    def allow_request(self):
+        """Return True if a call may go to the provider right now"""
+        with self._lock:
+            now = time.monotonic()
+            self._update_state(now)
+
+            if self._state == self.CLOSED:
+                return True
+
+            if self._state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                self.counters["probes"] += 1
+                return True
+
+            self.counters["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.HALF_OPEN:
+                # Probe succeeded: close and start a fresh window
+                self._state = self.CLOSED
+                self._calls.clear()
+                print(f"Circuit for {self.name} closed")
+            self._calls.append((now, True))
+            self._trim(now)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.HALF_OPEN:
+                self._open(now)
+                return
+
+            self._calls.append((now, False))
+            self._trim(now)
+
+            if self._state == self.CLOSED and len(self._calls) >= self.minimum_calls:
+                failures = sum(1 for _, success in self._calls if not success)
+                if failures / len(self._calls) >= self.failure_threshold:
+                    self._open(now)
+
+    def release(self):
+        """Give back a half-open probe slot without recording an outcome"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+    
+    @contextmanager
+    def guard(self):
+        """Context manager that rejects the call if the circuit is open and records its outcome"""
+        if not self.allow_request():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        failed = False
+        ignored = False
+        try:
+            yield
+        except self.ignored_exceptions:
+            ignored = True
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # A caller abandoning a stream midway still counts as a working provider
+            if ignored:
+                self.release()
+            elif failed:
+                self.record_failure()
+            else:
+                self.record_success()
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn through the breaker, raising CircuitOpenError if the circuit is open"""
+        with self.guard():
+            return fn(*args, **kwargs)
+
+    def snapshot(self):
+        """Return the breaker state for status endpoints"""
+        with self._lock:
+            now = time.monotonic()
+            self._update_state(now)
+            self._trim(now)
+            failures = sum(1 for _, success in self._calls if not success)
+            snapshot = {
+                "state": self._state,
+                "windowCalls": len(self._calls),
+                "windowFailures": failures
+            }
+            if self._state == self.OPEN:
+                snapshot["retryIn"] = round(max(0.0, self.recovery_timeout - (now - self._opened_at)), 1)
+            snapshot.update(self.counters)
+            return snapshot
@@ -0,0 +1,90 @@
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from config import ConcurrencyConfig
+
+_THREAD_PREFIX = "mentaura-ai"
+
+# Shared bounded pool for independent AI calls
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Return the shared thread pool, creating it on first use"""
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=ConcurrencyConfig.MAX_WORKERS,
+                    thread_name_prefix=_THREAD_PREFIX
+                )
+
+    return _executor
+
+def _in_worker_thread():
+    """Check whether we are already running inside the shared pool"""
+    return threading.current_thread().name.startswith(_THREAD_PREFIX)
+
+def submit_call(fn, *args, **kwargs):
+    """Submit a call to the shared pool, carrying over the caller's context variables"""
+    context = contextvars.copy_context()
+    return get_executor().submit(context.run, fn, *args, **kwargs)
+
+def collect_results(futures, timeout=None, defaults=None):
+    """Wait for named futures and return (results, errors)
+
+    timeout is either a number of seconds shared by every call or a dict of
+    per-call timeouts. Calls that fail or time out get their default value
+    and an entry in errors, so callers can still use the partial results.
+    """
+    defaults = defaults or {}
+    if timeout is None:
+        timeout = ConcurrencyConfig.CALL_TIMEOUT
+
+    start = time.monotonic()
+    results = {}
+    errors = {}
+
+    for name, future in futures.items():
+        call_timeout = timeout.get(name, ConcurrencyConfig.CALL_TIMEOUT) if isinstance(timeout, dict) else timeout
+        remaining = max(0, start + call_timeout - time.monotonic())
+
+        try:
+            results[name] = future.result(timeout=remaining)
+        except FuturesTimeoutError:
+            # The worker keeps running, but we stop waiting for it
+            future.cancel()
+            print(f"Parallel call '{name}' timed out after {call_timeout}s")
+            results[name] = defaults.get(name)
+            errors[name] = "timeout"
+        except Exception as e:
+            print(f"Parallel call '{name}' failed: {e}")
+            results[name] = defaults.get(name)
+            errors[name] = str(e)
+
+    return results, errors
+
+def run_parallel(calls, timeout=None, defaults=None):
+    """Run independent callables concurrently and return (results, errors)
+
+    calls maps a name to a zero-argument callable. Endpoint latency becomes
+    roughly that of the slowest call instead of the sum of all of them.
+    """
+    if _in_worker_thread():
+        # Waiting on the bounded pool from inside it could deadlock, so run inline
+        results = {}
+        errors = {}
+        for name, fn in calls.items():
+            try:
+                results[name] = fn()
+            except Exception as e:
+                print(f"Call '{name}' failed: {e}")
+                results[name] = (defaults or {}).get(name)
+                errors[name] = str(e)
+        return results, errors
+
+    futures = {name: submit_call(fn) for name, fn in calls.items()}
+    return collect_results(futures, timeout, defaults)
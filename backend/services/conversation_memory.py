@@ -0,0 +1,167 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from services.rate_limiter import BACKGROUND, lane
+
+class _Session:
+    def __init__(self):
+        self.summary = ""
+        self.turns = []
+        # Turns pushed out of the recent window and not yet folded into the summary
+        self.overflow = []
+        self.folding = False
+        self.folds = 0
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+class ConversationMemory:
+    """Server-side chat history with a rolling summary per session
+
+    The last recent_turns exchanges are kept verbatim, as long as they fit
+    in max_tokens next to the summary. Older exchanges are folded into the
+    session's summary in the background: the previous summary and the new
+    overflow turns are summarized together, so each fold costs about the
+    same however long the session runs and the context sent with a prompt
+    stays roughly constant in size.
+    """
+
+    def __init__(self, summarize_fn, count_fn, trim_fn, recent_turns=6, fold_turns=2, summary_tokens=300,
+                 max_tokens=2000, max_sessions=1000, ttl=6 * 3600):
+        self.summarize_fn = summarize_fn
+        self.count_fn = count_fn
+        self.trim_fn = trim_fn
+        self.recent_turns = recent_turns
+        self.fold_turns = fold_turns
+        self.summary_tokens = summary_tokens
+        self.max_tokens = max_tokens
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mentaura-memory")
+
+        self.stats = {"turns": 0, "folds": 0, "fold_failures": 0, "evicted": 0}
+
+    def _get(self, session_id, create=False):
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and now - session.updated > self.ttl:
+                del self._sessions[session_id]
+                session = None
+            if session is None and create:
+                session = _Session()
+                self._sessions[session_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.stats["evicted"] += 1
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def _turn_tokens(self, turns):
+        return self.count_fn(self._format_turns(turns))
+
+    @staticmethod
+    def _format_turns(turns):
+        return "\n".join(f"Student: {user_text}\nTeacher: {ai_text}" for user_text, ai_text in turns)
+
+    def add_turn(self, session_id, user_text, ai_text):
+        """Remember one exchange and fold older ones into the summary when enough have piled up"""
+        if not session_id or not user_text or not ai_text:
+            return
+        session = self._get(session_id, create=True)
+        with session.lock:
+            session.turns.append((user_text, ai_text))
+            session.updated = time.time()
+
+            # Keep the newest turns that fit beside the summary; at least the last one stays
+            recent_budget = self.max_tokens - self.summary_tokens
+            overflow = max(0, len(session.turns) - self.recent_turns)
+            while overflow < len(session.turns) - 1 and self._turn_tokens(session.turns[overflow:]) > recent_budget:
+                overflow += 1
+            if overflow:
+                session.overflow.extend(session.turns[:overflow])
+                del session.turns[:overflow]
+
+            start_fold = len(session.overflow) >= self.fold_turns and not session.folding
+            if start_fold:
+                session.folding = True
+        with self._lock:
+            self.stats["turns"] += 1
+
+        if start_fold:
+            self._executor.submit(self._fold, session)
+
+    def _fold(self, session):
+        with session.lock:
+            summary = session.summary
+            overflow = list(session.overflow)
+
+        text = self._format_turns(overflow)
+        if summary:
+            text = f"Summary of the conversation so far: {summary}\n\nWhat was said next:\n{text}"
+
+        new_summary = ""
+        try:
+            with lane(BACKGROUND):
+                new_summary = self.summarize_fn(text) or ""
+            if new_summary:
+                new_summary = self.trim_fn(new_summary, self.summary_tokens)
+        except Exception as e:
+            print(f"Error summarizing conversation: {e}")
+
+        with session.lock:
+            if new_summary:
+                session.summary = new_summary
+                # Turns that overflowed while we were summarizing wait for the next fold
+                del session.overflow[:len(overflow)]
+                session.folds += 1
+            elif len(session.overflow) > self.recent_turns * 4:
+                # Summarization keeps failing; drop the oldest turns instead of growing forever
+                del session.overflow[:len(session.overflow) - self.recent_turns * 4]
+            session.folding = False
+            fold_again = bool(new_summary) and len(session.overflow) >= self.fold_turns
+            if fold_again:
+                session.folding = True
+
+        with self._lock:
+            self.stats["folds" if new_summary else "fold_failures"] += 1
+
+        if fold_again:
+            self._executor.submit(self._fold, session)
+
+    def get_context(self, session_id):
+        """Return the summary and recent turns of a session as prompt context, or ''"""
+        session = self._get(session_id) if session_id else None
+        if session is None:
+            return ""
+        with session.lock:
+            summary = session.summary
+            turns = list(session.turns)
+            pending = list(session.overflow)
+
+        parts = []
+        if summary:
+            parts.append(f"Summary of earlier conversation: {summary}")
+
+        # Turns waiting to be folded are sent verbatim, newest first, while they fit
+        budget = self.max_tokens - self.count_fn("\n\n".join(parts)) - self._turn_tokens(turns)
+        while pending and self._turn_tokens(pending) > budget:
+            pending.pop(0)
+        turns = pending + turns
+        if turns:
+            parts.append(self._format_turns(turns))
+        return "\n\n".join(parts)
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["sessions"] = len(self._sessions)
+        return stats
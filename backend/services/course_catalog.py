@@ -0,0 +1,210 @@
+# Course catalog served by the learning routes and used by the lesson pre-generation job
+
+DIFFICULTIES = ['beginner', 'intermediate', 'advanced']
+TEACHING_STYLES = ['detailed', 'concise', 'interactive', 'socratic']
+PERSONALITIES = ['friendly', 'formal', 'humorous', 'motivational']
+
+COURSES = [
+    {
+        'id': 'cs101',
+        'title': 'Computer Science Fundamentals',
+        'description': 'An introduction to basic computer science concepts',
+        'image': 'https://source.unsplash.com/random/300x200/?computer',
+        'topics': [
+            'Introduction to Programming',
+            'Data Structures',
+            'Algorithms',
+            'Computer Architecture'
+        ],
+        'difficulty': 'beginner',
+        'duration': '8 weeks'
+    },
+    {
+        'id': 'math101',
+        'title': 'Mathematics Fundamentals',
+        'description': 'Learn essential mathematical concepts',
+        'image': 'https://source.unsplash.com/random/300x200/?math',
+        'topics': [
+            'Algebra',
+            'Geometry',
+            'Calculus',
+            'Statistics'
+        ],
+        'difficulty': 'intermediate',
+        'duration': '10 weeks'
+    },
+    {
+        'id': 'phys101',
+        'title': 'Physics Fundamentals',
+        'description': 'Explore the laws of nature and physics principles',
+        'image': 'https://source.unsplash.com/random/300x200/?physics',
+        'topics': [
+            'Mechanics',
+            'Thermodynamics',
+            'Electromagnetism',
+            'Modern Physics'
+        ],
+        'difficulty': 'intermediate',
+        'duration': '12 weeks'
+    },
+    {
+        'id': 'webdev',
+        'title': 'Full Stack Web Development',
+        'description': 'Build modern web applications from scratch',
+        'image': 'https://source.unsplash.com/random/300x200/?website',
+        'topics': [
+            'HTML & CSS',
+            'JavaScript',
+            'React',
+            'Node.js',
+            'Databases'
+        ],
+        'difficulty': 'intermediate',
+        'duration': '16 weeks'
+    }
+]
+
+COURSE_DETAILS = {
+    'cs101': {
+        'id': 'cs101',
+        'title': 'Computer Science Fundamentals',
+        'description': 'An introduction to basic computer science concepts',
+        'image': 'https://source.unsplash.com/random/300x200/?computer',
+        'topics': [
+            {
+                'id': 'cs101-intro',
+                'title': 'Introduction to Programming',
+                'subtopics': [
+                    'What is Programming?',
+                    'Programming Languages',
+                    'Basic Syntax and Variables',
+                    'Control Structures'
+                ]
+            },
+            {
+                'id': 'cs101-data',
+                'title': 'Data Structures',
+                'subtopics': [
+                    'Arrays and Lists',
+                    'Stacks and Queues',
+                    'Trees and Graphs',
+                    'Hash Tables'
+                ]
+            },
+            {
+                'id': 'cs101-algo',
+                'title': 'Algorithms',
+                'subtopics': [
+                    'Sorting Algorithms',
+                    'Searching Algorithms',
+                    'Recursion',
+                    'Complexity Analysis'
+                ]
+            },
+            {
+                'id': 'cs101-arch',
+                'title': 'Computer Architecture',
+                'subtopics': [
+                    'CPU and Memory',
+                    'Input/Output Systems',
+                    'Operating Systems',
+                    'Networking Basics'
+                ]
+            }
+        ],
+        'difficulty': 'beginner',
+        'duration': '8 weeks'
+    },
+    'math101': {
+        'id': 'math101',
+        'title': 'Mathematics Fundamentals',
+        'description': 'Learn essential mathematical concepts',
+        'image': 'https://source.unsplash.com/random/300x200/?math',
+        'topics': [
+            {
+                'id': 'math101-algebra',
+                'title': 'Algebra',
+                'subtopics': [
+                    'Equations and Inequalities',
+                    'Functions and Graphs',
+                    'Polynomials',
+                    'Systems of Equations'
+                ]
+            },
+            {
+                'id': 'math101-geo',
+                'title': 'Geometry',
+                'subtopics': [
+                    'Euclidean Geometry',
+                    'Triangles and Circles',
+                    'Coordinate Geometry',
+                    'Transformations'
+                ]
+            },
+            {
+                'id': 'math101-calc',
+                'title': 'Calculus',
+                'subtopics': [
+                    'Limits and Continuity',
+                    'Derivatives',
+                    'Integrals',
+                    'Applications of Calculus'
+                ]
+            },
+            {
+                'id': 'math101-stats',
+                'title': 'Statistics',
+                'subtopics': [
+                    'Descriptive Statistics',
+                    'Probability',
+                    'Distributions',
+                    'Hypothesis Testing'
+                ]
+            }
+        ],
+        'difficulty': 'intermediate',
+        'duration': '10 weeks'
+    }
+}
+
+def get_courses():
+    """Return the course list"""
+    return COURSES
+
+def get_course(course_id):
+    """Return course details by ID, or None"""
+    return COURSE_DETAILS.get(course_id)
+
+def resolve_topic(topic):
+    """Map a catalog topic ID such as cs101-intro to its title; other topics pass through"""
+    for course in COURSE_DETAILS.values():
+        for course_topic in course['topics']:
+            if course_topic['id'] == topic:
+                return course_topic['title']
+    return topic
+
+def iter_lessons(course_ids=None):
+    """Yield (course_id, topic, subtopic) for every lesson in the catalog
+
+    Each topic yields an overview lesson (empty subtopic) followed by its subtopics.
+    """
+    for course_id, course in COURSE_DETAILS.items():
+        if course_ids and course_id not in course_ids:
+            continue
+        for course_topic in course['topics']:
+            yield course_id, course_topic['title'], ''
+            for subtopic in course_topic['subtopics']:
+                yield course_id, course_topic['title'], subtopic
+
+def next_lessons(topic, subtopic='', count=1):
+    """Return up to count (topic, subtopic) pairs that follow a lesson in its course's order"""
+    lessons = list(iter_lessons())
+    for index, (course_id, lesson_topic, lesson_subtopic) in enumerate(lessons):
+        if lesson_topic == topic and lesson_subtopic == (subtopic or ''):
+            following = [
+                (next_topic, next_subtopic)
+                for next_course_id, next_topic, next_subtopic in lessons[index + 1:]
+                if next_course_id == course_id
+            ]
+            return following[:count]
+    return []
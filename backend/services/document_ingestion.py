@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Optional PDF support
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+SUPPORTED_EXTENSIONS = {".txt", ".md", ".markdown", ".pdf"}
+# Version 2: chunk ids carry an occurrence number ("path#hash:n")
+MANIFEST_VERSION = 2
+
+def _file_digest(path):
+    """SHA-256 of a file's bytes, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_document(path):
+    """Extract plain text from a supported document"""
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == ".pdf":
+        if PdfReader is None:
+            raise RuntimeError("pypdf is not installed, PDF files cannot be ingested")
+        reader = PdfReader(path)
+        return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+
+    with open(path, "r", encoding="utf-8", errors="replace") as source:
+        return source.read()
+
+def chunk_text(text, chunk_words=200, overlap_words=40):
+    """Split text into overlapping windows of words"""
+    words = text.split()
+    if not words:
+        return []
+
+    step = max(1, chunk_words - overlap_words)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+def parse_document(path, chunk_words, overlap_words):
+    """Read, chunk and hash one document (runs in a worker process)"""
+    text = read_document(path)
+    chunks = chunk_text(text, chunk_words, overlap_words)
+    return {
+        "sha256": _file_digest(path),
+        "chunks": [(hashlib.sha256(chunk.encode("utf-8")).hexdigest(), chunk) for chunk in chunks]
+    }
+
+class DocumentIngestor:
+    """Incremental ingestion of a document library into the retrieval index
+
+    A manifest records every file's size, mtime, content hash and chunk ids.
+    Unchanged files are skipped without being read; changed files are
+    re-chunked and only chunks not already indexed are embedded (the
+    embedding store also deduplicates identical text across files).
+    Chunks are embedded, and the index and manifest saved, every
+    embed_batch_size chunks, so a failure late in a run keeps the files
+    finished before it.
+    """
+
+    def __init__(self, ai_service, documents_path, manifest_path, chunk_words=200,
+                 overlap_words=40, workers=None, embed_batch_size=512):
+        self.ai_service = ai_service
+        self.documents_path = documents_path
+        self.manifest_path = manifest_path
+        self.chunk_words = chunk_words
+        self.overlap_words = overlap_words
+        self.workers = workers or os.cpu_count() or 1
+        self.embed_batch_size = embed_batch_size
+
+    def load_manifest(self):
+        """Return the saved manifest, or None if it was written by another manifest version"""
+        if not os.path.exists(self.manifest_path):
+            return {"version": MANIFEST_VERSION, "files": {}}
+        with open(self.manifest_path, "r", encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("version") != MANIFEST_VERSION:
+            return None
+        return manifest
+
+    def save_manifest(self, manifest):
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temp_path, self.manifest_path)
+
+    def scan(self):
+        """Return {relative_path: (absolute_path, size, mtime)} for supported documents"""
+        documents = {}
+        for root, _, files in os.walk(self.documents_path):
+            for name in files:
+                extension = os.path.splitext(name)[1].lower()
+                if extension not in SUPPORTED_EXTENSIONS or (extension == ".pdf" and PdfReader is None):
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                relative_path = os.path.relpath(path, self.documents_path).replace(os.sep, "/")
+                documents[relative_path] = (path, stat.st_size, stat.st_mtime)
+        return documents
+
+    def _embed_and_index(self, ids, texts, payloads):
+        """Embed chunks in batches and add them to the index"""
+        index = self.ai_service.rag_engine
+        for start in range(0, len(texts), self.embed_batch_size):
+            batch_texts = texts[start:start + self.embed_batch_size]
+            vectors = self.ai_service.generate_embeddings(batch_texts)
+            if vectors is None:
+                raise RuntimeError("Embedding generation failed")
+            index.add(ids[start:start + self.embed_batch_size], vectors, payloads[start:start + self.embed_batch_size])
+
+    @staticmethod
+    def chunk_ids(relative_path, chunks):
+        """Ids for a file's chunks; repeated text in one file gets an occurrence number"""
+        seen = {}
+        ids = []
+        for chunk_hash, _ in chunks:
+            occurrence = seen.get(chunk_hash, 0)
+            seen[chunk_hash] = occurrence + 1
+            ids.append(f"{relative_path}#{chunk_hash}:{occurrence}")
+        return ids
+
+    def run(self, rebuild=False, progress=None):
+        """Ingest new and changed documents and return throughput statistics"""
+        started = time.monotonic()
+        # Ids from an older manifest format cannot be matched, so start the index over
+        manifest = None if rebuild else self.load_manifest()
+        if manifest is None:
+            rebuild = True
+        if rebuild or self.ai_service.rag_engine is None:
+            self.ai_service.setup_rag(fresh=rebuild)
+        index = self.ai_service.rag_engine
+        if index is None:
+            raise RuntimeError("Retrieval index is not available")
+
+        if rebuild:
+            manifest = {"version": MANIFEST_VERSION, "files": {}}
+        known_files = manifest["files"]
+        documents = self.scan()
+
+        # Files whose size or mtime changed need a closer look
+        candidates = [
+            relative_path for relative_path, (_, size, mtime) in documents.items()
+            if rebuild
+            or relative_path not in known_files
+            or known_files[relative_path]["size"] != size
+            or known_files[relative_path]["mtime"] != mtime
+        ]
+        removed_files = [relative_path for relative_path in known_files if relative_path not in documents]
+
+        stats = {
+            "documents": len(documents),
+            "parsed": 0,
+            "unchanged": len(documents) - len(candidates),
+            "removed": len(removed_files),
+            "chunks": 0,
+            "embedded_chunks": 0,
+            "removed_chunks": 0,
+            "errors": 0
+        }
+
+        for relative_path in removed_files:
+            chunk_ids = known_files.pop(relative_path).get("chunks", [])
+            index.remove(chunk_ids)
+            stats["removed_chunks"] += len(chunk_ids)
+
+        # Files parsed but not yet embedded; flushed in batches so a late failure keeps earlier work
+        pending = []
+        pending_chunks = 0
+        completed = 0
+
+        def flush():
+            nonlocal completed
+            ids, texts, payloads = [], [], []
+            for relative_path, entry, stale_ids, new_chunks in pending:
+                index.remove(stale_ids)
+                stats["removed_chunks"] += len(stale_ids)
+                for chunk_id, chunk in new_chunks:
+                    ids.append(chunk_id)
+                    texts.append(chunk)
+                    payloads.append({"text": chunk, "source": relative_path})
+
+            if ids:
+                self._embed_and_index(ids, texts, payloads)
+                stats["embedded_chunks"] += len(ids)
+
+            for relative_path, entry, _, _ in pending:
+                known_files[relative_path] = entry
+
+            # Save the index before the manifest so the manifest never runs ahead of it
+            self.ai_service.save_rag_index()
+            self.save_manifest(manifest)
+
+            for relative_path, _, _, _ in pending:
+                completed += 1
+                if progress:
+                    progress(completed, len(candidates), relative_path)
+            pending.clear()
+
+        # Parse and chunk in a process pool; embedding happens back in this process
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {
+                pool.submit(parse_document, documents[relative_path][0], self.chunk_words, self.overlap_words): relative_path
+                for relative_path in candidates
+            }
+
+            for future in as_completed(futures):
+                relative_path = futures[future]
+                _, size, mtime = documents[relative_path]
+                try:
+                    parsed = future.result()
+                except Exception as e:
+                    print(f"Error parsing {relative_path}: {e}")
+                    stats["errors"] += 1
+                    completed += 1
+                    continue
+
+                stats["parsed"] += 1
+                previous = known_files.get(relative_path, {})
+                chunk_ids = self.chunk_ids(relative_path, parsed["chunks"])
+                stats["chunks"] += len(chunk_ids)
+
+                if not rebuild and previous.get("sha256") == parsed["sha256"]:
+                    # Touched but identical content: only the stat info changes
+                    previous.update({"size": size, "mtime": mtime})
+                    completed += 1
+                    if progress:
+                        progress(completed, len(candidates), relative_path)
+                    continue
+
+                previous_ids = set(previous.get("chunks", []))
+                current_ids = set(chunk_ids)
+                new_chunks = [
+                    (chunk_id, chunk) for chunk_id, (_, chunk) in zip(chunk_ids, parsed["chunks"])
+                    if rebuild or chunk_id not in previous_ids
+                ]
+                entry = {
+                    "size": size,
+                    "mtime": mtime,
+                    "sha256": parsed["sha256"],
+                    "chunks": chunk_ids
+                }
+                pending.append((relative_path, entry, list(previous_ids - current_ids), new_chunks))
+                pending_chunks += len(new_chunks)
+
+                if pending_chunks >= self.embed_batch_size:
+                    flush()
+                    pending_chunks = 0
+
+        flush()
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        stats["elapsed_seconds"] = round(elapsed, 3)
+        stats["docs_per_second"] = round(stats["parsed"] / elapsed, 2)
+        stats["chunks_per_second"] = round(stats["chunks"] / elapsed, 2)
+        return stats
@@ -0,0 +1,89 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+class EmbeddingBatcher:
+    """Micro-batching queue for single-text embedding requests
+
+    Concurrent callers submit one text each; a background worker gathers
+    whatever arrives within max_wait_ms (up to max_batch_size texts) and
+    sends it to the provider as a single batch request.
+    """
+
+    def __init__(self, embed_batch_fn, max_batch_size=64, max_wait_ms=5):
+        self.embed_batch_fn = embed_batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+        self.stats = {"requests": 0, "batches": 0, "batched_texts": 0}
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="mentaura-embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def submit(self, text):
+        """Queue a text and return a Future resolving to its embedding vector"""
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((text, future))
+        with self._lock:
+            self.stats["requests"] += 1
+        return future
+
+    def embed(self, text, timeout=None):
+        """Embed a single text, sharing a provider request with concurrent callers"""
+        return self.submit(text).result(timeout=timeout)
+
+    def _collect_batch(self):
+        """Block for the first item, then gather more until the batch is full or the window closes"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+
+            # Send each distinct text once
+            unique_texts = list(dict.fromkeys(text for text, _ in batch))
+
+            try:
+                vectors = self.embed_batch_fn(unique_texts)
+                if vectors is None:
+                    raise RuntimeError("Embedding provider returned no vectors")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                self.stats["batches"] += 1
+                self.stats["batched_texts"] += len(unique_texts)
+
+            rows = {text: index for index, text in enumerate(unique_texts)}
+            for text, future in batch:
+                future.set_result(vectors[rows[text]])
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["avg_batch_size"] = round(stats["batched_texts"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["queued"] = self._queue.qsize()
+        return stats
@@ -0,0 +1,171 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+
+DIGEST_SIZE = 32
+
+class EmbeddingStore:
+    """Persistent content-hash embedding cache backed by a memory-mapped matrix
+
+    Vectors are appended to a raw float32 file and read back through
+    np.memmap, so lookups return zero-copy views and the store can grow past
+    RAM. A parallel append-only file holds one SHA-256 digest per row; it is
+    loaded into a digest -> row dict at startup.
+    """
+
+    def __init__(self, path, model):
+        self.path = path
+        self.model = model
+        self.vectors_path = os.path.join(path, "vectors.f32")
+        self.index_path = os.path.join(path, "index.bin")
+        self.meta_path = os.path.join(path, "meta.json")
+
+        self.dim = None
+        self._rows = {}
+        self._row_count = 0
+        self._mmap = None
+        self._mapped_rows = 0
+        self._lock = threading.Lock()
+
+        self.stats = {"hits": 0, "misses": 0, "stored": 0}
+
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """Load metadata and the digest index, ignoring any partially written tail"""
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as meta_file:
+                self.dim = json.load(meta_file).get("dim")
+
+        if not self.dim:
+            return
+
+        digests = b""
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as index_file:
+                digests = index_file.read()
+        else:
+            open(self.index_path, "wb").close()
+
+        if not os.path.exists(self.vectors_path):
+            open(self.vectors_path, "wb").close()
+        vector_rows = os.path.getsize(self.vectors_path) // (self.dim * 4)
+        row_count = min(len(digests) // DIGEST_SIZE, vector_rows)
+
+        # Drop rows from an interrupted append so new rows stay aligned
+        if os.path.getsize(self.vectors_path) != row_count * self.dim * 4:
+            with open(self.vectors_path, "r+b") as vectors_file:
+                vectors_file.truncate(row_count * self.dim * 4)
+        if len(digests) != row_count * DIGEST_SIZE:
+            with open(self.index_path, "r+b") as index_file:
+                index_file.truncate(row_count * DIGEST_SIZE)
+
+        for row in range(row_count):
+            self._rows[digests[row * DIGEST_SIZE:(row + 1) * DIGEST_SIZE]] = row
+        self._row_count = row_count
+
+    @staticmethod
+    def normalize_text(text):
+        return " ".join(str(text).split())
+
+    def key(self, text):
+        """Return the SHA-256 digest for text under this store's model"""
+        raw = f"{self.model}\0{self.normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).digest()
+
+    def _view(self):
+        """Return a memmap covering every stored row, remapping after appends (lock held)"""
+        if self._row_count == 0:
+            return None
+        if self._mmap is None or self._mapped_rows != self._row_count:
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._row_count, self.dim))
+            self._mapped_rows = self._row_count
+        return self._mmap
+
+    def get(self, text):
+        """Return the stored vector for text as a read-only view, or None"""
+        digest = self.key(text)
+        with self._lock:
+            row = self._rows.get(digest)
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            return self._view()[row]
+
+    def get_many(self, texts):
+        """Look up several texts and return (vectors, missing_indices)
+
+        vectors has one entry per text: a view into the store or None.
+        """
+        vectors = []
+        missing = []
+        with self._lock:
+            view = self._view()
+            for index, text in enumerate(texts):
+                row = self._rows.get(self.key(text))
+                if row is None:
+                    vectors.append(None)
+                    missing.append(index)
+                else:
+                    vectors.append(view[row])
+            self.stats["hits"] += len(texts) - len(missing)
+            self.stats["misses"] += len(missing)
+        return vectors, missing
+
+    def put_many(self, texts, matrix):
+        """Append vectors for texts that are not stored yet"""
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        if matrix.ndim != 2 or len(texts) != matrix.shape[0]:
+            raise ValueError("Expected one embedding row per text")
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(matrix.shape[1])
+                with open(self.meta_path, "w", encoding="utf-8") as meta_file:
+                    json.dump({"dim": self.dim, "model": self.model}, meta_file)
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match store dimension {self.dim}")
+
+            new_rows = []
+            new_digests = []
+            seen = set()
+            for index, text in enumerate(texts):
+                digest = self.key(text)
+                if digest in self._rows or digest in seen:
+                    continue
+                seen.add(digest)
+                new_rows.append(index)
+                new_digests.append(digest)
+
+            if not new_rows:
+                return 0
+
+            # Write vectors before the index so a crash never leaves digests without data
+            with open(self.vectors_path, "ab") as vectors_file:
+                vectors_file.write(matrix[new_rows].tobytes())
+            with open(self.index_path, "ab") as index_file:
+                index_file.write(b"".join(new_digests))
+
+            for digest in new_digests:
+                self._rows[digest] = self._row_count
+                self._row_count += 1
+            self.stats["stored"] += len(new_rows)
+
+            return len(new_rows)
+
+    def put(self, text, vector):
+        return self.put_many([text], np.asarray(vector, dtype=np.float32).reshape(1, -1))
+
+    def __len__(self):
+        return self._row_count
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["rows"] = self._row_count
+            stats["dim"] = self.dim
+        return stats
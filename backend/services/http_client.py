@@ -0,0 +1,142 @@
+import time
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+class PooledSession(requests.Session):
+    """requests.Session for one host with a default timeout and request counters"""
+
+    def __init__(self, host, timeout, pool_maxsize, retries):
+        super().__init__()
+        self.host = host
+        self.default_timeout = timeout
+
+        # Only connection failures are retried: the request never reached the server
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(total=retries, connect=retries, read=0, status=0, redirect=3, backoff_factor=0.1)
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+        self.adapter = adapter
+
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "total_time": 0.0}
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.default_timeout
+
+        started = time.monotonic()
+        failed = False
+        try:
+            return super().request(method, url, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            with self._lock:
+                self.stats["requests"] += 1
+                self.stats["total_time"] += time.monotonic() - started
+                if failed:
+                    self.stats["errors"] += 1
+
+    def close(self):
+        # Shared sessions live for the whole process
+        pass
+
+    def connection_stats(self):
+        """New connections versus requests served, read from urllib3's pools"""
+        connections = 0
+        requests_served = 0
+        pools = getattr(self.adapter.poolmanager, "pools", None)
+        if pools is not None:
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    connections += pool.num_connections
+                    requests_served += pool.num_requests
+        return connections, requests_served
+
+class HttpClient:
+    """Shared outbound HTTP layer with one keep-alive connection pool per host
+
+    Every provider call made over HTTP goes through the session for its
+    host, so warm calls reuse an open TCP+TLS connection instead of paying
+    for a new handshake. Each host can have its own (connect, read) timeout.
+    """
+
+    def __init__(self, pool_maxsize=32, timeout=(5.0, 30.0), host_timeouts=None, retries=2):
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.host_timeouts = dict(host_timeouts or {})
+        self.retries = retries
+
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, url_or_host):
+        """Return the pooled session for a URL's host, creating it on first use"""
+        host = urlsplit(url_or_host).netloc if "://" in url_or_host else url_or_host
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = PooledSession(
+                        host,
+                        self.host_timeouts.get(host, self.timeout),
+                        self.pool_maxsize,
+                        self.retries
+                    )
+                    self._sessions[host] = session
+        return session
+
+    def request(self, method, url, **kwargs):
+        return self.session_for(url).request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def get_stats(self):
+        stats = {}
+        with self._lock:
+            sessions = dict(self._sessions)
+        for host, session in sessions.items():
+            with session._lock:
+                counters = dict(session.stats)
+            connections, requests_served = session.connection_stats()
+            stats[host] = {
+                "requests": counters["requests"],
+                "errors": counters["errors"],
+                "avg_ms": round(counters["total_time"] / counters["requests"] * 1000, 1) if counters["requests"] else 0.0,
+                "connections_opened": connections,
+                "connections_reused": max(0, requests_served - connections),
+                "reuse_rate": round(1 - connections / requests_served, 3) if requests_served else 0.0
+            }
+        return stats
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+def get_http_client():
+    """Return the process-wide HTTP client"""
+    global _http_client
+    from config import HttpConfig
+
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                _http_client = HttpClient(
+                    pool_maxsize=HttpConfig.POOL_MAXSIZE,
+                    timeout=(HttpConfig.CONNECT_TIMEOUT, HttpConfig.READ_TIMEOUT),
+                    host_timeouts=HttpConfig.HOST_TIMEOUTS,
+                    retries=HttpConfig.CONNECT_RETRIES
+                )
+    return _http_client
@@ -0,0 +1,146 @@
+import io
+import time
+import base64
+import hashlib
+import binascii
+import threading
+from collections import OrderedDict
+
+# Optional: without Pillow images are passed through unchanged (still deduplicated)
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif")
+)
+
+def sniff_mime_type(data):
+    """Detect the image type from its first bytes, or None if unknown"""
+    for signature, mime_type in _SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:12] in (b"ftypheic", b"ftypheix", b"ftypmif1"):
+        return "image/heic"
+    return None
+
+def decode_image_input(image):
+    """Return the bytes of an image sent as base64, a data URL or raw bytes"""
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    image = str(image or "").strip()
+    if image.startswith("data:") and "," in image:
+        image = image.split(",", 1)[1]
+    try:
+        return base64.b64decode(image, validate=False)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid image data: {e}")
+
+class ImagePreprocessor:
+    """Prepare uploaded images for multimodal model calls
+
+    Images are decoded once, rotated upright from their EXIF orientation,
+    scaled down so the longer side is at most max_dimension, and re-encoded
+    as JPEG without metadata (PNG when they have transparency). Results are
+    kept in a small LRU keyed by the SHA-256 of the upload, so the same
+    image sent again is not processed twice.
+    """
+
+    def __init__(self, max_dimension=1536, quality=85, max_bytes=20 * 1024 * 1024, cache_entries=128):
+        self.max_dimension = max_dimension
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.cache_entries = cache_entries
+
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"images": 0, "deduplicated": 0, "resized": 0, "passed_through": 0,
+                      "bytes_in": 0, "bytes_out": 0, "total_time": 0.0}
+
+    def prepare(self, image):
+        """Return (part, digest): a Gemini inline-data part and the SHA-256 of the upload"""
+        data = decode_image_input(image)
+        if not data:
+            raise ValueError("Empty image")
+        if len(data) > self.max_bytes:
+            raise ValueError(f"Image is larger than {self.max_bytes // (1024 * 1024)} MB")
+
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            cached = self._cache.get(digest)
+            if cached is not None:
+                self._cache.move_to_end(digest)
+                self.stats["deduplicated"] += 1
+                return dict(cached), digest
+
+        started = time.monotonic()
+        try:
+            processed, mime_type, resized = self._process(data)
+        except Exception as e:
+            # Let the model try the original if it is a format we know
+            print(f"Error preprocessing image: {e}")
+            processed, mime_type, resized = data, sniff_mime_type(data), False
+            if mime_type is None:
+                raise ValueError("Unsupported image format")
+        elapsed = time.monotonic() - started
+
+        part = {"mime_type": mime_type, "data": processed}
+        with self._lock:
+            self._cache[digest] = part
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+            self.stats["images"] += 1
+            self.stats["resized"] += int(resized)
+            self.stats["passed_through"] += int(processed is data)
+            self.stats["bytes_in"] += len(data)
+            self.stats["bytes_out"] += len(processed)
+            self.stats["total_time"] += elapsed
+        return dict(part), digest
+
+    def _process(self, data):
+        """Return (bytes, mime_type, resized)"""
+        if Image is None:
+            mime_type = sniff_mime_type(data)
+            if mime_type is None:
+                raise ValueError("Unknown image format and Pillow is not installed")
+            return data, mime_type, False
+
+        image = Image.open(io.BytesIO(data))
+        original_size = image.size
+        # Let the JPEG decoder skip detail we are about to throw away
+        image.draft("RGB", (self.max_dimension, self.max_dimension))
+        image = ImageOps.exif_transpose(image)
+
+        resized = max(original_size) > self.max_dimension
+        if max(image.size) > self.max_dimension:
+            image.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+
+        # Re-encoding drops EXIF, GPS and other metadata
+        output = io.BytesIO()
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        if has_alpha:
+            image.save(output, format="PNG", optimize=True)
+            mime_type = "image/png"
+        else:
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            image.save(output, format="JPEG", quality=self.quality, optimize=True)
+            mime_type = "image/jpeg"
+        return output.getvalue(), mime_type, resized
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["cached"] = len(self._cache)
+        processed = stats["images"]
+        stats["pillow"] = Image is not None
+        stats["avg_ms"] = round(stats.pop("total_time") / processed * 1000, 1) if processed else 0.0
+        stats["size_ratio"] = round(stats["bytes_out"] / stats["bytes_in"], 3) if stats["bytes_in"] else 0.0
+        return stats
@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import uuid
+import queue
+import hashlib
+import threading
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class JobQueue:
+    """Persistent background job queue with bounded workers and retries
+
+    Jobs are plain dicts saved as one JSON file each, so results survive a
+    restart and jobs that were pending or running are queued again when
+    the serving process calls start(). Until then jobs are only persisted,
+    so tools sharing the store never run the server's jobs. A job that raises is retried with exponential
+    backoff up to max_retries times. Listeners are called with a copy of
+    the job whenever it finishes or fails.
+    """
+
+    def __init__(self, path, max_workers=2, max_retries=2, retry_backoff=2.0, result_ttl=86400):
+        self.path = path
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.result_ttl = result_ttl
+
+        self._handlers = {}
+        self._listeners = []
+        self._jobs = {}
+        self._dedupe = {}
+        self._queue = queue.Queue()
+        self._workers = []
+        self._started = False
+        self._lock = threading.Lock()
+
+        self.stats = {"submitted": 0, "deduplicated": 0, "completed": 0, "failed": 0, "retries": 0}
+
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _job_path(self, job_id):
+        return os.path.join(self.path, f"{job_id}.json")
+
+    def _load(self):
+        """Load persisted jobs, dropping finished ones older than result_ttl"""
+        now = time.time()
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+            file_path = os.path.join(self.path, name)
+            try:
+                with open(file_path, "r", encoding="utf-8") as job_file:
+                    job = json.load(job_file)
+            except (OSError, ValueError):
+                continue
+
+            if job["status"] in (DONE, FAILED) and now - job["updated_at"] > self.result_ttl:
+                os.remove(file_path)
+                continue
+            if job["status"] == RUNNING:
+                job["status"] = PENDING
+
+            self._jobs[job["id"]] = job
+            if job.get("dedupe_key") and job["status"] != FAILED:
+                self._dedupe[job["dedupe_key"]] = job["id"]
+
+    def _save(self, job):
+        temp_path = f"{self._job_path(job['id'])}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as job_file:
+            json.dump(job, job_file)
+        os.replace(temp_path, self._job_path(job["id"]))
+
+    def register(self, kind, handler):
+        """Register the function that runs jobs of a kind"""
+        with self._lock:
+            self._handlers[kind] = handler
+
+    def start(self):
+        """Start the workers and resume unfinished jobs of registered kinds"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            resumed = [
+                job["id"] for job in self._jobs.values()
+                if job["kind"] in self._handlers and job["status"] == PENDING
+            ]
+        for job_id in resumed:
+            self._enqueue(job_id)
+
+    def add_listener(self, listener):
+        """Call listener(job) whenever a job finishes or fails"""
+        self._listeners.append(listener)
+
+    def _ensure_workers(self):
+        with self._lock:
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            while len(self._workers) < self.max_workers:
+                worker = threading.Thread(
+                    target=self._run,
+                    name=f"mentaura-jobs-{len(self._workers)}",
+                    daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def _enqueue(self, job_id, delay=0):
+        if not self._started:
+            # Picked up by start() in the serving process
+            return
+        self._ensure_workers()
+        if delay > 0:
+            timer = threading.Timer(delay, self._queue.put, args=(job_id,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._queue.put(job_id)
+
+    @staticmethod
+    def make_key(kind, params):
+        raw = json.dumps({"kind": kind, "params": params}, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def submit(self, kind, params, dedupe=True, reuse_done=True):
+        """Queue a job and return a copy of it
+
+        With dedupe, a job of the same kind and params that is pending,
+        running or (unless reuse_done is False) done is returned instead of
+        starting a new one.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+
+        dedupe_key = self.make_key(kind, params) if dedupe else None
+        with self._lock:
+            existing_id = self._dedupe.get(dedupe_key) if dedupe_key else None
+            existing = self._jobs.get(existing_id)
+            if existing is not None and existing["status"] != FAILED and not (
+                existing["status"] == DONE
+                and (not reuse_done or time.time() - existing["updated_at"] > self.result_ttl)
+            ):
+                self.stats["deduplicated"] += 1
+                return dict(existing)
+
+            now = time.time()
+            job = {
+                "id": uuid.uuid4().hex,
+                "kind": kind,
+                "params": params,
+                "status": PENDING,
+                "result": None,
+                "error": None,
+                "attempts": 0,
+                "dedupe_key": dedupe_key,
+                "created_at": now,
+                "updated_at": now
+            }
+            self._jobs[job["id"]] = job
+            if dedupe_key:
+                self._dedupe[dedupe_key] = job["id"]
+            self.stats["submitted"] += 1
+            self._save(job)
+            snapshot = dict(job)
+
+        self._enqueue(job["id"])
+        return snapshot
+
+    @staticmethod
+    def public_view(job):
+        """Return the fields of a job that are safe to send to clients"""
+        return {
+            "id": job["id"],
+            "kind": job["kind"],
+            "status": job["status"],
+            "result": job["result"],
+            "error": job["error"] if job["status"] == FAILED else None,
+            "attempts": job["attempts"],
+            "createdAt": job["created_at"],
+            "updatedAt": job["updated_at"]
+        }
+
+    def get(self, job_id):
+        """Return a copy of a job, or None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _update(self, job, **changes):
+        """Apply changes, persist and return a snapshot (lock held)"""
+        job.update(changes)
+        job["updated_at"] = time.time()
+        self._save(job)
+        return dict(job)
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job["status"] != PENDING:
+                    continue
+                handler = self._handlers.get(job["kind"])
+                self._update(job, status=RUNNING, attempts=job["attempts"] + 1)
+                params = job["params"]
+
+            try:
+                result = handler(**params)
+            except Exception as e:
+                with self._lock:
+                    if job["attempts"] <= self.max_retries:
+                        self.stats["retries"] += 1
+                        self._update(job, status=PENDING, error=str(e))
+                        retry_delay = self.retry_backoff * (2 ** (job["attempts"] - 1))
+                        snapshot = None
+                    else:
+                        self.stats["failed"] += 1
+                        snapshot = self._update(job, status=FAILED, error=str(e))
+                if snapshot is None:
+                    self._enqueue(job_id, retry_delay)
+                else:
+                    self._notify(snapshot)
+                continue
+
+            with self._lock:
+                self.stats["completed"] += 1
+                snapshot = self._update(job, status=DONE, result=result, error=None)
+            self._notify(snapshot)
+
+    def _notify(self, job):
+        for listener in self._listeners:
+            try:
+                listener(job)
+            except Exception as e:
+                print(f"Error notifying job listener: {e}")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            stats["jobs"] = counts
+            stats["workers"] = len(self._workers)
+        stats["queued"] = self._queue.qsize()
+        return stats
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+class LessonStore:
+    """Versioned store of pre-generated lessons
+
+    Each lesson is one JSON file under path/v<version>/, keyed by a hash of
+    topic, subtopic, difficulty, teaching style and personality. Bumping the
+    version (e.g. after a prompt change) starts a fresh namespace without
+    touching older lessons. Recently read lessons are kept in memory.
+    """
+
+    def __init__(self, path, version="1", max_memory_entries=2000):
+        self.path = path
+        self.version = str(version)
+        self.directory = os.path.join(path, f"v{self.version}")
+        self.max_memory_entries = max_memory_entries
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stored": 0}
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def _normalize(value):
+        return " ".join(str(value or "").lower().split())
+
+    def make_key(self, topic, subtopic, difficulty, teaching_style, personality):
+        raw = "\0".join(
+            self._normalize(part) for part in (topic, subtopic, difficulty, teaching_style, personality)
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _file_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _remember(self, key, lesson):
+        """Add a lesson to the memory tier (lock held)"""
+        self._memory[key] = lesson
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, topic, subtopic, difficulty, teaching_style, personality):
+        """Return the stored lesson dict, or None"""
+        key = self.make_key(topic, subtopic, difficulty, teaching_style, personality)
+
+        with self._lock:
+            lesson = self._memory.get(key)
+            if lesson is not None:
+                self._memory.move_to_end(key)
+                self.stats["hits"] += 1
+                return lesson
+
+        try:
+            with open(self._file_path(key), "r", encoding="utf-8") as lesson_file:
+                lesson = json.load(lesson_file)
+        except (OSError, ValueError):
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        with self._lock:
+            self._remember(key, lesson)
+            self.stats["hits"] += 1
+        return lesson
+
+    def has(self, topic, subtopic, difficulty, teaching_style, personality):
+        key = self.make_key(topic, subtopic, difficulty, teaching_style, personality)
+        with self._lock:
+            if key in self._memory:
+                return True
+        return os.path.exists(self._file_path(key))
+
+    def put(self, topic, subtopic, difficulty, teaching_style, personality, lesson):
+        """Store a lesson; the file is written atomically"""
+        key = self.make_key(topic, subtopic, difficulty, teaching_style, personality)
+        record = dict(lesson)
+        record.update({
+            "topic": topic,
+            "subtopic": subtopic,
+            "difficulty": difficulty,
+            "teaching_style": teaching_style,
+            "personality": personality,
+            "version": self.version,
+            "generated_at": time.time()
+        })
+
+        temp_path = f"{self._file_path(key)}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as lesson_file:
+            json.dump(record, lesson_file)
+        os.replace(temp_path, self._file_path(key))
+
+        with self._lock:
+            self._remember(key, record)
+            self.stats["stored"] += 1
+        return record
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        stats["version"] = self.version
+        return stats
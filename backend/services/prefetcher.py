@@ -0,0 +1,155 @@
+import re
+import json
+import time
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from services import course_catalog
+from services.rate_limiter import BACKGROUND, lane
+
+# "1. Topic name: why", "- **Topic name** - why", "2) Topic name"
+_SUGGESTION_PATTERN = re.compile(
+    r"^\s*(?:\d+[.)]|[-*•])\s*(?:\*\*)?(?:Topic(?: name)?:\s*)?([^*:\n]{3,80}?)(?:\*\*)?\s*(?:[:\-–—(]|$)",
+    re.MULTILINE | re.IGNORECASE
+)
+
+def extract_topic_names(text, limit=3, exclude=()):
+    """Pull topic names out of a numbered or bulleted related-topics answer"""
+    excluded = {name.lower() for name in exclude if name}
+    names = []
+    for match in _SUGGESTION_PATTERN.finditer(str(text or "")):
+        name = match.group(1).strip().strip('"').strip()
+        lowered = name.lower()
+        if not name or lowered in excluded or lowered.startswith(("the name", "name of", "description", "how it")):
+            continue
+        if lowered not in (existing.lower() for existing in names):
+            names.append(name)
+        if len(names) >= limit:
+            break
+    return names
+
+class LessonPrefetcher:
+    """Generate the lessons a student is likely to open next before they ask
+
+    After a lesson is served, the next lesson in the course and the first
+    suggested related topics are generated in the background lane, so their
+    content, practice questions and related topics land in the response
+    cache and the next click is a cache hit. Prefetching is capped per
+    lesson and per hour, and requests are matched against what was
+    prefetched to report the hit rate.
+    """
+
+    def __init__(self, ai_service, next_lessons=1, related_topics=2, budget_per_hour=60,
+                 max_pending=8, workers=1, track_entries=1000):
+        self.ai_service = ai_service
+        self.next_lessons = next_lessons
+        self.related_topics = related_topics
+        self.budget_per_hour = budget_per_hour
+        self.max_pending = max_pending
+        self.track_entries = track_entries
+
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="mentaura-prefetch")
+        self._pending = 0
+        self._started = deque()
+        # lesson key -> {"status": "pending" | "done" | "failed", "used": bool}
+        self._prefetched = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.stats = {
+            "scheduled": 0, "completed": 0, "failed": 0,
+            "skipped_budget": 0, "skipped_queue": 0, "skipped_known": 0,
+            "requests": 0, "hits": 0, "late_hits": 0
+        }
+
+    def _key(self, topic, subtopic, difficulty, user_settings):
+        settings = self.ai_service.lesson_settings(difficulty, user_settings)
+        return json.dumps([topic, subtopic or "", difficulty, settings], sort_keys=True, default=str)
+
+    def record_request(self, topic, subtopic, difficulty, user_settings=None):
+        """Count a lesson request as a hit if it was prefetched"""
+        key = self._key(topic, subtopic, difficulty, user_settings)
+        with self._lock:
+            self.stats["requests"] += 1
+            entry = self._prefetched.get(key)
+            if entry is None or entry["used"]:
+                return False
+            entry["used"] = True
+            if entry["status"] == "done":
+                self.stats["hits"] += 1
+                return True
+            # Still generating; the request coalesces with it rather than starting over
+            self.stats["late_hits"] += 1
+            return False
+
+    def candidates(self, topic, subtopic, related_topics=None):
+        """Lessons likely to be opened after this one: the course's next lesson, then related topics"""
+        lessons = course_catalog.next_lessons(topic, subtopic, self.next_lessons)
+        for name in extract_topic_names(related_topics, self.related_topics, exclude=(topic, subtopic)):
+            lessons.append((name, ""))
+        return lessons
+
+    def _take_budget(self):
+        """Reserve one prefetch from the hourly budget (lock held)"""
+        now = time.monotonic()
+        while self._started and now - self._started[0] > 3600:
+            self._started.popleft()
+        if len(self._started) >= self.budget_per_hour:
+            return False
+        self._started.append(now)
+        return True
+
+    def after_lesson(self, topic, subtopic, difficulty, user_settings=None, related_topics=None):
+        """Schedule prefetches for the lessons likely to follow one that was just served"""
+        scheduled = 0
+        for next_topic, next_subtopic in self.candidates(topic, subtopic, related_topics):
+            # Pre-generated catalog lessons need no prefetch
+            if self.ai_service.get_stored_lesson(next_topic, next_subtopic, difficulty, user_settings) is not None:
+                continue
+
+            key = self._key(next_topic, next_subtopic, difficulty, user_settings)
+            with self._lock:
+                if key in self._prefetched:
+                    self.stats["skipped_known"] += 1
+                    continue
+                if self._pending >= self.max_pending:
+                    self.stats["skipped_queue"] += 1
+                    continue
+                if not self._take_budget():
+                    self.stats["skipped_budget"] += 1
+                    continue
+                self._pending += 1
+                self.stats["scheduled"] += 1
+                self._prefetched[key] = {"status": "pending", "used": False}
+                while len(self._prefetched) > self.track_entries:
+                    self._prefetched.popitem(last=False)
+
+            self._executor.submit(self._prefetch, key, next_topic, next_subtopic, difficulty, user_settings)
+            scheduled += 1
+        return scheduled
+
+    def _prefetch(self, key, topic, subtopic, difficulty, user_settings):
+        status = "failed"
+        try:
+            with lane(BACKGROUND):
+                _, failed = self.ai_service.generate_lesson(topic, subtopic, difficulty, user_settings)
+            status = "failed" if failed else "done"
+        except Exception as e:
+            print(f"Error prefetching lesson '{subtopic or topic}': {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.stats["completed" if status == "done" else "failed"] += 1
+                entry = self._prefetched.get(key)
+                if entry is not None:
+                    entry["status"] = status
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["pending"] = self._pending
+            stats["budget_used"] = len(self._started)
+        stats["budget_per_hour"] = self.budget_per_hour
+        # Share of finished prefetches that were opened, and of lesson requests that were prefetched
+        stats["hit_rate"] = round(stats["hits"] / stats["completed"], 3) if stats["completed"] else 0.0
+        stats["coverage"] = round(stats["hits"] / stats["requests"], 3) if stats["requests"] else 0.0
+        return stats
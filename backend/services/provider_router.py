@@ -0,0 +1,216 @@
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Smoothing for the share of hedged calls; slow so the cap tracks long-run spend
+HEDGE_RATIO_ALPHA = 0.02
+
+class ProviderStats:
+    """Rolling latency and error statistics for one provider"""
+
+    def __init__(self, alpha=0.2, sample_size=200):
+        self.alpha = alpha
+        self.ewma_latency = None
+        self.ewma_error_rate = 0.0
+        self.latencies = deque(maxlen=sample_size)
+        self.requests = 0
+        self.failures = 0
+
+    def record(self, latency, success):
+        """Fold one completed call into the statistics"""
+        self.requests += 1
+        if success:
+            self.latencies.append(latency)
+            if self.ewma_latency is None:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency = self.alpha * latency + (1 - self.alpha) * self.ewma_latency
+        else:
+            self.failures += 1
+
+        error = 0.0 if success else 1.0
+        self.ewma_error_rate = self.alpha * error + (1 - self.alpha) * self.ewma_error_rate
+
+    def percentile(self, pct):
+        """Return the pct-th percentile of recent successful latencies"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self):
+        p50 = self.percentile(50)
+        p95 = self.percentile(95)
+        return {
+            "ewmaLatency": round(self.ewma_latency, 3) if self.ewma_latency is not None else None,
+            "ewmaErrorRate": round(self.ewma_error_rate, 3),
+            "p50": round(p50, 3) if p50 is not None else None,
+            "p95": round(p95, 3) if p95 is not None else None,
+            "requests": self.requests,
+            "failures": self.failures
+        }
+
+class ProviderRouter:
+    """Latency-aware routing between LLM providers with hedged requests
+
+    The preferred provider is tried first. If it has not answered by the
+    configured latency percentile, the same request is sent to the next
+    provider and whichever answers first wins. Failures fall through to the
+    next provider immediately.
+    """
+
+    def __init__(self, hedge_enabled=True, hedge_percentile=95, hedge_min_delay=1.0,
+                 hedge_default_delay=5.0, hedge_max_ratio=0.1, min_samples=20,
+                 alpha=0.2, error_rate_threshold=0.5, max_workers=32, ignored_exceptions=()):
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_max_ratio = hedge_max_ratio
+        self.min_samples = min_samples
+        self.alpha = alpha
+        self.error_rate_threshold = error_rate_threshold
+        # Errors raised before the provider was reached; not counted as failures or latency
+        self.ignored_exceptions = tuple(ignored_exceptions)
+
+        self._stats = {}
+        self._lock = threading.Lock()
+        # Dedicated pool so hedging never waits on the shared AI call pool
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mentaura-router")
+
+        # Hedge accounting
+        self._hedge_ratio = 0.0
+        self.counters = {"calls": 0, "hedged": 0, "hedge_wins": 0, "fallbacks": 0}
+
+    def _get_stats(self, provider):
+        with self._lock:
+            if provider not in self._stats:
+                self._stats[provider] = ProviderStats(self.alpha)
+            return self._stats[provider]
+
+    def record(self, provider, latency, success):
+        """Record the outcome of a provider call"""
+        stats = self._get_stats(provider)
+        with self._lock:
+            stats.record(latency, success)
+
+    def order(self, providers):
+        """Order providers by preference, demoting unhealthy or slow ones
+
+        The first provider keeps priority unless its error rate crosses the
+        threshold or its average latency is clearly worse than an alternative.
+        """
+        def score(item):
+            position, provider = item
+            stats = self._get_stats(provider)
+            if stats.ewma_error_rate >= self.error_rate_threshold:
+                return (1, position)
+            if stats.ewma_latency is None or len(stats.latencies) < self.min_samples:
+                return (0, position)
+            # Latency penalised by error rate, with a bias towards the configured order
+            return (0, stats.ewma_latency * (1 + stats.ewma_error_rate) * (1 + 0.5 * position))
+
+        ranked = sorted(enumerate(providers), key=score)
+        return [provider for _, provider in ranked]
+
+    def hedge_delay(self, provider):
+        """Seconds to wait for provider before hedging to the next one"""
+        stats = self._get_stats(provider)
+        with self._lock:
+            if len(stats.latencies) < self.min_samples:
+                return self.hedge_default_delay
+            delay = stats.percentile(self.hedge_percentile)
+        return max(self.hedge_min_delay, delay)
+
+    def _may_hedge(self):
+        """Keep hedged requests to a bounded share of traffic"""
+        return self.hedge_enabled and self._hedge_ratio < self.hedge_max_ratio
+
+    def _update_hedge_ratio(self, hedged):
+        with self._lock:
+            self._hedge_ratio = HEDGE_RATIO_ALPHA * (1.0 if hedged else 0.0) + (1 - HEDGE_RATIO_ALPHA) * self._hedge_ratio
+
+    def _timed(self, provider, fn):
+        """Run fn and record its latency and outcome"""
+        start = time.monotonic()
+        try:
+            result = fn()
+        except self.ignored_exceptions:
+            raise
+        except Exception:
+            self.record(provider, time.monotonic() - start, False)
+            raise
+        self.record(provider, time.monotonic() - start, True)
+        return result
+
+    def call(self, calls):
+        """Call providers in preference order and return (provider, result)
+
+        calls maps provider name to a zero-argument callable. Raises the last
+        error if every provider fails.
+        """
+        providers = self.order(list(calls.keys()))
+        with self._lock:
+            self.counters["calls"] += 1
+
+        last_error = None
+        pending = {}
+        hedged = False
+
+        for index, provider in enumerate(providers):
+            # Each attempt runs in its own copy of the caller's context, keeping its rate limit lane
+            context = contextvars.copy_context()
+            future = self._executor.submit(context.run, self._timed, provider, calls[provider])
+            pending[future] = provider
+
+            has_next = index + 1 < len(providers)
+            timeout = self.hedge_delay(provider) if has_next and self._may_hedge() else None
+
+            while pending:
+                done, _ = wait(list(pending.keys()), timeout=timeout, return_when=FIRST_COMPLETED)
+
+                if not done:
+                    # Still waiting after the hedge delay: fire the next provider
+                    hedged = True
+                    with self._lock:
+                        self.counters["hedged"] += 1
+                    break
+
+                for finished in done:
+                    finished_provider = pending.pop(finished)
+                    try:
+                        result = finished.result()
+                    except Exception as e:
+                        print(f"Provider {finished_provider} failed: {e}")
+                        last_error = e
+                        continue
+
+                    # Abandon the slower request; a running call cannot be interrupted,
+                    # so its result is simply discarded when it completes
+                    for other in pending:
+                        other.cancel()
+
+                    if hedged and finished_provider != providers[0]:
+                        with self._lock:
+                            self.counters["hedge_wins"] += 1
+                    self._update_hedge_ratio(hedged)
+                    return finished_provider, result
+
+                if not pending and has_next:
+                    # Everything in flight failed, move straight on to the next provider
+                    with self._lock:
+                        self.counters["fallbacks"] += 1
+
+        self._update_hedge_ratio(hedged)
+        raise last_error or RuntimeError("No AI provider available")
+
+    def snapshot(self):
+        """Return routing statistics for every provider"""
+        with self._lock:
+            return {
+                "providers": {name: stats.snapshot() for name, stats in self._stats.items()},
+                "hedging": dict(self.counters, enabled=self.hedge_enabled, ratio=round(self._hedge_ratio, 3))
+            }
@@ -0,0 +1,681 @@
+import io
+import os
+import re
+import json
+import math
+import time
+import wave
+import zlib
+import base64
+import random
+import struct
+import hashlib
+import threading
+from types import SimpleNamespace
+
+LIVE = "live"
+RECORD = "record"
+SIMULATE = "simulate"
+MODES = (LIVE, RECORD, SIMULATE)
+
+# Median and 95th percentile latency, failure rate and stream timing per provider
+DEFAULT_PROFILES = {
+    "gemini": {"latency_ms": 900, "p95_ms": 2500, "error_rate": 0.0, "first_chunk_ms": 400, "chunk_ms": 40, "chunk_words": 4},
+    "openai": {"latency_ms": 700, "p95_ms": 2000, "error_rate": 0.0, "first_chunk_ms": 300, "chunk_ms": 30, "chunk_words": 3},
+    "openai_embeddings": {"latency_ms": 120, "p95_ms": 350, "error_rate": 0.0},
+    "openai_images": {"latency_ms": 6000, "p95_ms": 12000, "error_rate": 0.0},
+    "google_tts": {"latency_ms": 350, "p95_ms": 900, "error_rate": 0.0},
+    "google_stt": {"latency_ms": 400, "p95_ms": 1000, "error_rate": 0.0, "first_chunk_ms": 150},
+    "elevenlabs": {"latency_ms": 600, "p95_ms": 1500, "error_rate": 0.0},
+    "edge": {"latency_ms": 450, "p95_ms": 1200, "error_rate": 0.0}
+}
+
+_WORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z\-]{3,}")
+_KEY_PATTERN = re.compile(r'"(\w+)"\s*:')
+_FIELDS_PATTERN = re.compile(r"fields:\s*([\w ,]+)", re.IGNORECASE)
+_COUNT_PATTERN = re.compile(r"\b(\d{1,2})\b")
+
+_STOPWORDS = {
+    "about", "after", "also", "answer", "based", "being", "between", "concise", "could", "detailed",
+    "each", "explain", "format", "from", "have", "into", "just", "like", "make", "more", "most", "only",
+    "other", "please", "provide", "question", "questions", "should", "some", "student", "than", "that",
+    "their", "them", "then", "there", "these", "they", "this", "those", "through", "using", "very",
+    "what", "when", "where", "which", "while", "with", "would", "your", "json", "array", "object",
+    "teacher", "teaching", "style", "friendly", "level", "following", "generate", "create", "include"
+}
+
+_SENTENCES = [
+    "{A} is easiest to understand by starting from a simple example.",
+    "The key idea behind {a} is how it connects to {b}.",
+    "When you work with {a}, pay attention to {b} first.",
+    "A common mistake is to treat {a} and {b} as the same thing.",
+    "Try describing {a} in your own words before moving on.",
+    "In practice, {a} shows up whenever {b} changes.",
+    "Let's look at why {a} matters for {b}.",
+    "Once {a} makes sense, {b} follows naturally.",
+    "Think of {a} as a tool for reasoning about {b}.",
+    "A quick check: can you give an example of {a}?"
+]
+
+_TRANSCRIPTS = [
+    "Can you explain that again with an example?",
+    "What is the difference between these two ideas?",
+    "I think I understand, can we try a practice question?",
+    "How does this connect to what we learned before?",
+    "Could you slow down and go over the first step?",
+    "Why does that work?"
+]
+
+class SimulatedProviderError(RuntimeError):
+    """Failure injected by the provider simulator"""
+
+class LatencyProfile:
+    """Latency distribution, error rate and stream timing of one simulated provider
+
+    Latency is log-normal with the given median and 95th percentile, which
+    matches the long tail of real API latency better than a fixed delay.
+    """
+
+    def __init__(self, latency_ms=500, p95_ms=None, error_rate=0.0, first_chunk_ms=None, chunk_ms=30, chunk_words=4):
+        self.latency_ms = float(latency_ms)
+        self.p95_ms = float(p95_ms or latency_ms)
+        self.error_rate = float(error_rate)
+        self.first_chunk_ms = float(first_chunk_ms if first_chunk_ms is not None else latency_ms)
+        self.chunk_ms = float(chunk_ms)
+        self.chunk_words = max(1, int(chunk_words))
+
+        # sigma of the underlying normal, from the ratio of p95 to the median (z = 1.645)
+        ratio = max(1.0, self.p95_ms / self.latency_ms) if self.latency_ms > 0 else 1.0
+        self.sigma = math.log(ratio) / 1.645
+
+    def sample(self, rng, median_ms=None):
+        """Draw one latency in seconds"""
+        median_ms = self.latency_ms if median_ms is None else median_ms
+        if median_ms <= 0:
+            return 0.0
+        return median_ms * math.exp(rng.gauss(0.0, self.sigma)) / 1000.0
+
+class Cassette:
+    """Recorded provider responses, one JSON line per response in a file per provider"""
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        if os.path.isdir(path):
+            self._load()
+
+    def _load(self):
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith(".jsonl"):
+                continue
+            with open(os.path.join(self.path, name), "r", encoding="utf-8") as cassette_file:
+                for line in cassette_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._entries[entry["key"]] = entry
+
+    @staticmethod
+    def make_key(provider, kind, request):
+        raw = json.dumps({"provider": provider, "kind": kind, "request": request}, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, entry):
+        """Add an entry, appending it to its provider's file"""
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock:
+            self._entries[entry["key"]] = entry
+            with open(os.path.join(self.path, f"{entry['provider']}.jsonl"), "a", encoding="utf-8") as cassette_file:
+                cassette_file.write(json.dumps(entry) + "\n")
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+class ProviderSimulator:
+    """Offline stand-in for the AI and speech providers
+
+    In simulate mode every provider call is answered from the cassette when
+    a recording of the same request exists, replaying its recorded latency,
+    and is synthesized otherwise: plausible text (or JSON shaped like the
+    prompt asks for), WAV audio, PNG images and hash-seeded embeddings, with
+    latency and failures drawn from the provider's profile. In record mode
+    live calls are made as usual and their responses written to the
+    cassette. Synthesized content depends only on the request and the seed,
+    so benchmark runs are reproducible.
+    """
+
+    def __init__(self, mode=SIMULATE, cassette_path=None, profiles=None, seed=0, time_scale=1.0, error_rate=None):
+        if mode not in (RECORD, SIMULATE):
+            raise ValueError(f"Unknown provider simulator mode '{mode}'")
+        self.mode = mode
+        self.seed = seed
+        self.time_scale = time_scale
+        self.cassette = Cassette(cassette_path) if cassette_path else None
+
+        merged = {provider: dict(profile) for provider, profile in DEFAULT_PROFILES.items()}
+        for provider, profile in (profiles or {}).items():
+            merged.setdefault(provider, {}).update(profile)
+        if error_rate is not None:
+            for profile in merged.values():
+                profile["error_rate"] = error_rate
+        self.profiles = {provider: LatencyProfile(**profile) for provider, profile in merged.items()}
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @property
+    def recording(self):
+        return self.mode == RECORD
+
+    def profile(self, provider):
+        return self.profiles.get(provider) or self.profiles.setdefault(provider, LatencyProfile())
+
+    def _count(self, provider, outcome):
+        with self._lock:
+            counts = self._stats.setdefault(provider, {"replayed": 0, "synthesized": 0, "recorded": 0, "errors": 0})
+            counts[outcome] += 1
+
+    def _sleep(self, seconds):
+        if seconds > 0 and self.time_scale > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def _draw(self, provider, median_ms=None):
+        """Draw (latency, fails) for one synthesized call"""
+        profile = self.profile(provider)
+        with self._lock:
+            latency = profile.sample(self._rng, median_ms)
+            fails = self._rng.random() < profile.error_rate
+        return latency, fails
+
+    def _rng_for(self, *parts):
+        """Random generator seeded by the request, so synthesized content is reproducible"""
+        raw = json.dumps([self.seed, parts], default=str)
+        return random.Random(int(hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16], 16))
+
+    def _lookup(self, provider, kind, request):
+        if self.cassette is None:
+            return None, None
+        key = Cassette.make_key(provider, kind, request)
+        return key, self.cassette.get(key)
+
+    def record(self, provider, kind, request, response, latency, chunks=None, binary=False):
+        """Save a live response (text, bytes or stream chunks with their offsets) to the cassette"""
+        if self.cassette is None:
+            return
+        entry = {
+            "key": Cassette.make_key(provider, kind, request),
+            "provider": provider,
+            "kind": kind,
+            "latency_ms": round(latency * 1000, 1),
+            "recorded_at": time.time()
+        }
+        if chunks is not None:
+            entry["chunks"] = [[round(offset * 1000, 1), text] for offset, text in chunks]
+        elif binary:
+            entry["audio"] = base64.b64encode(response).decode("utf-8")
+        else:
+            entry["response"] = response
+        self.cassette.put(entry)
+        self._count(provider, "recorded")
+
+    def call(self, provider, kind, request, live_fn, synthesize_fn, binary=False):
+        """Answer one non-streaming request
+
+        Record mode calls live_fn and records its result; simulate mode
+        replays or synthesizes it. request identifies the call in the
+        cassette and must be JSON serializable.
+        """
+        if self.recording:
+            started = time.monotonic()
+            result = live_fn()
+            self.record(provider, kind, request, result, time.monotonic() - started, binary=binary)
+            return result
+
+        _, entry = self._lookup(provider, kind, request)
+        if entry is not None:
+            self._count(provider, "replayed")
+            self._sleep(entry.get("latency_ms", 0) / 1000.0)
+            if "chunks" in entry:
+                return "".join(text for _, text in entry["chunks"])
+            return base64.b64decode(entry["audio"]) if binary else entry["response"]
+
+        latency, fails = self._draw(provider)
+        self._sleep(latency)
+        if fails:
+            self._count(provider, "errors")
+            raise SimulatedProviderError(f"Simulated {provider} error")
+        self._count(provider, "synthesized")
+        return synthesize_fn()
+
+    def stream(self, provider, kind, request, synthesize_fn):
+        """Yield text chunks for a streaming request with recorded or simulated timing"""
+        _, entry = self._lookup(provider, kind, request)
+        if entry is not None:
+            self._count(provider, "replayed")
+            recorded = entry.get("chunks") or [[entry.get("latency_ms", 0), entry.get("response", "")]]
+            previous = 0.0
+            for offset_ms, text in recorded:
+                self._sleep((offset_ms - previous) / 1000.0)
+                previous = offset_ms
+                yield text
+            return
+
+        profile = self.profile(provider)
+        latency, fails = self._draw(provider, profile.first_chunk_ms)
+        self._sleep(latency)
+        if fails:
+            self._count(provider, "errors")
+            raise SimulatedProviderError(f"Simulated {provider} stream error")
+        self._count(provider, "synthesized")
+
+        words = synthesize_fn().split(" ")
+        for start in range(0, len(words), profile.chunk_words):
+            if start:
+                self._sleep(profile.chunk_ms / 1000.0)
+            piece = " ".join(words[start:start + profile.chunk_words])
+            yield piece if start + profile.chunk_words >= len(words) else piece + " "
+
+    def record_stream(self, provider, kind, request, chunks, text_of):
+        """Pass a live stream through, recording each chunk's text and offset when it ends"""
+        started = time.monotonic()
+        recorded = []
+        for chunk in chunks:
+            recorded.append((time.monotonic() - started, text_of(chunk) or ""))
+            yield chunk
+        self.record(provider, kind, request, None, time.monotonic() - started, chunks=recorded)
+
+    def synthesize_text(self, prompt, max_tokens=None):
+        """Plausible answer text for a prompt, or JSON when the prompt asks for it"""
+        prompt = str(prompt or "")
+        rng = self._rng_for("text", prompt)
+        if "json" in prompt.lower():
+            return self._synthesize_json(prompt, rng)
+
+        # About 0.75 words per token, capped so simulated answers stay readable
+        target_words = min(int((max_tokens or 400) * 0.75), 300)
+        return self._synthesize_prose(prompt, rng, max(20, int(target_words * rng.uniform(0.5, 1.0))))
+
+    def _synthesize_prose(self, prompt, rng, target_words):
+        terms = [word.lower() for word in _WORD_PATTERN.findall(prompt) if word.lower() not in _STOPWORDS]
+        terms = list(dict.fromkeys(terms)) or ["this topic", "the basics"]
+
+        sentences = []
+        word_count = 0
+        while word_count < target_words:
+            first, second = rng.choice(terms), rng.choice(terms)
+            sentence = rng.choice(_SENTENCES).format(a=first, A=first.capitalize(), b=second)
+            sentences.append(sentence)
+            word_count += len(sentence.split())
+        return " ".join(sentences)
+
+    def _synthesize_json(self, prompt, rng):
+        keys = list(dict.fromkeys(_KEY_PATTERN.findall(prompt)))
+        fields = _FIELDS_PATTERN.search(prompt)
+        if fields:
+            keys.extend(key.strip() for key in fields.group(1).split(",") if key.strip())
+        keys = list(dict.fromkeys(keys)) or ["id", "title", "description"]
+
+        def value(key, index):
+            lowered = key.lower()
+            if lowered.startswith("is") or lowered.startswith("has"):
+                return rng.random() < 0.7
+            if lowered == "id":
+                return f"item-{index + 1}"
+            if "answer" in lowered or lowered in ("value", "score", "result"):
+                return str(rng.randint(1, 100))
+            if lowered in ("options", "choices"):
+                return [str(rng.randint(1, 100)) for _ in range(4)]
+            if lowered == "type":
+                return "number"
+            return self._synthesize_prose(prompt, rng, 1)
+
+        # An array when the prompt shows one before its first object
+        array_at, object_at = prompt.find("["), prompt.find("{")
+        if "array" in prompt.lower() or (array_at != -1 and (object_at == -1 or array_at < object_at)):
+            counts = [int(count) for count in _COUNT_PATTERN.findall(prompt) if 0 < int(count) <= 10]
+            count = counts[0] if counts else 3
+            return json.dumps([{key: value(key, index) for key in keys} for index in range(count)], indent=2)
+        return json.dumps({key: value(key, 0) for key in keys}, indent=2)
+
+    def synthesize_audio(self, text, sample_rate=16000):
+        """A WAV tone as long as the text would take to speak (about 2.5 words per second)"""
+        rng = self._rng_for("audio", text)
+        duration = min(30.0, max(0.5, len(str(text or "").split()) / 2.5))
+        frequency = rng.uniform(180.0, 260.0)
+        frame_count = int(duration * sample_rate)
+        samples = struct.pack(
+            f"<{frame_count}h",
+            *(int(6000 * math.sin(2 * math.pi * frequency * index / sample_rate)) for index in range(frame_count))
+        )
+
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+            wav_file.writeframes(samples)
+        return buffer.getvalue()
+
+    def synthesize_transcript(self, audio_bytes):
+        return self._rng_for("transcript", hashlib.sha256(audio_bytes or b"").hexdigest()).choice(_TRANSCRIPTS)
+
+    def stream_transcript(self, chunks, interim_results=True, interim_every=4):
+        """Yield (transcript, is_final) while audio chunks arrive, then the final transcript"""
+        words = None
+        received = 0
+        shown = 0
+        for chunk in chunks:
+            if not chunk:
+                continue
+            received += 1
+            if words is None:
+                # The first chunk picks the sentence, so interim results can grow towards it
+                words = self.synthesize_transcript(chunk).split(" ")
+            if interim_results and received % interim_every == 0:
+                grown = min(len(words) - 1, received // interim_every)
+                if grown > shown:
+                    shown = grown
+                    yield " ".join(words[:shown]), False
+        if words is None:
+            return
+
+        latency, fails = self._draw("google_stt", self.profile("google_stt").first_chunk_ms)
+        self._sleep(latency)
+        if fails:
+            self._count("google_stt", "errors")
+            raise SimulatedProviderError("Simulated google_stt stream error")
+        self._count("google_stt", "synthesized")
+        yield " ".join(words), True
+
+    def synthesize_image(self, prompt, size=64):
+        """A solid-colour PNG whose colour is derived from the prompt"""
+        rng = self._rng_for("image", prompt)
+        pixel = bytes(rng.randint(0, 255) for _ in range(3))
+        raw = b"".join(b"\x00" + pixel * size for _ in range(size))
+
+        def chunk(tag, data):
+            return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+        return b"".join([
+            b"\x89PNG\r\n\x1a\n",
+            chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)),
+            chunk(b"IDAT", zlib.compress(raw)),
+            chunk(b"IEND", b"")
+        ])
+
+    def synthesize_embedding(self, text, dimensions=1536):
+        """A unit vector seeded by the text, so identical texts embed identically"""
+        rng = self._rng_for("embedding", text)
+        vector = [rng.gauss(0.0, 1.0) for _ in range(dimensions)]
+        norm = math.sqrt(sum(component * component for component in vector)) or 1.0
+        return [component / norm for component in vector]
+
+    def get_stats(self):
+        with self._lock:
+            providers = {provider: dict(counts) for provider, counts in self._stats.items()}
+        return {
+            "mode": self.mode,
+            "seed": self.seed,
+            "timeScale": self.time_scale,
+            "cassetteEntries": len(self.cassette) if self.cassette is not None else 0,
+            "providers": providers
+        }
+
+class _Response(dict):
+    """Dict with attribute access, like the objects returned by the openai library"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+def _response(value):
+    if isinstance(value, dict):
+        return _Response({key: _response(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [_response(item) for item in value]
+    return value
+
+def _gemini_request(contents):
+    """Cassette request for Gemini contents: the text parts and a digest of any image"""
+    parts = contents if isinstance(contents, list) else [contents]
+    return [
+        part if isinstance(part, str)
+        else hashlib.sha256(part["data"] if isinstance(part, dict) else bytes(part)).hexdigest()
+        for part in parts
+    ]
+
+class SimulatedGeminiModel:
+    """Stands in for genai.GenerativeModel, wrapping the real model in record mode"""
+
+    def __init__(self, simulator, model=None):
+        self.simulator = simulator
+        self.model = model
+
+    def generate_content(self, contents, stream=False, generation_config=None, request_options=None):
+        request = _gemini_request(contents)
+        max_tokens = (generation_config or {}).get("max_output_tokens")
+        prompt = " ".join(part for part in request if isinstance(part, str))
+
+        if stream:
+            if self.simulator.recording:
+                chunks = self.model.generate_content(
+                    contents, stream=True, generation_config=generation_config, request_options=request_options
+                )
+                return self.simulator.record_stream(
+                    "gemini", "generate", request, chunks, lambda chunk: getattr(chunk, "text", "")
+                )
+            return (
+                SimpleNamespace(text=text)
+                for text in self.simulator.stream(
+                    "gemini", "generate", request, lambda: self.simulator.synthesize_text(prompt, max_tokens)
+                )
+            )
+
+        def live():
+            return self.model.generate_content(
+                contents, generation_config=generation_config, request_options=request_options
+            ).text
+
+        text = self.simulator.call(
+            "gemini", "generate", request, live, lambda: self.simulator.synthesize_text(prompt, max_tokens)
+        )
+        return SimpleNamespace(text=text, usage_metadata=None)
+
+class _SimulatedChatCompletion:
+    def __init__(self, simulator, client):
+        self.simulator = simulator
+        self.client = client
+
+    def create(self, model=None, messages=None, max_tokens=None, stream=False, **kwargs):
+        request = {"model": model, "messages": messages}
+        prompt = "\n".join(message["content"] for message in messages or [])
+
+        if stream:
+            if self.simulator.recording:
+                chunks = self.client.ChatCompletion.create(
+                    model=model, messages=messages, max_tokens=max_tokens, stream=True, **kwargs
+                )
+                return self.simulator.record_stream(
+                    "openai", "chat", request, chunks, lambda chunk: chunk["choices"][0]["delta"].get("content")
+                )
+            return (
+                _response({"choices": [{"delta": {"content": text}}]})
+                for text in self.simulator.stream(
+                    "openai", "chat", request, lambda: self.simulator.synthesize_text(prompt, max_tokens)
+                )
+            )
+
+        def live():
+            response = self.client.ChatCompletion.create(
+                model=model, messages=messages, max_tokens=max_tokens, **kwargs
+            )
+            return response.choices[0].message.content
+
+        content = self.simulator.call(
+            "openai", "chat", request, live, lambda: self.simulator.synthesize_text(prompt, max_tokens)
+        )
+        return _response({"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+class _SimulatedEmbedding:
+    def __init__(self, simulator, client):
+        self.simulator = simulator
+        self.client = client
+
+    def create(self, input=None, model=None, **kwargs):
+        if self.simulator.recording:
+            # Embeddings are deterministic and large, so they are not recorded
+            return self.client.Embedding.create(input=input, model=model, **kwargs)
+
+        texts = [input] if isinstance(input, str) else list(input or [])
+        vectors = self.simulator.call(
+            "openai_embeddings",
+            "embed",
+            None,
+            None,
+            lambda: [self.simulator.synthesize_embedding(text) for text in texts]
+        )
+        return _response({
+            "data": [{"index": index, "embedding": vector} for index, vector in enumerate(vectors)],
+            "model": model
+        })
+
+class _SimulatedImage:
+    def __init__(self, simulator, client):
+        self.simulator = simulator
+        self.client = client
+
+    def create(self, prompt=None, response_format="url", **kwargs):
+        if self.simulator.recording:
+            # Images are not recorded; the image store already keeps them
+            return self.client.Image.create(prompt=prompt, response_format=response_format, **kwargs)
+
+        image = self.simulator.call(
+            "openai_images", "image", None, None, lambda: self.simulator.synthesize_image(prompt)
+        )
+        encoded = base64.b64encode(image).decode("utf-8")
+        if response_format == "b64_json":
+            return _response({"data": [{"b64_json": encoded}]})
+        return _response({"data": [{"url": f"data:image/png;base64,{encoded}"}]})
+
+class SimulatedOpenAI:
+    """Stands in for the openai module: ChatCompletion, Embedding and Image
+
+    In record mode chat completions are recorded and everything else is
+    passed through to the real module.
+    """
+
+    def __init__(self, simulator, client=None):
+        self.simulator = simulator
+        self.client = client
+        self.ChatCompletion = _SimulatedChatCompletion(simulator, client)
+        self.Embedding = _SimulatedEmbedding(simulator, client)
+        self.Image = _SimulatedImage(simulator, client)
+
+    @property
+    def api_key(self):
+        return self.client.api_key if self.simulator.recording else "simulated"
+
+class SimulatedTTSClient:
+    """Stands in for texttospeech.TextToSpeechClient; simulated audio is WAV"""
+
+    def __init__(self, simulator, client=None):
+        self.simulator = simulator
+        self.client = client
+
+    def synthesize_speech(self, input=None, voice=None, audio_config=None, **kwargs):
+        text = getattr(input, "text", "") or ""
+        request = {
+            "text": text,
+            "voice": getattr(voice, "name", None),
+            "speaking_rate": getattr(audio_config, "speaking_rate", None),
+            "pitch": getattr(audio_config, "pitch", None)
+        }
+        audio = self.simulator.call(
+            "google_tts",
+            "speech",
+            request,
+            lambda: self.client.synthesize_speech(input=input, voice=voice, audio_config=audio_config, **kwargs).audio_content,
+            lambda: self.simulator.synthesize_audio(text),
+            binary=True
+        )
+        return SimpleNamespace(audio_content=audio)
+
+class SimulatedSTTClient:
+    """Stands in for speech.SpeechClient"""
+
+    def __init__(self, simulator, client=None):
+        self.simulator = simulator
+        self.client = client
+
+    def recognize(self, config=None, audio=None, **kwargs):
+        content = getattr(audio, "content", b"") or b""
+
+        def live():
+            response = self.client.recognize(config=config, audio=audio, **kwargs)
+            return "".join(result.alternatives[0].transcript for result in response.results)
+
+        transcript = self.simulator.call(
+            "google_stt",
+            "transcribe",
+            {"audio": hashlib.sha256(content).hexdigest()},
+            live,
+            lambda: self.simulator.synthesize_transcript(content)
+        )
+        alternative = SimpleNamespace(transcript=transcript, confidence=1.0)
+        return SimpleNamespace(results=[SimpleNamespace(alternatives=[alternative], is_final=True)])
+
+    def streaming_recognize(self, config=None, requests=None, **kwargs):
+        # Streamed transcripts depend on chunk timing, so record mode passes them through unrecorded
+        if self.simulator.recording:
+            return self.client.streaming_recognize(config=config, requests=requests, **kwargs)
+        return self._simulated_stream(config, requests)
+
+    def _simulated_stream(self, config, requests):
+        chunks = (getattr(request, "audio_content", b"") for request in requests)
+        for transcript, is_final in self.simulator.stream_transcript(chunks, getattr(config, "interim_results", True)):
+            alternative = SimpleNamespace(transcript=transcript, confidence=1.0 if is_final else 0.0)
+            yield SimpleNamespace(
+                results=[SimpleNamespace(alternatives=[alternative], is_final=is_final, stability=0.0 if is_final else 0.8)],
+                speech_event_type=0
+            )
+
+_simulator = None
+_simulator_lock = threading.Lock()
+
+def get_simulator():
+    """Return the process-wide simulator, or None when providers are live"""
+    global _simulator
+    from config import SimulatorConfig
+
+    if SimulatorConfig.MODE not in MODES:
+        raise ValueError(f"PROVIDER_MODE must be one of {', '.join(MODES)}")
+    if SimulatorConfig.MODE == LIVE:
+        return None
+
+    with _simulator_lock:
+        if _simulator is None:
+            profiles = None
+            if SimulatorConfig.PROFILES_PATH:
+                with open(SimulatorConfig.PROFILES_PATH, "r", encoding="utf-8") as profiles_file:
+                    profiles = json.load(profiles_file)
+            _simulator = ProviderSimulator(
+                SimulatorConfig.MODE,
+                cassette_path=SimulatorConfig.CASSETTE_PATH,
+                profiles=profiles,
+                seed=SimulatorConfig.SEED,
+                time_scale=SimulatorConfig.TIME_SCALE,
+                error_rate=SimulatorConfig.ERROR_RATE
+            )
+            print(f"Provider simulator enabled in {SimulatorConfig.MODE} mode")
+        return _simulator
@@ -0,0 +1,200 @@
+import time
+import heapq
+import itertools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+LANES = (INTERACTIVE, BACKGROUND)
+
+# Lane of the AI calls made by the current request or job; copied into pool threads by submit_call
+# and ProviderRouter.call
+_lane = contextvars.ContextVar("mentaura_ai_lane", default=INTERACTIVE)
+
+def current_lane():
+    return _lane.get()
+
+@contextmanager
+def lane(name):
+    """Run the enclosed AI calls in a priority lane"""
+    if name not in LANES:
+        raise ValueError(f"Unknown priority lane '{name}'")
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+class RateLimitTimeout(RuntimeError):
+    """Raised when a call waited longer than allowed for rate limit capacity"""
+
+class TokenBucket:
+    """Bucket holding up to `per_minute` units, refilled continuously"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount, now):
+        """Seconds until amount is available (requests larger than the bucket wait for a full one)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+class _Limit:
+    """Buckets, waiting queue and metrics for one provider and model"""
+
+    def __init__(self, rpm, tpm, history):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.waiters = []
+        self.condition = threading.Condition()
+        self.stats = {
+            name: {"acquired": 0, "waited": 0, "timeouts": 0, "queued": 0, "max_queued": 0,
+                   "total_wait": 0.0, "max_wait": 0.0, "waits": deque(maxlen=history)}
+            for name in LANES
+        }
+
+    def delay(self, tokens, now):
+        delay = self.requests.delay(1, now) if self.requests else 0.0
+        if self.tokens and tokens:
+            delay = max(delay, self.tokens.delay(tokens, now))
+        return delay
+
+    def take(self, tokens):
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens and tokens:
+            self.tokens.take(tokens)
+
+class RateLimiter:
+    """Client-side request and token rate limits per provider and model
+
+    Each limit has a requests-per-minute and a tokens-per-minute bucket. A
+    call reserves one request and its estimated tokens before it goes to the
+    provider, waiting in a priority queue while either bucket is short:
+    interactive calls are always served before background calls, and calls
+    in the same lane are served in arrival order. Unused estimated tokens
+    can be refunded once the real usage is known.
+    """
+
+    def __init__(self, limits, max_wait=30.0, history=200):
+        # limits maps "provider:model" or "provider" to {"rpm": ..., "tpm": ...}
+        self.max_wait = max_wait
+        self._limits = {
+            key: _Limit(limit.get("rpm"), limit.get("tpm"), history)
+            for key, limit in limits.items()
+            if limit.get("rpm") or limit.get("tpm")
+        }
+        self._sequence = itertools.count()
+
+    def _find(self, provider, model):
+        return self._limits.get(f"{provider}:{model}") or self._limits.get(provider)
+
+    def acquire(self, provider, model=None, tokens=0, lane_name=None, timeout=None):
+        """Wait for capacity and reserve it, returning the reserved token count
+
+        Raises RateLimitTimeout if capacity is not available within timeout
+        (max_wait by default). Calls without a configured limit return at once.
+        """
+        limit = self._find(provider, model)
+        if limit is None:
+            return 0
+
+        lane_name = lane_name or current_lane()
+        timeout = self.max_wait if timeout is None else timeout
+        stats = limit.stats[lane_name]
+        entry = (LANES.index(lane_name), next(self._sequence))
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with limit.condition:
+            heapq.heappush(limit.waiters, entry)
+            stats["queued"] += 1
+            stats["max_queued"] = max(stats["max_queued"], stats["queued"])
+            try:
+                while True:
+                    now = time.monotonic()
+                    # Only the head of the queue may take capacity; everyone else waits their turn
+                    delay = limit.delay(tokens, now) if limit.waiters[0] == entry else None
+                    if delay == 0.0:
+                        limit.take(tokens)
+                        break
+                    if now >= deadline:
+                        stats["timeouts"] += 1
+                        raise RateLimitTimeout(f"Rate limit wait for {provider} exceeded {timeout:g}s")
+                    remaining = deadline - now
+                    limit.condition.wait(remaining if delay is None else min(delay, remaining))
+            finally:
+                limit.waiters.remove(entry)
+                heapq.heapify(limit.waiters)
+                stats["queued"] -= 1
+                limit.condition.notify_all()
+
+            waited = time.monotonic() - started
+            stats["acquired"] += 1
+            stats["total_wait"] += waited
+            stats["max_wait"] = max(stats["max_wait"], waited)
+            stats["waits"].append(waited)
+            if waited > 0.001:
+                stats["waited"] += 1
+
+        return tokens
+
+    def refund(self, provider, model=None, tokens=0):
+        """Return reserved tokens that the call did not use"""
+        limit = self._find(provider, model)
+        if limit is None or limit.tokens is None or tokens <= 0:
+            return
+        with limit.condition:
+            limit.tokens.give(tokens)
+            limit.condition.notify_all()
+
+    def get_stats(self):
+        stats = {}
+        for key, limit in self._limits.items():
+            with limit.condition:
+                now = time.monotonic()
+                entry = {}
+                if limit.requests:
+                    limit.requests._refill(now)
+                    entry["rpm"] = int(limit.requests.capacity)
+                    entry["requests_available"] = round(limit.requests.level, 1)
+                if limit.tokens:
+                    limit.tokens._refill(now)
+                    entry["tpm"] = int(limit.tokens.capacity)
+                    entry["tokens_available"] = int(limit.tokens.level)
+
+                lanes = {}
+                for name, lane_stats in limit.stats.items():
+                    waits = sorted(lane_stats["waits"])
+                    lanes[name] = {
+                        "acquired": lane_stats["acquired"],
+                        "waited": lane_stats["waited"],
+                        "timeouts": lane_stats["timeouts"],
+                        "queue_depth": lane_stats["queued"],
+                        "max_queue_depth": lane_stats["max_queued"],
+                        "avg_wait_ms": round(lane_stats["total_wait"] / lane_stats["acquired"] * 1000, 1) if lane_stats["acquired"] else 0.0,
+                        "p95_wait_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1) if waits else 0.0,
+                        "max_wait_ms": round(lane_stats["max_wait"] * 1000, 1)
+                    }
+                entry["lanes"] = lanes
+            stats[key] = entry
+        return stats
@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+class ResponseCache:
+    """Two-tier (memory LRU + optional disk) cache for LLM responses"""
+
+    def __init__(self, max_entries=1000, ttl=86400, disk_path=None, max_disk_bytes=100 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.max_disk_bytes = max_disk_bytes
+
+        # Memory tier: key -> (expires_at, value), ordered by recency
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Hit/miss counters
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expired": 0
+        }
+
+        # Approximate size of the disk tier, rescanned only when over quota
+        self._disk_bytes = 0
+
+        if self.disk_path:
+            try:
+                os.makedirs(self.disk_path, exist_ok=True)
+                self._disk_bytes = sum(
+                    os.path.getsize(os.path.join(self.disk_path, name))
+                    for name in os.listdir(self.disk_path) if name.endswith(".json")
+                )
+            except Exception as e:
+                print(f"Error creating response cache directory: {e}")
+                self.disk_path = None
+
+    @staticmethod
+    def normalize_prompt(prompt):
+        """Collapse whitespace and case so trivially different prompts share a key"""
+        return " ".join(str(prompt).split()).lower()
+
+    @classmethod
+    def make_key(cls, prompt, settings=None, provider="", **extra):
+        """Build a cache key from the prompt, teaching settings and provider"""
+        settings = settings or {}
+        key_data = {
+            "prompt": cls.normalize_prompt(prompt),
+            "teaching_style": settings.get("teaching_style"),
+            "personality": settings.get("personality"),
+            "difficulty": settings.get("difficulty"),
+            "provider": provider
+        }
+        key_data.update(extra)
+        raw = json.dumps(key_data, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+                self.stats["expired"] += 1
+
+        value = self._disk_get(key, now)
+        if value is not None:
+            # Promote disk hits into the memory tier
+            with self._lock:
+                self.stats["disk_hits"] += 1
+                self._memory_put(key, value, now + self.ttl)
+            return value
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def set(self, key, value, ttl=None):
+        """Store a value in both tiers"""
+        if value is None:
+            return
+
+        expires_at = time.time() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._memory_put(key, value, expires_at)
+            self.stats["stores"] += 1
+
+        self._disk_set(key, value, expires_at)
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._memory.clear()
+
+        if self.disk_path:
+            with self._lock:
+                self._disk_bytes = 0
+            for name in os.listdir(self.disk_path):
+                if name.endswith(".json"):
+                    try:
+                        os.unlink(os.path.join(self.disk_path, name))
+                    except OSError:
+                        pass
+
+    def get_stats(self):
+        """Return hit/miss counters and current sizes"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["disk_enabled"] = bool(self.disk_path)
+        return stats
+
+    def _memory_put(self, key, value, expires_at):
+        """Insert into the memory tier, evicting least recently used entries (lock held)"""
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _disk_file(self, key):
+        return os.path.join(self.disk_path, f"{key}.json")
+
+    def _disk_get(self, key, now):
+        """Read an entry from the disk tier"""
+        if not self.disk_path:
+            return None
+
+        path = self._disk_file(key)
+        try:
+            with open(path, "r", encoding="utf-8") as cache_file:
+                entry = json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("expires_at", 0) <= now:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            with self._lock:
+                self.stats["expired"] += 1
+            return None
+
+        # Touch the file so size-based eviction keeps recently used entries
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        return entry.get("value")
+
+    def _disk_set(self, key, value, expires_at):
+        """Write an entry to the disk tier and enforce the size quota"""
+        if not self.disk_path:
+            return
+
+        path = self._disk_file(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as cache_file:
+                json.dump({"expires_at": expires_at, "value": value}, cache_file)
+            size = os.path.getsize(temp_path)
+            with self._lock:
+                # Overwriting an entry replaces its bytes rather than adding to them
+                try:
+                    previous = os.path.getsize(path)
+                except OSError:
+                    previous = 0
+                os.replace(temp_path, path)
+                self._disk_bytes += size - previous
+                over_quota = self._disk_bytes > self.max_disk_bytes
+        except (OSError, TypeError) as e:
+            print(f"Error writing response cache entry: {e}")
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            return
+
+        if over_quota:
+            self._enforce_disk_quota()
+
+    def _enforce_disk_quota(self):
+        """Remove the least recently used disk entries until under quota"""
+        try:
+            entries = []
+            total_size = 0
+            for name in os.listdir(self.disk_path):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(self.disk_path, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+        except OSError:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_disk_bytes:
+                break
+            try:
+                os.unlink(path)
+                total_size -= size
+                with self._lock:
+                    self.stats["evictions"] += 1
+            except OSError:
+                pass
+
+        with self._lock:
+            self._disk_bytes = total_size
@@ -0,0 +1,60 @@
+import threading
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+
+class SingleFlight:
+    """Coalesce identical in-flight calls so only one reaches the provider
+
+    The first caller for a key (the leader) runs the call; callers that arrive
+    while it is in flight wait on the same future and share its result or
+    error. The key is released as soon as the call finishes, so later
+    requests start a fresh call (or hit the response cache).
+    """
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"leaders": 0, "followers": 0, "follower_timeouts": 0}
+
+    def do(self, key, fn, timeout=None):
+        """Run fn once per key at a time and return its result to every caller"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.stats["leaders"] += 1
+            else:
+                self.stats["followers"] += 1
+
+        if not leader:
+            try:
+                return future.result(timeout=timeout if timeout is not None else self.timeout)
+            except FuturesTimeoutError:
+                with self._lock:
+                    self.stats["follower_timeouts"] += 1
+                raise
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                if self._calls.get(key) is future:
+                    del self._calls[key]
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._calls)
+        return stats
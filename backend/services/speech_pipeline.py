@@ -0,0 +1,237 @@
+import re
+import time
+import queue
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+# A sentence ends at . ! or ? followed by whitespace (so "3.14" is not split), or at a line break
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|\n+")
+_CLAUSE_END = re.compile(r"[,;:–—]\s+")
+# Periods that do not end a sentence: abbreviations, initials and list numbers
+_NOT_AN_END = re.compile(r"(?:\b(?:e\.g|i\.e|etc|vs|approx|Dr|Mr|Mrs|Ms|Prof|St|Fig)|\b[A-Z]|(?:^|\n)\s*\d+)\.$")
+
+_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_LINE_MARKUP = re.compile(r"^\s*(?:#+|[-*•>])\s+", re.MULTILINE)
+_INLINE_MARKUP = re.compile(r"\*\*|__|`+|(?<!\w)[*_](?=\w)|(?<=\w)[*_](?!\w)")
+
+def clean_for_speech(text):
+    """Strip Markdown a voice would read out literally and collapse whitespace"""
+    text = _LINK.sub(r"\1", text or "")
+    text = _LINE_MARKUP.sub("", text)
+    text = _INLINE_MARKUP.sub("", text)
+    text = " ".join(text.split())
+    return text if any(char.isalnum() for char in text) else ""
+
+class SentenceChunker:
+    """Split streamed text into speakable segments as soon as they are complete
+
+    The first segment is cut at the first sentence end, or at a clause or
+    word once it passes first_chars, so the first audio is short and starts
+    quickly. Later sentences are merged until a segment has min_chars, to
+    keep the number of TTS calls down, and never exceed max_chars.
+    """
+
+    def __init__(self, first_chars=80, min_chars=40, max_chars=300):
+        self.first_chars = first_chars
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+        self.emitted = 0
+
+    def feed(self, text):
+        """Add streamed text and return the segments it completed"""
+        self.buffer += text or ""
+        segments = []
+        while True:
+            segment = self._next_segment()
+            if segment is None:
+                return segments
+            segment = clean_for_speech(segment)
+            if segment:
+                segments.append(segment)
+                self.emitted += 1
+
+    def flush(self):
+        """Return the remaining segments once the text has ended"""
+        segments = self.feed("")
+        segment = clean_for_speech(self.buffer)
+        self.buffer = ""
+        if segment:
+            segments.append(segment)
+            self.emitted += 1
+        return segments
+
+    def _boundaries(self):
+        return [
+            match.end() for match in _SENTENCE_END.finditer(self.buffer)
+            if match.group().startswith("\n") or not _NOT_AN_END.search(self.buffer[:match.start() + 1])
+        ]
+
+    def _cut(self, end):
+        segment = self.buffer[:end]
+        self.buffer = self.buffer[end:]
+        return segment
+
+    def _next_segment(self):
+        first = self.emitted == 0
+        limit = self.first_chars if first else self.max_chars
+        wanted = 1 if first else self.min_chars
+
+        # Take whole sentences within the limit, stopping once the segment is long enough
+        boundaries = self._boundaries()
+        end = None
+        for boundary in boundaries:
+            if boundary > limit:
+                break
+            end = boundary
+            if boundary >= wanted:
+                break
+
+        if end is not None:
+            # A short segment waits for the next sentence unless that one would not fit
+            if end >= wanted or boundaries[-1] > end or len(self.buffer) > limit:
+                return self._cut(end)
+            return None
+
+        if len(self.buffer) > limit:
+            return self._cut(self._soft_break(limit))
+        return None
+
+    def _soft_break(self, limit):
+        """Cut an overlong sentence at its last clause, or word, within the limit"""
+        window = self.buffer[:limit]
+        clauses = [match.end() for match in _CLAUSE_END.finditer(window)]
+        if clauses and clauses[-1] >= limit // 3:
+            return clauses[-1]
+        space = window.rfind(" ")
+        return space + 1 if space > 0 else limit
+
+class SpeechPipeline:
+    """Synthesize speech segment by segment while the text is still arriving
+
+    The text (a string or an iterator of streamed chunks, e.g. from
+    stream_gemini) is read on a producer thread and split by a
+    SentenceChunker; each segment is synthesized on a small pool as soon as
+    it is complete. run() yields the text chunks as they arrive and the
+    audio segments strictly in order, so playback can start after the
+    first sentence instead of after the whole answer.
+    """
+
+    def __init__(self, concurrency=3, first_chars=80, min_chars=40, max_chars=300):
+        self.concurrency = concurrency
+        self.first_chars = first_chars
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+
+        self._lock = threading.Lock()
+        self.stats = {"runs": 0, "segments": 0, "failed_segments": 0, "first_audio_total": 0.0, "first_audio_runs": 0}
+
+    def run(self, text, synthesize_fn, field="audio"):
+        """Yield chunk, text_end, audio and finally audio_done events
+
+        synthesize_fn(segment) returns the segment's audio (stored in the
+        event under field) or None, and is called from worker threads.
+        """
+        text_chunks = [text] if isinstance(text, str) else text
+        chunker = SentenceChunker(self.first_chars, self.min_chars, self.max_chars)
+        events = queue.Queue()
+        ready = {}
+        state = {"next": 0, "submitted": 0, "text_done": False}
+        state_lock = threading.Lock()
+        cancelled = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=max(1, self.concurrency), thread_name_prefix="mentaura-tts")
+        started = time.monotonic()
+
+        def release():
+            """Queue finished segments in order and end once every segment is out (state_lock held)"""
+            while state["next"] in ready:
+                events.put(ready.pop(state["next"]))
+                state["next"] += 1
+            if state["text_done"] and state["next"] == state["submitted"]:
+                events.put(None)
+
+        def synthesize(index, segment):
+            event = {"type": "audio", "index": index, "text": segment, field: None}
+            try:
+                if not cancelled.is_set():
+                    event[field] = synthesize_fn(segment)
+            except Exception as e:
+                print(f"Error synthesizing speech segment: {e}")
+            if not event[field]:
+                event["error"] = "Failed to generate speech"
+            with state_lock:
+                ready[index] = event
+                release()
+
+        def submit(segments):
+            for segment in segments:
+                with state_lock:
+                    index = state["submitted"]
+                    state["submitted"] += 1
+                executor.submit(synthesize, index, segment)
+
+        def produce():
+            try:
+                for chunk in text_chunks:
+                    if cancelled.is_set():
+                        break
+                    events.put({"type": "chunk", "text": chunk})
+                    submit(chunker.feed(chunk))
+                submit(chunker.flush())
+                events.put({"type": "text_end"})
+            except Exception as e:
+                events.put({"type": "error", "exception": e})
+            finally:
+                with state_lock:
+                    state["text_done"] = True
+                    release()
+
+        # The text stream keeps the caller's rate limit lane
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(produce,), name="mentaura-tts-text", daemon=True).start()
+
+        segments = 0
+        failed = 0
+        first_audio = None
+        try:
+            while True:
+                event = events.get()
+                if event is None:
+                    break
+                if event["type"] == "error":
+                    raise event["exception"]
+                if event["type"] == "audio":
+                    segments += 1
+                    if event[field]:
+                        if first_audio is None:
+                            first_audio = time.monotonic() - started
+                    else:
+                        failed += 1
+                yield event
+
+            yield {
+                "type": "audio_done",
+                "segments": segments,
+                "failed": failed,
+                "firstAudioMs": round(first_audio * 1000) if first_audio is not None else None
+            }
+        finally:
+            # Also reached when the client goes away mid-stream
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            with self._lock:
+                self.stats["runs"] += 1
+                self.stats["segments"] += segments
+                self.stats["failed_segments"] += failed
+                if first_audio is not None:
+                    self.stats["first_audio_total"] += first_audio
+                    self.stats["first_audio_runs"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        first_audio_runs = stats.pop("first_audio_runs")
+        # Time from the start of a run (text requested) to its first playable segment
+        stats["avg_first_audio_ms"] = round(stats.pop("first_audio_total") / first_audio_runs * 1000, 1) if first_audio_runs else 0.0
+        return stats
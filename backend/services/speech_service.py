@@ -1,6 +1,8 @@
+import io
 import os
+import time
 import base64
-import tempfile
+import unicodedata
 from google.cloud import speech, texttospeech
 import subprocess
 import asyncio
@@ -8,12 +10,36 @@ import edge_tts
 from pydub import AudioSegment
 import sounddevice as sd
 import numpy as np
-import requests
 from dotenv import load_dotenv
+from services.http_client import get_http_client
+from services.provider_simulator import get_simulator, SimulatedSTTClient, SimulatedTTSClient
+from services.streaming_stt import StreamingRecognition
+from services.speech_pipeline import SpeechPipeline
+from services.blob_store import BlobStore
+from config import SpeechConfig
 
 # Load environment variables
 load_dotenv()
 
+ELEVENLABS_VOICE_ID = "EXAVITQu4vr4xnSDxMaL"
+ELEVENLABS_MODEL_ID = "eleven_monolingual_v1"
+
+def audio_content_type(audio_content):
+    """Detect the container of synthesized audio from its first bytes"""
+    if audio_content[:4] == b"RIFF":
+        return "audio/wav"
+    if audio_content[:4] == b"OggS":
+        return "audio/ogg"
+    return "audio/mpeg"
+
+def decode_audio(audio_data):
+    """Return audio sent as base64 text or as raw bytes as bytes"""
+    if isinstance(audio_data, str):
+        return base64.b64decode(audio_data)
+    if isinstance(audio_data, bytes):
+        return audio_data
+    return bytes(audio_data)
+
 class SpeechService:
     def __init__(self):
         # Speech clients
@@ -21,11 +47,42 @@ class SpeechService:
         self.tts_client = None
         self.edge_voices = None
         self.elevenlabs_api_key = os.environ.get("ELEVENLABS_API_KEY")
+        self.http = get_http_client()
+        
+        # Offline stand-ins for the providers when PROVIDER_MODE is record or simulate
+        self.simulator = get_simulator()
+        if self.simulator is not None and not self.simulator.recording:
+            self.elevenlabs_api_key = self.elevenlabs_api_key or "simulated"
+        
+        self.streaming_stats = {"started": 0, "completed": 0, "failed": 0, "final_latency_total": 0.0}
+        # Synthesized audio, stored once per text and voice and served from disk
+        self.audio_cache = None
+        if SpeechConfig.AUDIO_CACHE_ENABLED:
+            try:
+                self.audio_cache = BlobStore(
+                    SpeechConfig.AUDIO_CACHE_PATH,
+                    max_bytes=SpeechConfig.AUDIO_CACHE_MAX_DISK_MB * 1024 * 1024
+                )
+            except OSError as e:
+                print(f"Error opening speech audio cache: {e}")
+        
+        self.pipeline = SpeechPipeline(
+            concurrency=SpeechConfig.PIPELINE_CONCURRENCY,
+            first_chars=SpeechConfig.PIPELINE_FIRST_CHARS,
+            min_chars=SpeechConfig.PIPELINE_MIN_CHARS,
+            max_chars=SpeechConfig.PIPELINE_MAX_CHARS
+        )
         
     def init_google_speech(self):
         """Initialize Google Cloud Speech-to-Text client"""
         try:
+            if self.simulator is not None and not self.simulator.recording:
+                self.stt_client = SimulatedSTTClient(self.simulator)
+                return self.stt_client
+            
             self.stt_client = speech.SpeechClient()
+            if self.simulator is not None:
+                self.stt_client = SimulatedSTTClient(self.simulator, self.stt_client)
             return self.stt_client
         except Exception as e:
             print(f"Error initializing Google Speech-to-Text: {e}")
@@ -34,7 +91,13 @@ class SpeechService:
     def init_google_tts(self):
         """Initialize Google Cloud Text-to-Speech client"""
         try:
+            if self.simulator is not None and not self.simulator.recording:
+                self.tts_client = SimulatedTTSClient(self.simulator)
+                return self.tts_client
+            
             self.tts_client = texttospeech.TextToSpeechClient()
+            if self.simulator is not None:
+                self.tts_client = SimulatedTTSClient(self.simulator, self.tts_client)
             return self.tts_client
         except Exception as e:
             print(f"Error initializing Google Text-to-Speech: {e}")
@@ -55,23 +118,8 @@ class SpeechService:
             if not self.stt_client:
                 return "Speech-to-Text service not initialized"
             
-            # Create a temporary file to store the audio data
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-                temp_filename = temp_file.name
-                
-                # If audio_data is base64 encoded, decode it
-                if isinstance(audio_data, str):
-                    audio_bytes = base64.b64decode(audio_data)
-                    temp_file.write(audio_bytes)
-                else:
-                    temp_file.write(audio_data)
-            
-            # Read the temporary file
-            with open(temp_filename, "rb") as audio_file:
-                content = audio_file.read()
-            
-            # Delete the temporary file
-            os.unlink(temp_filename)
+            # Decode in memory; the request takes the bytes directly
+            content = decode_audio(audio_data)
             
             # Configure the speech recognition request
             audio = speech.RecognitionAudio(content=content)
@@ -94,25 +142,62 @@ class SpeechService:
             print(f"Error in speech-to-text conversion: {e}")
             return f"Failed to convert speech to text: {str(e)}"
     
-    async def text_to_speech_google(self, text, voice_settings=None):
-        """Convert text to speech using Google Text-to-Speech"""
+    def start_streaming_recognition(self, on_transcript, on_end, sample_rate=None, language_code="en-US",
+                                    single_utterance=None):
+        """Create a streaming recognition session; call its run() in a background task"""
+        if not self.stt_client:
+            return None
+        
+        def finished(transcript, error):
+            key = "failed" if error and not transcript else "completed"
+            self.streaming_stats[key] += 1
+            if key == "completed" and session.final_latency is not None:
+                self.streaming_stats["final_latency_total"] += session.final_latency
+            on_end(transcript, error)
+        
+        session = StreamingRecognition(
+            self.stt_client,
+            on_transcript,
+            finished,
+            sample_rate=sample_rate or SpeechConfig.STREAM_SAMPLE_RATE,
+            language_code=language_code,
+            single_utterance=SpeechConfig.STREAM_SINGLE_UTTERANCE if single_utterance is None else single_utterance,
+            max_seconds=SpeechConfig.STREAM_MAX_SECONDS,
+            idle_timeout=SpeechConfig.STREAM_IDLE_TIMEOUT
+        )
+        self.streaming_stats["started"] += 1
+        return session
+    
+    def get_streaming_stats(self):
+        stats = dict(self.streaming_stats)
+        latency_total = stats.pop("final_latency_total")
+        # Time from the end of the audio to the final transcript
+        stats["avg_final_latency_ms"] = round(latency_total / stats["completed"] * 1000, 1) if stats["completed"] else 0.0
+        return stats
+    
+    def google_voice_settings(self, voice_settings=None):
+        """Google TTS settings: defaults overridden by the provided settings"""
+        # Default voice settings
+        settings = {
+            "language_code": "en-US",
+            "name": "en-US-Neural2-F",  # Female voice
+            "gender": "FEMALE",
+            "speaking_rate": 1.0,  # Normal speed
+            "pitch": 0.0  # Default pitch
+        }
+        
+        # Override defaults with provided settings
+        if voice_settings:
+            settings.update(voice_settings)
+        return settings
+    
+    async def google_audio(self, text, voice_settings=None):
+        """Synthesize MP3 bytes with Google Text-to-Speech, or None"""
         try:
             if not self.tts_client:
                 return None
             
-            # Default voice settings
-            default_settings = {
-                "language_code": "en-US",
-                "name": "en-US-Neural2-F",  # Female voice
-                "gender": "FEMALE",
-                "speaking_rate": 1.0,  # Normal speed
-                "pitch": 0.0  # Default pitch
-            }
-            
-            # Override defaults with provided settings
-            settings = default_settings.copy()
-            if voice_settings:
-                settings.update(voice_settings)
+            settings = self.google_voice_settings(voice_settings)
             
             # Set up the synthesis input
             synthesis_input = texttospeech.SynthesisInput(text=text)
@@ -138,42 +223,69 @@ class SpeechService:
                 audio_config=audio_config
             )
             
-            # Encode the audio content as base64
-            audio_base64 = base64.b64encode(response.audio_content).decode("utf-8")
-            
-            return audio_base64
+            return response.audio_content
         except Exception as e:
             print(f"Error in Google text-to-speech conversion: {e}")
             return None
     
-    async def text_to_speech_edge(self, text, voice="en-US-AriaNeural", rate="+0%", volume="+0%"):
-        """Convert text to speech using Edge TTS (free alternative)"""
+    async def text_to_speech_google(self, text, voice_settings=None):
+        """Convert text to speech using Google Text-to-Speech"""
+        audio_content = await self.google_audio(text, voice_settings)
+        return base64.b64encode(audio_content).decode("utf-8") if audio_content else None
+    
+    async def edge_speech(self, text, voice="en-US-AriaNeural", rate="+0%", volume="+0%"):
+        """Synthesize MP3 bytes with Edge TTS (free alternative), or None"""
         try:
-            # Create a temporary file to store the audio
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-                temp_filename = temp_file.name
-            
-            # Use Edge TTS to generate speech
-            communicate = edge_tts.Communicate(text, voice, rate=rate, volume=volume)
-            await communicate.save(temp_filename)
+            if self.simulator is not None:
+                request = {"text": text, "voice": voice, "rate": rate, "volume": volume}
+                if not self.simulator.recording:
+                    # The simulator sleeps, so keep it off the event loop
+                    return await asyncio.to_thread(
+                        self.simulator.call, "edge", "speech", request, None,
+                        lambda: self.simulator.synthesize_audio(text), True
+                    )
+                started = time.monotonic()
             
-            # Read the audio file and encode it as base64
-            with open(temp_filename, "rb") as audio_file:
-                audio_content = audio_file.read()
+            audio_content = await self.edge_audio(text, voice, rate, volume)
             
-            # Delete the temporary file
-            os.unlink(temp_filename)
+            if self.simulator is not None:
+                self.simulator.record("edge", "speech", request, audio_content, time.monotonic() - started, binary=True)
             
-            # Encode the audio content as base64
-            audio_base64 = base64.b64encode(audio_content).decode("utf-8")
-            
-            return audio_base64
+            return audio_content
         except Exception as e:
             print(f"Error in Edge TTS text-to-speech conversion: {e}")
             return None
     
-    def text_to_speech_elevenlabs(self, text, voice_id="EXAVITQu4vr4xnSDxMaL", model_id="eleven_monolingual_v1"):
-        """Convert text to speech using ElevenLabs (limited free tier)"""
+    async def text_to_speech_edge(self, text, voice="en-US-AriaNeural", rate="+0%", volume="+0%"):
+        """Convert text to speech using Edge TTS (free alternative)"""
+        audio_content = await self.edge_speech(text, voice, rate, volume)
+        return base64.b64encode(audio_content).decode("utf-8") if audio_content else None
+    
+    async def edge_audio(self, text, voice="en-US-AriaNeural", rate="+0%", volume="+0%"):
+        """Stream Edge TTS audio straight into a memory buffer and return the MP3 bytes"""
+        buffer = io.BytesIO()
+        communicate = edge_tts.Communicate(text, voice, rate=rate, volume=volume)
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                buffer.write(chunk["data"])
+        return buffer.getvalue()
+    
+    @staticmethod
+    def edge_voice_settings(voice_settings=None):
+        """Edge TTS (voice, rate) for the provided settings"""
+        voice = "en-US-AriaNeural"  # Female voice by default
+        if voice_settings and voice_settings.get("gender") == "MALE":
+            voice = "en-US-GuyNeural"
+        
+        rate = "+0%"
+        if voice_settings and voice_settings.get("speaking_rate"):
+            # Convert speaking_rate to Edge TTS format, which needs the sign
+            rate_value = voice_settings.get("speaking_rate")
+            rate = f"{round((rate_value - 1) * 100):+d}%"
+        return voice, rate
+    
+    def elevenlabs_audio(self, text, voice_id=ELEVENLABS_VOICE_ID, model_id=ELEVENLABS_MODEL_ID):
+        """Synthesize MP3 bytes with ElevenLabs (limited free tier), or None"""
         try:
             if not self.elevenlabs_api_key:
                 return None
@@ -195,12 +307,20 @@ class SpeechService:
                 }
             }
             
-            response = requests.post(url, json=data, headers=headers)
+            if self.simulator is not None:
+                return self.simulator.call(
+                    "elevenlabs",
+                    "speech",
+                    {"text": text, "voice_id": voice_id, "model_id": model_id},
+                    lambda: self._post_elevenlabs(url, data, headers),
+                    lambda: self.simulator.synthesize_audio(text),
+                    binary=True
+                ) or None
+            
+            response = self.http.post(url, json=data, headers=headers)
             
             if response.status_code == 200:
-                # Encode the audio content as base64
-                audio_base64 = base64.b64encode(response.content).decode("utf-8")
-                return audio_base64
+                return response.content
             else:
                 print(f"ElevenLabs API error: {response.text}")
                 return None
@@ -208,63 +328,133 @@ class SpeechService:
             print(f"Error in ElevenLabs text-to-speech conversion: {e}")
             return None
     
-    async def text_to_speech(self, text, voice_settings=None):
-        """Convert text to speech using the best available service"""
-        # Try ElevenLabs first (best quality but limited free tier)
+    def text_to_speech_elevenlabs(self, text, voice_id=ELEVENLABS_VOICE_ID, model_id=ELEVENLABS_MODEL_ID):
+        """Convert text to speech using ElevenLabs (limited free tier)"""
+        audio_content = self.elevenlabs_audio(text, voice_id, model_id)
+        return base64.b64encode(audio_content).decode("utf-8") if audio_content else None
+    
+    def _post_elevenlabs(self, url, data, headers):
+        """Live ElevenLabs request for record mode, raising on failure so nothing is recorded"""
+        response = self.http.post(url, json=data, headers=headers)
+        response.raise_for_status()
+        return response.content
+    
+    def speech_voices(self, voice_settings=None):
+        """The providers text_to_speech tries, in order, with the voice parameters that shape their audio"""
+        voices = []
+        
+        # ElevenLabs first (best quality but limited free tier)
         if self.elevenlabs_api_key:
-            result = self.text_to_speech_elevenlabs(text)
-            if result:
-                return result
+            voices.append({
+                "provider": "elevenlabs",
+                "voice": f"{ELEVENLABS_VOICE_ID}/{ELEVENLABS_MODEL_ID}",
+                "rate": None,
+                "pitch": None
+            })
         
-        # Try Google TTS next
+        # Google TTS next
         if self.tts_client:
-            result = await self.text_to_speech_google(text, voice_settings)
-            if result:
-                return result
+            settings = self.google_voice_settings(voice_settings)
+            voices.append({
+                "provider": "google",
+                "voice": f"{settings['language_code']}/{settings['name']}/{settings['gender']}",
+                "rate": settings["speaking_rate"],
+                "pitch": settings["pitch"]
+            })
         
-        # Fall back to Edge TTS (always free)
-        voice = "en-US-AriaNeural"  # Female voice by default
-        if voice_settings and voice_settings.get("gender") == "MALE":
-            voice = "en-US-GuyNeural"
+        # Edge TTS last (always free)
+        voice, rate = self.edge_voice_settings(voice_settings)
+        voices.append({"provider": "edge", "voice": voice, "rate": rate, "pitch": None})
+        return voices
+    
+    @staticmethod
+    def audio_key(text, voice):
+        """Content address of synthesized audio: normalized text, provider, voice, rate and pitch"""
+        return BlobStore.make_key(
+            text=" ".join(unicodedata.normalize("NFC", str(text)).split()),
+            provider=voice["provider"],
+            voice=voice["voice"],
+            rate=voice["rate"],
+            pitch=voice["pitch"]
+        )
+    
+    def audio_url(self, key):
+        return f"{SpeechConfig.AUDIO_PUBLIC_URL_PREFIX.rstrip('/')}/{key}"
+    
+    async def speech_audio(self, text, voice_settings=None):
+        """Return (audio bytes, content type, key) from the audio cache or the first provider that succeeds, or None"""
+        voices = [(voice, self.audio_key(text, voice)) for voice in self.speech_voices(voice_settings)]
         
-        rate = "+0%"
-        if voice_settings and voice_settings.get("speaking_rate"):
-            # Convert speaking_rate to Edge TTS format
-            rate_value = voice_settings.get("speaking_rate")
-            rate = f"{int((rate_value - 1) * 100)}%"
+        # Repeat phrases are served from disk without a provider call, whichever voice cached them
+        if self.audio_cache is not None:
+            for voice, key in voices:
+                cached = self.audio_cache.read(key)
+                if cached is not None:
+                    return cached[0], cached[1], key
+        
+        for voice, key in voices:
+            if voice["provider"] == "elevenlabs":
+                audio_content = self.elevenlabs_audio(text)
+            elif voice["provider"] == "google":
+                audio_content = await self.google_audio(text, voice_settings)
+            else:
+                audio_content = await self.edge_speech(text, voice["voice"], voice["rate"])
+            
+            if audio_content:
+                content_type = audio_content_type(audio_content)
+                if self.audio_cache is not None:
+                    try:
+                        self.audio_cache.put(key, audio_content, content_type)
+                    except OSError as e:
+                        print(f"Error caching speech audio: {e}")
+                return audio_content, content_type, key
+        return None
+    
+    async def speech_audio_url(self, text, voice_settings=None):
+        """Synthesize or look up audio and return the URL it is served from, or None"""
+        found = await self.speech_audio(text, voice_settings)
+        return self.audio_url(found[2]) if found else None
+    
+    async def text_to_speech(self, text, voice_settings=None):
+        """Convert text to speech using the best available service"""
+        found = await self.speech_audio(text, voice_settings)
+        return base64.b64encode(found[0]).decode("utf-8") if found else None
+    
+    def speak_stream(self, text, voice_settings=None, audio_format="base64"):
+        """Yield text and audio segment events, synthesizing each sentence as soon as it is complete
         
-        return await self.text_to_speech_edge(text, voice, rate)
+        text is a string or an iterator of streamed chunks; audio segments
+        come out in order, as base64 in "audio" or, with audio_format "url"
+        and the audio cache enabled, as a link in "audioUrl".
+        """
+        if audio_format == "url" and self.audio_cache is not None:
+            return self.pipeline.run(
+                text,
+                lambda segment: asyncio.run(self.speech_audio_url(segment, voice_settings)),
+                field="audioUrl"
+            )
+        return self.pipeline.run(text, lambda segment: asyncio.run(self.text_to_speech(segment, voice_settings)))
     
     def process_audio(self, audio_data, target_format="mp3"):
         """Process audio data (e.g., change format, speed, pitch)"""
         try:
-            # Create temporary files for input and output
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as input_file:
-                input_filename = input_file.name
-                
-                # If audio_data is base64 encoded, decode it
-                if isinstance(audio_data, str):
-                    audio_bytes = base64.b64decode(audio_data)
-                    input_file.write(audio_bytes)
-                else:
-                    input_file.write(audio_data)
-            
-            # Create output filename
-            output_filename = input_filename.replace(".wav", f".{target_format}")
-            
-            # Use pydub to process the audio
-            audio = AudioSegment.from_file(input_filename)
-            
-            # Save in target format
-            audio.export(output_filename, format=target_format)
+            audio_bytes = decode_audio(audio_data)
             
-            # Read the processed audio
-            with open(output_filename, "rb") as output_file:
-                processed_audio = output_file.read()
-            
-            # Delete temporary files
-            os.unlink(input_filename)
-            os.unlink(output_filename)
+            # Convert through ffmpeg's stdin and stdout (pydub's export goes through temp files)
+            try:
+                result = subprocess.run(
+                    [AudioSegment.converter, "-hide_banner", "-loglevel", "error",
+                     "-i", "pipe:0", "-f", target_format, "pipe:1"],
+                    input=audio_bytes,
+                    capture_output=True,
+                    check=True
+                )
+                processed_audio = result.stdout
+            except (OSError, subprocess.CalledProcessError):
+                # Formats that need a seekable output fall back to pydub with memory buffers
+                output = io.BytesIO()
+                AudioSegment.from_file(io.BytesIO(audio_bytes)).export(output, format=target_format)
+                processed_audio = output.getbuffer()
             
             # Encode as base64
             return base64.b64encode(processed_audio).decode("utf-8")
@@ -272,8 +462,16 @@ class SpeechService:
             print(f"Error processing audio: {e}")
             return None
 
+# Create a singleton instance, so every route shares one audio cache index
+_speech_service = None
+
 def setup_speech_services():
     """Initialize and setup all speech services"""
+    global _speech_service
+    
+    if _speech_service is not None:
+        return _speech_service
+    
     speech_service = SpeechService()
     
     # Setup Google Cloud services if possible
@@ -293,4 +491,5 @@ def setup_speech_services():
     except Exception as e:
         print(f"Edge TTS voices listing failed: {e}")
     
-    return speech_service 
\ No newline at end of file
+    _speech_service = speech_service
+    return _speech_service
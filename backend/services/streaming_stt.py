@@ -0,0 +1,126 @@
+import time
+import queue
+import threading
+from google.cloud import speech
+
+class StreamingRecognition:
+    """One streaming speech recognition call fed with audio chunks as they arrive
+
+    Chunks written by the socket handlers are queued and consumed by the
+    request generator of a streaming_recognize call, so recognition runs
+    while the student is still talking. Interim and final transcripts are
+    passed to on_transcript as they come back; when the audio ends (stop(),
+    the recognizer detecting the end of the utterance, the idle timeout or
+    the length cap) on_end receives the whole final transcript.
+    """
+
+    def __init__(self, client, on_transcript, on_end, sample_rate=16000, language_code="en-US",
+                 single_utterance=True, max_seconds=290, idle_timeout=10.0):
+        self.client = client
+        self.on_transcript = on_transcript
+        self.on_end = on_end
+        self.sample_rate = sample_rate
+        self.language_code = language_code
+        self.single_utterance = single_utterance
+        self.idle_timeout = idle_timeout
+        # LINEAR16 is two bytes per sample
+        self.max_bytes = int(max_seconds * sample_rate * 2)
+
+        self.final_parts = []
+        self.stopped_at = None
+        self.ended_at = None
+        self.error = None
+        self.stats = {"chunks": 0, "bytes": 0, "interim": 0, "finals": 0}
+
+        self._chunks = queue.Queue()
+        self._closed = threading.Event()
+        self._cancelled = False
+
+    @property
+    def transcript(self):
+        return " ".join(part for part in self.final_parts if part)
+
+    @property
+    def final_latency(self):
+        """Seconds from the end of the audio to the final transcript, or None"""
+        if self.stopped_at is None or self.ended_at is None:
+            return None
+        return max(0.0, self.ended_at - self.stopped_at)
+
+    def write(self, chunk):
+        """Queue an audio chunk, returning False once the session takes no more audio"""
+        if self._closed.is_set() or not chunk:
+            return False
+        if self.stats["bytes"] + len(chunk) > self.max_bytes:
+            self.stop()
+            return False
+        self.stats["chunks"] += 1
+        self.stats["bytes"] += len(chunk)
+        self._chunks.put(chunk)
+        return True
+
+    def stop(self):
+        """End the audio; the recognizer finishes the last words and returns"""
+        if not self._closed.is_set():
+            self._closed.set()
+            self.stopped_at = time.monotonic()
+            self._chunks.put(None)
+
+    def cancel(self):
+        """Abandon the session without calling on_end, e.g. when the client disconnects"""
+        self._cancelled = True
+        self.stop()
+
+    def _requests(self):
+        while True:
+            try:
+                chunk = self._chunks.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                # The client went quiet without stopping
+                self.stop()
+                return
+            if chunk is None or self._cancelled:
+                return
+            yield speech.StreamingRecognizeRequest(audio_content=chunk)
+
+    def run(self):
+        """Recognize until the audio ends; blocks, so run it as a background task"""
+        streaming_config = speech.StreamingRecognitionConfig(
+            config=speech.RecognitionConfig(
+                encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+                sample_rate_hertz=self.sample_rate,
+                language_code=self.language_code,
+                enable_automatic_punctuation=True
+            ),
+            interim_results=True,
+            single_utterance=self.single_utterance
+        )
+        end_of_utterance = speech.StreamingRecognizeResponse.SpeechEventType.END_OF_SINGLE_UTTERANCE
+
+        try:
+            responses = self.client.streaming_recognize(config=streaming_config, requests=self._requests())
+            for response in responses:
+                if self._cancelled:
+                    break
+                if response.speech_event_type == end_of_utterance:
+                    # Stop sending audio; the final result follows
+                    self.stop()
+                for result in response.results:
+                    if not result.alternatives:
+                        continue
+                    text = result.alternatives[0].transcript.strip()
+                    if result.is_final:
+                        self.final_parts.append(text)
+                        self.stats["finals"] += 1
+                        self.on_transcript(self.transcript, True)
+                    else:
+                        self.stats["interim"] += 1
+                        self.on_transcript(" ".join(part for part in self.final_parts + [text] if part), False)
+        except Exception as e:
+            print(f"Error in streaming speech recognition: {e}")
+            self.error = str(e)
+        finally:
+            self.stop()
+            self.ended_at = time.monotonic()
+            if not self._cancelled:
+                self.on_end(self.transcript, self.error)
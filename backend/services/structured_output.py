@@ -0,0 +1,233 @@
+import re
+import json
+import threading
+
+_FENCE_PATTERN = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)```", re.DOTALL)
+_TRAILING_COMMA_PATTERN = re.compile(r",(\s*[\]}])")
+
+class StructuredOutputError(ValueError):
+    """Raised when no valid JSON of the expected shape can be found in a response"""
+
+class ParseStats:
+    """Success counters for structured output, per call site"""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, outcome):
+        """Count an outcome: 'direct', 'extracted' or 'failed'"""
+        with self._lock:
+            counts = self._counts.setdefault(name, {"direct": 0, "extracted": 0, "failed": 0})
+            counts[outcome] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = {}
+            for name, counts in self._counts.items():
+                total = sum(counts.values())
+                stats[name] = dict(counts)
+                stats[name]["total"] = total
+                stats[name]["success_rate"] = round((total - counts["failed"]) / total, 3) if total else 0.0
+        return stats
+
+parse_stats = ParseStats()
+
+def _matches(value, expect):
+    return expect is None or isinstance(value, expect)
+
+def _is_object_array(value):
+    return isinstance(value, list) and bool(value) and isinstance(value[0], dict)
+
+def _decode_from(text, start):
+    """Decode one JSON value starting at text[start], ignoring anything after it"""
+    decoder = json.JSONDecoder()
+    try:
+        return decoder.raw_decode(text, start)[0]
+    except ValueError:
+        pass
+
+    # Models often leave a trailing comma before a closing bracket
+    repaired = _TRAILING_COMMA_PATTERN.sub(r"\1", text[start:])
+    return decoder.raw_decode(repaired)[0]
+
+def _candidates(text, expect):
+    """Yield JSON values found in text: fenced blocks first, then bare values"""
+    for block in _FENCE_PATTERN.findall(text):
+        block = block.strip()
+        if block:
+            try:
+                yield _decode_from(block, 0)
+            except ValueError:
+                pass
+
+    openers = "[" if expect is list else "{" if expect is dict else "[{"
+    for match in re.finditer(f"[{re.escape(openers)}]", text):
+        try:
+            yield _decode_from(text, match.start())
+        except ValueError:
+            continue
+
+def extract_json(text, expect=None, objects_only=False):
+    """Return the first JSON value of the expected type (list, dict or None for any) in text
+
+    Handles bare JSON, JSON in markdown fences, JSON surrounded by prose and
+    trailing commas. With objects_only, an array of objects is preferred over
+    an earlier array that does not start with one, so bracketed prose such as
+    "[1]" is skipped. Raises StructuredOutputError when nothing valid is found.
+    """
+    text = str(text or "").strip()
+    fallback = None
+    for value in _candidates(text, expect):
+        if not _matches(value, expect):
+            continue
+        if not objects_only or not isinstance(value, list) or _is_object_array(value):
+            return value
+        if fallback is None:
+            fallback = value
+    if fallback is not None:
+        return fallback
+    raise StructuredOutputError("No JSON value found in the response")
+
+def validate_item(item, required=(), defaults=None):
+    """Return a copy of a JSON object with defaults applied, or None if required keys are missing"""
+    if not isinstance(item, dict):
+        return None
+    if any(item.get(key) in (None, "") for key in required):
+        return None
+    validated = dict(defaults or {})
+    validated.update(item)
+    return validated
+
+def validate_items(items, required=(), defaults=None):
+    """Validate a list of JSON objects, dropping the invalid ones"""
+    validated = []
+    for item in items or []:
+        item = validate_item(item, required, defaults)
+        if item is not None:
+            validated.append(item)
+    return validated
+
+def parse_json(text, expect=None, name="default", objects_only=False):
+    """Extract JSON from an LLM response and record the outcome, returning None on failure"""
+    try:
+        value = json.loads(text)
+        if _matches(value, expect):
+            parse_stats.record(name, "direct")
+            return value
+    except (TypeError, ValueError):
+        pass
+
+    try:
+        value = extract_json(text, expect, objects_only)
+    except StructuredOutputError:
+        parse_stats.record(name, "failed")
+        return None
+    parse_stats.record(name, "extracted")
+    return value
+
+class IncrementalArrayParser:
+    """Parse the items of a JSON array as its text streams in
+
+    feed() returns every item completed by the new chunk, so the first item
+    can be used before the model has finished writing the array. Text before
+    the array (prose, a ```json fence) is skipped. With objects_only, an
+    array only counts once its first element is an object, so bracketed
+    prose such as "[1]" is not mistaken for it.
+    """
+
+    def __init__(self, objects_only=False):
+        self.objects_only = objects_only
+        self.buffer = ""
+        self.started = False
+        self.finished = False
+        self.items_parsed = 0
+        self.items_failed = 0
+
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item_start = None
+
+    def _find_start(self):
+        """Locate the opening bracket of an array whose first element looks like JSON"""
+        while True:
+            index = self.buffer.find("[", self._position)
+            if index == -1:
+                self._position = len(self.buffer)
+                return False
+            rest = self.buffer[index + 1:].lstrip()
+            if not rest:
+                # Wait for more text before deciding
+                self._position = index
+                return False
+            if rest[0] in ("{" if self.objects_only else '{["-0123456789]tfn'):
+                self.started = True
+                self._depth = 1
+                self._position = index + 1
+                return True
+            self._position = index + 1
+
+    def feed(self, chunk):
+        """Add streamed text and return the items it completed"""
+        self.buffer += chunk
+        items = []
+        if self.finished:
+            return items
+        if not self.started and not self._find_start():
+            return items
+
+        text = self.buffer
+        index = self._position
+        while index < len(text):
+            char = text[index]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                index += 1
+                continue
+
+            if self._depth == 1 and self._item_start is None and not char.isspace() and char not in ",]":
+                self._item_start = index
+
+            if char == '"':
+                self._in_string = True
+            elif char in "[{":
+                self._depth += 1
+            elif char in "]}":
+                self._depth -= 1
+
+            if self._depth == 1 and self._item_start is not None and (char in "]}" or char == ","):
+                # A nested value closed, or a scalar ended at a comma
+                end = index + 1 if char in "]}" else index
+                self._emit(text[self._item_start:end], items)
+                self._item_start = None
+            elif self._depth == 0:
+                # The array closed; emit a trailing scalar if there is one
+                if self._item_start is not None:
+                    self._emit(text[self._item_start:index], items)
+                    self._item_start = None
+                self.finished = True
+                index += 1
+                break
+
+            index += 1
+
+        self._position = index
+        return items
+
+    def _emit(self, raw, items):
+        raw = raw.strip()
+        if not raw:
+            return
+        try:
+            items.append(json.loads(raw))
+            self.items_parsed += 1
+        except ValueError:
+            self.items_failed += 1
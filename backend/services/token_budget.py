@@ -0,0 +1,131 @@
+import re
+import threading
+
+# Optional exact tokenizer; the estimate below is used without it
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+def estimate_tokens(text):
+    """Count tokens locally, exactly with tiktoken or with a word/punctuation estimate"""
+    if not text:
+        return 0
+    text = str(text)
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+
+    # BPE vocabularies split long words, so count about one token per 4 characters of each word
+    return sum(max(1, (len(piece) + 3) // 4) for piece in _TOKEN_PATTERN.findall(text))
+
+class TokenBudget:
+    """Per-task output caps, context trimming and token accounting
+
+    The output cap for a request is the task's base cap scaled by the user's
+    teaching style, so a concise answer is not given room for a detailed
+    one. Oversized context is cut down to the prompt budget, keeping the most
+    recent text and optionally summarizing what was dropped.
+    """
+
+    def __init__(self, task_caps, style_multipliers=None, default_cap=800, context_tokens=2000, min_cap=64):
+        self.task_caps = dict(task_caps)
+        self.style_multipliers = dict(style_multipliers or {})
+        self.default_cap = default_cap
+        self.context_tokens = context_tokens
+        self.min_cap = min_cap
+
+        self._usage = {}
+        self._lock = threading.Lock()
+
+    def max_output_tokens(self, task="chat", settings=None):
+        """Return the output token cap for a task and teaching style"""
+        cap = self.task_caps.get(task, self.default_cap)
+        style = (settings or {}).get("teaching_style")
+        cap = int(cap * self.style_multipliers.get(style, 1.0))
+        return max(self.min_cap, cap)
+
+    def trim_to_tokens(self, text, max_tokens, keep="end"):
+        """Cut text to at most max_tokens, keeping its start or its end"""
+        text = str(text or "")
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        if max_tokens <= 0:
+            return ""
+
+        # Binary search on a word boundary; token counts grow monotonically with length
+        words = text.split(" ")
+        low, high = 0, len(words)
+        while low < high:
+            middle = (low + high + 1) // 2
+            candidate = words[-middle:] if keep == "end" else words[:middle]
+            if estimate_tokens(" ".join(candidate)) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+
+        if low == 0:
+            return ""
+        return " ".join(words[-low:] if keep == "end" else words[:low])
+
+    def fit_context(self, context, max_tokens=None, summarize_fn=None):
+        """Fit context into the prompt budget
+
+        The most recent part is kept verbatim. If summarize_fn is given, the
+        older part that did not fit is summarized into a quarter of the
+        budget and placed in front of it.
+        """
+        if isinstance(context, (list, tuple)):
+            context = "\n".join(str(item) for item in context if item)
+        context = str(context or "").strip()
+        budget = self.context_tokens if max_tokens is None else max_tokens
+
+        if not context or estimate_tokens(context) <= budget:
+            return context
+
+        if summarize_fn is None:
+            return self.trim_to_tokens(context, budget)
+
+        summary_budget = budget // 4
+        recent = self.trim_to_tokens(context, budget - summary_budget)
+        older = context[:len(context) - len(recent)].strip()
+        # Very old text is dropped rather than summarized
+        older = self.trim_to_tokens(older, budget * 4)
+
+        summary = ""
+        try:
+            summary = self.trim_to_tokens(summarize_fn(older), summary_budget, keep="start")
+        except Exception as e:
+            print(f"Error summarizing context: {e}")
+
+        if not summary:
+            return self.trim_to_tokens(context, budget)
+        return f"Summary of earlier conversation: {summary}\n\n{recent}"
+
+    def record(self, task, provider, input_tokens, output_tokens):
+        """Add one request's token counts to the per-task totals"""
+        with self._lock:
+            usage = self._usage.setdefault(task, {
+                "requests": 0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "providers": {}
+            })
+            usage["requests"] += 1
+            usage["input_tokens"] += int(input_tokens or 0)
+            usage["output_tokens"] += int(output_tokens or 0)
+            usage["providers"][provider] = usage["providers"].get(provider, 0) + 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = {}
+            for task, usage in self._usage.items():
+                stats[task] = dict(usage, providers=dict(usage["providers"]))
+                stats[task]["avg_input_tokens"] = round(usage["input_tokens"] / usage["requests"], 1)
+                stats[task]["avg_output_tokens"] = round(usage["output_tokens"] / usage["requests"], 1)
+        return {
+            "tokenizer": "tiktoken" if _encoding is not None else "estimate",
+            "tasks": stats
+        }
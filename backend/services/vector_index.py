@@ -0,0 +1,326 @@
+import os
+import json
+import threading
+import numpy as np
+
+class VectorIndex:
+    """In-process cosine-similarity index for retrieval
+
+    Small corpora are searched exhaustively with a single matrix product.
+    Once the index holds ivf_threshold vectors it trains an IVF (inverted
+    file) structure: vectors are clustered with spherical k-means and
+    stored contiguously per cluster, so a query only scans the nprobe
+    closest clusters plus any rows added since the last build. Training
+    runs outside the lock, so searches are not held up by a rebuild.
+    """
+
+    def __init__(self, ivf_threshold=50000, nlist=0, nprobe=16, seed=0):
+        self.ivf_threshold = ivf_threshold
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+
+        self.dim = None
+        self.ids = []
+        self.payloads = []
+        self._id_rows = {}
+        self._vectors = None
+        self._alive = None
+        self._size = 0
+        self._deleted = 0
+
+        # IVF structure over rows [0, _indexed)
+        self.centroids = None
+        self._list_offsets = None
+        self._indexed = 0
+        self._building = False
+        # Bumped whenever compaction renumbers rows
+        self._generation = 0
+
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._size - self._deleted
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _reserve(self, extra):
+        """Grow the vector buffer geometrically so appends stay amortised O(1)"""
+        needed = self._size + extra
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if needed <= capacity:
+            return
+
+        new_capacity = max(needed, capacity * 2, 1024)
+        vectors = np.empty((new_capacity, self.dim), dtype=np.float32)
+        alive = np.zeros(new_capacity, dtype=bool)
+        if self._size:
+            vectors[:self._size] = self._vectors[:self._size]
+            alive[:self._size] = self._alive[:self._size]
+        self._vectors = vectors
+        self._alive = alive
+
+    def add(self, ids, vectors, payloads=None):
+        """Add vectors with string ids; re-adding an id replaces the old entry"""
+        vectors = self._normalize(vectors)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        payloads = payloads if payloads is not None else [{} for _ in ids]
+        if len(ids) != vectors.shape[0] or len(payloads) != len(ids):
+            raise ValueError("ids, vectors and payloads must have the same length")
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+            self.remove([item_id for item_id in ids if item_id in self._id_rows])
+
+            self._reserve(len(ids))
+            start = self._size
+            self._vectors[start:start + len(ids)] = vectors
+            self._alive[start:start + len(ids)] = True
+            for offset, (item_id, payload) in enumerate(zip(ids, payloads)):
+                self.ids.append(item_id)
+                self.payloads.append(payload)
+                self._id_rows[item_id] = start + offset
+            self._size += len(ids)
+
+            rebuild = self._needs_rebuild()
+
+        # Retrain after releasing the lock; rows added meanwhile are scanned exhaustively
+        if rebuild:
+            self.build()
+
+    def remove(self, ids):
+        """Remove entries by id (rows are tombstoned until the next rebuild)"""
+        with self._lock:
+            for item_id in ids:
+                row = self._id_rows.pop(item_id, None)
+                if row is not None and self._alive[row]:
+                    self._alive[row] = False
+                    self._deleted += 1
+
+    def _needs_rebuild(self):
+        """Whether to train the IVF structure: once the corpus is large enough, and again as it grows (lock held)"""
+        live = len(self)
+        if live < self.ivf_threshold:
+            # Below the threshold every search is exhaustive, so tombstones only cost time
+            if self._deleted > 0.1 * self._size:
+                self._compact()
+                # Compaction moves rows, so an IVF structure trained earlier no longer applies
+                self.centroids = None
+                self._list_offsets = None
+                self._indexed = 0
+            return False
+        if self._building:
+            return False
+        unindexed = self._size - self._indexed
+        return self.centroids is None or unindexed > 0.1 * max(self._indexed, 1) or self._deleted > 0.1 * self._size
+
+    def _compact(self):
+        """Drop tombstoned rows (lock held)"""
+        if not self._deleted:
+            return
+        keep = np.flatnonzero(self._alive[:self._size])
+        self._vectors = np.ascontiguousarray(self._vectors[keep])
+        self._alive = np.ones(len(keep), dtype=bool)
+        self.ids = [self.ids[row] for row in keep]
+        self.payloads = [self.payloads[row] for row in keep]
+        self._id_rows = {item_id: row for row, item_id in enumerate(self.ids)}
+        self._size = len(keep)
+        self._deleted = 0
+        self._generation += 1
+
+    def _kmeans(self, data, nlist, iterations=10):
+        """Spherical k-means on a sample of the data"""
+        rng = np.random.default_rng(self.seed)
+        centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignments = self._assign(data, centroids)
+            counts = np.bincount(assignments, minlength=nlist)
+
+            # Per-cluster sums via a sort and segmented reduction
+            order = np.argsort(assignments, kind="stable")
+            non_empty = np.flatnonzero(counts)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[non_empty]
+            sums = np.zeros_like(centroids)
+            sums[non_empty] = np.add.reduceat(data[order], starts, axis=0)
+
+            # Re-seed empty clusters with random points
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                sums[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+            centroids = self._normalize(sums)
+
+        return centroids
+
+    @staticmethod
+    def _assign(data, centroids, chunk_size=65536):
+        """Return the closest centroid for every row, in chunks to bound memory"""
+        assignments = np.empty(len(data), dtype=np.int64)
+        for start in range(0, len(data), chunk_size):
+            assignments[start:start + chunk_size] = np.argmax(data[start:start + chunk_size] @ centroids.T, axis=1)
+        return assignments
+
+    def build(self):
+        """(Re)build the IVF structure over every stored vector
+
+        Clusters are trained on the rows present when the build starts,
+        outside the lock, and swapped in under it; rows added meanwhile
+        stay in the exhaustively scanned tail. Only one build runs at a time.
+        """
+        with self._lock:
+            if self._building:
+                return
+            self._compact()
+            size = self._size
+            if size == 0:
+                return
+            self._building = True
+            generation = self._generation
+            # Rows below size are only rewritten by a build or replaced by compaction, so this view stays valid
+            vectors = self._vectors[:size]
+
+        try:
+            nlist = self.nlist or int(min(4096, max(1, 4 * np.sqrt(size))))
+            nlist = min(nlist, size)
+
+            rng = np.random.default_rng(self.seed)
+            sample_size = min(size, nlist * 40)
+            sample = vectors[np.sort(rng.choice(size, sample_size, replace=False))]
+            centroids = self._kmeans(sample, nlist)
+
+            # Store each cluster's rows contiguously so a probe is a single slice
+            assignments = self._assign(vectors, centroids)
+            order = np.argsort(assignments, kind="stable")
+            list_offsets = np.searchsorted(assignments[order], np.arange(nlist + 1))
+
+            with self._lock:
+                if self._generation != generation:
+                    # Rows were compacted meanwhile, so the trained layout no longer matches them
+                    return
+                self._vectors[:size] = self._vectors[order]
+                self._alive[:size] = self._alive[order]
+                self.ids[:size] = [self.ids[row] for row in order]
+                self.payloads[:size] = [self.payloads[row] for row in order]
+                self._id_rows = {item_id: row for row, item_id in enumerate(self.ids) if self._alive[row]}
+
+                self.centroids = centroids
+                self._list_offsets = list_offsets
+                self._indexed = size
+        finally:
+            with self._lock:
+                self._building = False
+
+    def search(self, query, k=5):
+        """Return up to k (id, score, payload) tuples ordered by cosine similarity"""
+        query = self._normalize(query).reshape(-1)
+
+        with self._lock:
+            if not len(self):
+                return []
+
+            if self.centroids is None:
+                rows = np.arange(self._size)
+                scores = self._vectors[:self._size] @ query
+            else:
+                nprobe = min(self.nprobe, len(self.centroids))
+                probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+
+                row_parts = []
+                score_parts = []
+                for probe in probes:
+                    start, end = self._list_offsets[probe], self._list_offsets[probe + 1]
+                    if end > start:
+                        row_parts.append(np.arange(start, end))
+                        score_parts.append(self._vectors[start:end] @ query)
+
+                # Rows added since the last build are scanned exhaustively
+                if self._size > self._indexed:
+                    row_parts.append(np.arange(self._indexed, self._size))
+                    score_parts.append(self._vectors[self._indexed:self._size] @ query)
+
+                if not row_parts:
+                    return []
+                rows = np.concatenate(row_parts)
+                scores = np.concatenate(score_parts)
+
+            scores = np.where(self._alive[rows], scores, -np.inf)
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            return [
+                (self.ids[rows[i]], float(scores[i]), self.payloads[rows[i]])
+                for i in top if np.isfinite(scores[i])
+            ]
+
+    def save(self, path):
+        """Write the index to a directory"""
+        with self._lock:
+            os.makedirs(path, exist_ok=True)
+            np.save(os.path.join(path, "vectors.npy"), self._vectors[:self._size] if self._size else np.zeros((0, self.dim or 0), dtype=np.float32))
+            np.save(os.path.join(path, "alive.npy"), self._alive[:self._size] if self._size else np.zeros(0, dtype=bool))
+            if self.centroids is not None:
+                np.save(os.path.join(path, "centroids.npy"), self.centroids)
+                np.save(os.path.join(path, "list_offsets.npy"), self._list_offsets)
+
+            meta = {
+                "dim": self.dim,
+                "ids": self.ids,
+                "payloads": self.payloads,
+                "indexed": self._indexed if self.centroids is not None else 0,
+                "ivf_threshold": self.ivf_threshold,
+                "nlist": self.nlist,
+                "nprobe": self.nprobe
+            }
+            temp_path = os.path.join(path, "meta.json.tmp")
+            with open(temp_path, "w", encoding="utf-8") as meta_file:
+                json.dump(meta, meta_file)
+            os.replace(temp_path, os.path.join(path, "meta.json"))
+
+    @classmethod
+    def load(cls, path, **overrides):
+        """Load an index written by save()"""
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+
+        index = cls(
+            ivf_threshold=overrides.get("ivf_threshold", meta.get("ivf_threshold", 50000)),
+            nlist=overrides.get("nlist", meta.get("nlist", 0)),
+            nprobe=overrides.get("nprobe", meta.get("nprobe", 16))
+        )
+        index.dim = meta.get("dim")
+        index.ids = meta.get("ids", [])
+        index.payloads = meta.get("payloads", [])
+        index._vectors = np.load(os.path.join(path, "vectors.npy"))
+        index._alive = np.load(os.path.join(path, "alive.npy"))
+        index._size = len(index.ids)
+        index._deleted = int(index._size - np.count_nonzero(index._alive))
+        index._id_rows = {item_id: row for row, item_id in enumerate(index.ids) if index._alive[row]}
+
+        centroids_path = os.path.join(path, "centroids.npy")
+        if meta.get("indexed") and os.path.exists(centroids_path):
+            index.centroids = np.load(centroids_path)
+            index._list_offsets = np.load(os.path.join(path, "list_offsets.npy"))
+            index._indexed = meta["indexed"]
+
+        return index
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "vectors": len(self),
+                "dim": self.dim,
+                "mode": "ivf" if self.centroids is not None else "brute-force",
+                "lists": len(self.centroids) if self.centroids is not None else 0,
+                "unindexed": self._size - self._indexed if self.centroids is not None else self._size
+            }
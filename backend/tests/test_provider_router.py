@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+
+import pytest
+
+# Add the parent directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.provider_router import ProviderRouter
+from services.rate_limiter import BACKGROUND, INTERACTIVE, current_lane, lane
+
+def test_routed_call_keeps_background_lane():
+    router = ProviderRouter(hedge_enabled=False)
+    with lane(BACKGROUND):
+        provider, result = router.call({"gemini": current_lane})
+    assert (provider, result) == ("gemini", BACKGROUND)
+
+def test_routed_call_defaults_to_interactive_lane():
+    router = ProviderRouter(hedge_enabled=False)
+    assert router.call({"gemini": current_lane}) == ("gemini", INTERACTIVE)
+
+def test_hedged_call_keeps_background_lane():
+    router = ProviderRouter(hedge_enabled=True, hedge_default_delay=0.0, hedge_max_ratio=1.0)
+
+    def slow():
+        time.sleep(0.2)
+        return current_lane()
+
+    with lane(BACKGROUND):
+        provider, result = router.call({"gemini": slow, "openai": current_lane})
+    assert result == BACKGROUND
+
+def test_ignored_exceptions_are_not_counted():
+    router = ProviderRouter(hedge_enabled=False, ignored_exceptions=(CircuitOpenError,))
+
+    def refused():
+        raise CircuitOpenError("gemini circuit is open")
+
+    with pytest.raises(CircuitOpenError):
+        router.call({"gemini": refused})
+    assert router.snapshot()["providers"].get("gemini", {}).get("failures", 0) == 0
+
+def test_half_open_breaker_without_probe_slot_does_not_admit():
+    breaker = CircuitBreaker("gemini", minimum_calls=1, recovery_timeout=0, half_open_max_calls=1)
+    breaker.record_failure()
+    assert breaker.admits_request()
+    assert breaker.allow_request()
+    assert not breaker.admits_request()
@@ -126,4 +126,16 @@ def create_response(data=None, message=None, success=True, status_code=200):
     if message:
         response['message'] = message
     
-    return response, status_code 
\ No newline at end of file
+    return response, status_code
+
+def format_sse(data, event=None):
+    """Format data as a Server-Sent Events message"""
+    message = ""
+    if event:
+        message += f"event: {event}\n"
+    
+    payload = data if isinstance(data, str) else json.dumps(data)
+    for line in payload.split('\n'):
+        message += f"data: {line}\n"
+    
+    return message + "\n"